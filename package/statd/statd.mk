@@ -40,6 +40,8 @@ define STATD_BUILD_PYTHON
 			--headers=$(TARGET_DIR)/usr/include/python$(PYTHON3_VERSION_MAJOR) \
 			--scripts=$(TARGET_DIR)/usr/libexec/statd \
 			--data=$(TARGET_DIR)
+	$(HOST_DIR)/bin/python3 $(@D)/python/mkbundle.py \
+		$(TARGET_DIR)/usr/libexec/statd/yanger
 endef
 STATD_POST_INSTALL_TARGET_HOOKS += STATD_BUILD_PYTHON
 
@@ -675,6 +675,9 @@ static int change_cb(sr_session_ctx_t *session, uint32_t sub_id, const char *mod
 		}
 
 		AUDIT("The new configuration has been applied.");
+
+		/* Cached operational data may no longer be valid */
+		rmrf(YANGER_CACHE);
 	}
 
 free_diff:
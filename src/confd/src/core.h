@@ -41,6 +41,9 @@
 #define SSL_CERT_DIR      "/etc/ssl/certs"
 #define SSL_KEY_DIR       "/etc/ssl/private"
 
+/* statd's yanger caches slowly changing command output here, per tag */
+#define YANGER_CACHE      "/run/yanger/cache"
+
 #define CB_PRIO_PRIMARY   65535
 #define CB_PRIO_PASSIVE   65000
 
@@ -86,6 +86,9 @@ static int infix_system_sw_set_boot_order(sr_session_ctx_t *session, uint32_t su
 		 return SR_ERR_UNSUPPORTED;
 	 }
 
+	/* Boot order in cached software status is now stale */
+	rmrf(YANGER_CACHE "/software");
+
 	return SR_ERR_OK;
 }
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Build a startup optimized, single file, yanger
+
+Every operational query that is not answered by the yanger server in
+statd starts a new interpreter, so import time is paid over and over.
+The bundle is a zip application of yanger compiled to bytecode ahead
+of time, without sources, so no .py files are stat:ed or compared to
+their caches on import, and everything is found in one zip directory
+that is read once.  Members are stored uncompressed, to not spend the
+time saved on inflating them.
+
+The bytecode must be compiled by the same Python version as the target
+runs, e.g. Buildroot's host-python3.  The interpreter is started in
+isolated mode (-I), skipping the user site and PYTHON* environment.
+
+usage: mkbundle.py [-p INTERPRETER] OUTPUT
+"""
+import importlib.util
+import io
+import marshal
+import os
+import stat
+import sys
+import zipfile
+
+
+PACKAGE = "yanger"
+MAIN = """\
+from yanger.__main__ import main
+main()
+"""
+
+
+def pyc(source, path):
+    """Compile source to an unchecked, hash-based, .pyc"""
+    code = compile(source, path, "exec", dont_inherit=True, optimize=1)
+    flags = 0b01        # Hash-based, not checked against the source
+
+    return importlib.util.MAGIC_NUMBER + \
+        flags.to_bytes(4, "little") + \
+        importlib.util.source_hash(source) + \
+        marshal.dumps(code)
+
+
+def bundle(srcdir, output, interpreter):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("__main__.pyc", pyc(MAIN.encode(), "__main__.py"))
+
+        pkgdir = os.path.join(srcdir, PACKAGE)
+        for root, dirs, files in os.walk(pkgdir):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                if not name.endswith(".py"):
+                    continue
+
+                path = os.path.join(root, name)
+                arcname = os.path.relpath(path, srcdir)
+                with open(path, "rb") as f:
+                    zf.writestr(arcname + "c", pyc(f.read(), arcname))
+
+    tmp = f"{output}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(f"#!{interpreter} -I\n".encode())
+        f.write(buf.getvalue())
+    os.chmod(tmp, os.stat(tmp).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.replace(tmp, output)
+
+
+def main(argv):
+    interpreter = "/usr/bin/python3"
+    if len(argv) == 3 and argv[0] == "-p":
+        interpreter, argv = argv[1], argv[2:]
+    if len(argv) != 1:
+        sys.stderr.write(__doc__[__doc__.index("usage:"):])
+        return 1
+
+    bundle(os.path.dirname(os.path.abspath(__file__)), argv[0], interpreter)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -14,7 +14,6 @@ import subprocess
 def run_json_cmd(cmd, default=None, check=True):
     """Run a command (array of args) with JSON output and return the JSON"""
     try:
-        cmd.append("2>/dev/null")
         result = subprocess.run(cmd, check=check, stdout=subprocess.PIPE,
                                 stderr=subprocess.PIPE, text=True)
         output = result.stdout
@@ -26,16 +25,68 @@ def run_json_cmd(cmd, default=None, check=True):
     return data
 
 
-def main():
-    ospf_interfaces = ['sudo', 'vtysh', '-c', "show ip ospf interface json"]
-    ip_ospf = ['sudo', 'vtysh', '-c', "show ip ospf json"]
-    ospf_neigh = ['sudo', 'vtysh', '-c', "show ip ospf neighbor detail json"]
+COMMANDS = (
+    "show ip ospf interface json",
+    "show ip ospf json",
+    "show ip ospf neighbor detail json",
+)
+
+
+def vty_json_cmds(cmds):
+    """Run FRR commands in one session with ospfd, return their JSON
+
+    Like yanger, see yanger/frr.py.  Returns None if ospfd's VTY socket
+    cannot be used, e.g. when not run as root, to fall back to vtysh.
+    """
     try:
-        interfaces = run_json_cmd(ospf_interfaces)
-        ospf = run_json_cmd(ip_ospf)
-        neighbors = run_json_cmd(ospf_neigh)
-    except (subprocess.CalledProcessError, json.JSONDecodeError):
-        return {}
+        from yanger.frr import CMD_SUCCESS, Vty
+    except ImportError:
+        return None
+
+    results = []
+    try:
+        with Vty("ospfd") as vty:
+            for cmd in cmds:
+                status, out = vty.execute(cmd)
+                try:
+                    results.append(json.loads(out) if status == CMD_SUCCESS else {})
+                except json.JSONDecodeError:
+                    results.append({})
+    except (FileNotFoundError, ConnectionRefusedError):
+        # Not running, vtysh would not get an answer either
+        return [{} for _ in cmds]
+    except OSError:
+        return None
+
+    return results
+
+
+def split_area(area):
+    """Split FRR's area, e.g. "0.0.0.1 [NSSA]", into (area-id, area-type)"""
+    if "NSSA" in area:
+        return area[:-7], "nssa-area"
+    if "Stub" in area:
+        return area[:-7], "stub-area"
+    return area, "normal-area"
+
+
+def transform(interfaces, ospf, neighbors):
+    """Join the output of COMMANDS into areas, with their interfaces and
+    the neighbors of those, returns the updated ospf
+
+    Neighbors are indexed by interface and area first, so the join is
+    done in one pass over each list, also on hub routers with hundreds
+    of interfaces and neighbors in many areas.
+    """
+    areas = ospf["areas"]
+
+    peers = {}
+    for address, entries in neighbors["neighbors"].items():
+        for nbr in entries:
+            if "areaId" in nbr:
+                nbr["areaId"] = split_area(nbr["areaId"])[0]
+            key = (nbr.get("ifaceName"), nbr.get("areaId"))
+            peers.setdefault(key, []).append((address, nbr))
 
     for ifname, iface in interfaces["interfaces"].items():
         iface["name"] = ifname
@@ -45,42 +96,40 @@ def main():
         if not iface.get("ospfEnabled", False) or not iface.get("area"):
             continue
 
-        for area_id in ospf["areas"]:
-            area_type=""
-
-            stub=False
-            if("NSSA" in iface["area"]):
-                iface_area_id = iface["area"][:-7]
-                area_type = "nssa-area"
-            elif("Stub" in iface["area"]):
-                iface_area_id = iface["area"][:-7]
-                iface["areaId"] = iface["area"][:-7]
-                area_type = "stub-area"
-            else:
-                iface_area_id = iface["area"]
-                area_type = "normal-area"
-
-            if(iface_area_id != area_id):
-                continue
-
-            ospf["areas"][area_id]["area-type"] = area_type
-            iface["area"] = iface_area_id
-
-            for nbrAddress,nbrDatas in neighbors["neighbors"].items():
-                for nbrData in nbrDatas:
-                    nbrIfname=nbrData["ifaceName"]
-                    if(("NSSA" in nbrData.get("areaId", {})) or ("Stub" in nbrData.get("areaId", {}))):
-                        nbrData["areaId"] = nbrData["areaId"][:-7]
-
-                    if ((nbrIfname != ifname) or (area_id != nbrData.get("areaId"))):
-                        #print(f'Continute {ifname} {nbrData.get("areaId")}')
-                        continue
-                    nbrData["neighborIp"] = nbrAddress
-                    iface["neighbors"].append(nbrData)
-
-            if(not ospf["areas"][area_id].get("interfaces", None)):
-                ospf["areas"][area_id]["interfaces"] = []
-            ospf["areas"][area_id]["interfaces"].append(iface)
+        area_id, area_type = split_area(iface["area"])
+        area = areas.get(area_id)
+        if area is None:
+            continue
+
+        if area_type == "stub-area":
+            iface["areaId"] = area_id
+        area["area-type"] = area_type
+        iface["area"] = area_id
+
+        for address, nbr in peers.get((ifname, area_id), []):
+            nbr["neighborIp"] = address
+            iface["neighbors"].append(nbr)
+
+        if not area.get("interfaces", None):
+            area["interfaces"] = []
+        area["interfaces"].append(iface)
+
+    return ospf
+
+
+def main():
+    results = vty_json_cmds(COMMANDS)
+    if results is None:
+        try:
+            results = [run_json_cmd(['sudo', 'vtysh', '-c', cmd])
+                       for cmd in COMMANDS]
+        except (subprocess.CalledProcessError, json.JSONDecodeError):
+            return {}
+
+    try:
+        ospf = transform(*results)
+    except KeyError:
+        return {}  # OSPF not running
 
     print(json.dumps(ospf))
 
@@ -24,19 +24,54 @@ def run_json_cmd(cmd, default=None, check=True):
     return data
 
 
-def main():
-    """
-    Collects RIP operational data from FRR vtysh and transforms it
-    into a structure that matches the ietf-rip YANG model.
+COMMANDS = (
+    "show ip rip json",
+    "show ip rip status json",
+)
+
+
+def vty_json_cmds(cmds):
+    """Run FRR commands in one session with ripd, return their JSON
+
+    Like yanger, see yanger/frr.py.  Returns None if ripd's VTY socket
+    cannot be used, e.g. when not run as root, to fall back to vtysh.
     """
-    rip_routes_cmd = ['sudo', 'vtysh', '-c', "show ip rip json"]
-    rip_status_cmd = ['sudo', 'vtysh', '-c', "show ip rip status json"]
+    try:
+        from yanger.frr import CMD_SUCCESS, Vty
+    except ImportError:
+        return None
 
+    results = []
     try:
-        routes = run_json_cmd(rip_routes_cmd, default={})
-        status = run_json_cmd(rip_status_cmd, default={})
-    except (subprocess.CalledProcessError, json.JSONDecodeError):
-        return {}
+        with Vty("ripd") as vty:
+            for cmd in cmds:
+                status, out = vty.execute(cmd)
+                try:
+                    results.append(json.loads(out) if status == CMD_SUCCESS else {})
+                except json.JSONDecodeError:
+                    results.append({})
+    except (FileNotFoundError, ConnectionRefusedError):
+        # Not running, vtysh would not get an answer either
+        return [{} for _ in cmds]
+    except OSError:
+        return None
+
+    return results
+
+
+def main():
+    """
+    Collects RIP operational data from FRR and transforms it into a
+    structure that matches the ietf-rip YANG model.
+    """
+    results = vty_json_cmds(COMMANDS)
+    if results is None:
+        try:
+            results = [run_json_cmd(['sudo', 'vtysh', '-c', cmd], default={})
+                       for cmd in COMMANDS]
+        except (subprocess.CalledProcessError, json.JSONDecodeError):
+            return {}
+    routes, status = results
 
     # Build the structure matching ietf-rip YANG model
     result = {
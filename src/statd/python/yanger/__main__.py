@@ -1,36 +1,67 @@
-import json
+import importlib
 import os
 import sys
 
 from . import common
 from . import host
+from . import trace
 
 USAGE = """\
-usage: yanger [-p PARAM] [-x PREFIX] [-r DIR | -c DIR] model
+usage: yanger [-p [MODEL=]PARAM] [-X XPATH] [-C] [-t FILE] [-x PREFIX [-S]]
+              [-r DIR | -c DIR] model [model ...]
+       yanger [-t FILE] [-x PREFIX [-S]] [-r DIR | -c DIR] -s SOCKET
 
 YANG data creator
 
 positional arguments:
-  model                 YANG Model
+  model                 YANG Model.  When more than one model is given, the
+                        output is one document with all of them merged
 
 options:
-  -p, --param PARAM     Model dependent parameter, e.g. interface name
+  -p, --param [MODEL=]PARAM
+                        Model dependent parameter, e.g. interface name, or
+                        route source for ietf-routing, see ietf_routing.py.
+                        With more than one model, it is given per model,
+                        e.g. '-p ietf-routing=fib', and may be repeated
+  -X, --xpath XPATH     Only collect what is needed for XPATH, e.g. the
+                        xpath of an operational request.  Models that do
+                        not support it collect everything
+  -C, --compact         Output compact JSON, without indentation, e.g. when
+                        only read by a program
+  -t, --trace FILE      Record the time spent in each command, file read and
+                        model to FILE, in Chrome trace-event format, and
+                        print a summary if stderr is a terminal.  Can also
+                        be set with YANGER_TRACE=FILE, and per --serve
+                        request
   -x, --cmd-prefix PREFIX
                         Use this prefix for all system commands, e.g.
                         'ssh user@remotehost sudo'
+  -S, --session         Run all system commands in a single shell, started
+                        using the --cmd-prefix, instead of one connection
+                        per command
   -r, --replay DIR      Generate output based on recorded system commands
                         from DIR, rather than querying the local system
   -c, --capture DIR     Capture system command output in DIR, such that the
                         current system state can be recreated offline (with
-                        --replay) for testing purposes
+                        --replay) for testing purposes.  Both options also
+                        take a single file archive, ARCHIVE.ycap[:NAME],
+                        see yanger/capture.py
+  -s, --serve SOCKET    Run as a service, answering requests on the Unix
+                        socket SOCKET.  Use '-' to serve a connection
+                        already set up on stdin, e.g. by statd
 """
 
 def _parse_args(argv):
-    model = None
-    param = None
+    models = []
+    params = []
     cmd_prefix = None
     replay = None
     capture = None
+    sockpath = None
+    session = False
+    tracepath = os.environ.get("YANGER_TRACE") or None
+    xpath = None
+    compact = False
 
     i = 1
     while i < len(argv):
@@ -42,95 +73,235 @@ def _parse_args(argv):
             i += 1
             if i >= len(argv):
                 sys.exit(f"error: {arg} requires an argument")
-            param = argv[i]
+            params.append(argv[i])
+        elif arg in ('-X', '--xpath'):
+            i += 1
+            if i >= len(argv):
+                sys.exit(f"error: {arg} requires an argument")
+            xpath = argv[i]
+        elif arg in ('-C', '--compact'):
+            compact = True
+        elif arg in ('-t', '--trace'):
+            i += 1
+            if i >= len(argv):
+                sys.exit(f"error: {arg} requires an argument")
+            tracepath = argv[i]
         elif arg in ('-x', '--cmd-prefix'):
             i += 1
             if i >= len(argv):
                 sys.exit(f"error: {arg} requires an argument")
             cmd_prefix = argv[i]
+        elif arg in ('-S', '--session'):
+            session = True
         elif arg in ('-r', '--replay'):
             i += 1
             if i >= len(argv):
                 sys.exit(f"error: {arg} requires an argument")
             replay = argv[i]
             if not os.path.isdir(replay):
-                sys.exit(f"error: '{replay}' is not a valid directory")
+                from .capture import is_archive
+                if not is_archive(replay, new=False):
+                    sys.exit(f"error: '{replay}' is not a valid directory or archive")
         elif arg in ('-c', '--capture'):
             i += 1
             if i >= len(argv):
                 sys.exit(f"error: {arg} requires an argument")
             capture = argv[i]
+        elif arg in ('-s', '--serve'):
+            i += 1
+            if i >= len(argv):
+                sys.exit(f"error: {arg} requires an argument")
+            sockpath = argv[i]
         elif arg.startswith('-'):
             sys.exit(f"error: unknown option: {arg}")
-        elif model is None:
-            model = arg
         else:
-            sys.exit(f"error: unexpected argument: {arg}")
+            models.append(arg)
         i += 1
 
-    if model is None:
+    if sockpath and models:
+        sys.exit("error: model is given per request with --serve")
+    if not models and not sockpath:
         sys.exit("error: missing required argument: model")
     if replay and cmd_prefix:
         sys.exit("error: --cmd-prefix cannot be used with --replay")
     if replay and capture:
         sys.exit("error: --replay cannot be used with --capture")
+    if session and not cmd_prefix:
+        sys.exit("error: --session requires --cmd-prefix")
+
+    return models, params, xpath, compact, cmd_prefix, replay, capture, sockpath, session, tracepath
+
+# Model name -> yanger module providing its operational data
+MODELS = {
+    'ietf-interfaces':     'ietf_interfaces',
+    'ietf-routing':        'ietf_routing',
+    'ietf-ospf':           'ietf_ospf',
+    'ietf-rip':            'ietf_rip',
+    'ietf-hardware':       'ietf_hardware',
+    'infix-containers':    'infix_containers',
+    'infix-dhcp-server':   'infix_dhcp_server',
+    'ietf-system':         'ietf_system',
+    'ietf-ntp':            'ietf_ntp',
+    'ieee802-dot1ab-lldp': 'infix_lldp',
+    'infix-firewall':      'infix_firewall',
+    'ietf-bfd-ip-sh':      'ietf_bfd_ip_sh',
+    'ieee1588-ptp-tt':     'ieee1588_ptp',
+}
+
+def _module(model):
+    """Import the module providing model, on first use
+
+    Keeps startup time down for one-shot invocations.  Raises
+    `ValueError` for unknown models.
+
+    """
+    name = MODELS.get(model)
+    if name is None:
+        raise ValueError(f"Unsupported model {model}")
+
+    return importlib.import_module(f".{name}", __package__)
+
+def _params(models, params):
+    """Map models to their parameter, from the -p values in params
+
+    A value is for the model it is prefixed with, MODEL=PARAM, otherwise
+    for the only model given.  Raises `ValueError` for a value without
+    a model when there are several, or for a model not given.
+
+    """
+    per_model = {}
+    for param in params or []:
+        model, sep, value = param.partition("=")
+        if sep and model in MODELS:
+            if model not in models:
+                raise ValueError(f"Parameter for {model}, which is not queried")
+            per_model[model] = value
+        elif len(models) > 1:
+            raise ValueError(f"Parameter {param} given for several models, "
+                             "use MODEL=PARAM")
+        else:
+            per_model[models[0]] = param
+
+    return per_model
 
-    return model, param, cmd_prefix, replay, capture
+def build(model, param=None, xpath=None):
+    """Collect operational data for model, or the part of it in xpath"""
+    mod = _module(model)
+    with trace.span(model, "model"):
+        if model in ('ietf-interfaces', 'ietf-routing'):
+            return mod.operational(param)
+        if xpath and hasattr(mod, "PRODUCERS"):
+            return mod.operational(xpath)
+
+        return mod.operational()
+
+def _scoped(mod, xpath):
+    """Whether xpath selects at most one producer of mod"""
+    if not xpath or not hasattr(mod, "PRODUCERS"):
+        return False
+
+    from .xpath import select
+    return len(select(mod.PRODUCERS, xpath)) < 2
+
+def build_all(models, params=None, xpath=None):
+    """Collect operational data for all models into one tree
+
+    All models are built in the same process, sharing the output of
+    any command they have in common, e.g. `ip link`.  Models that know
+    up front which commands they need get to start them all before the
+    first one is built, unless the xpath only needs one of them.
+    The -p values in params are mapped to models by `_params()`.
+
+    """
+    models = list(dict.fromkeys(models))
+    params = _params(models, params)
+    for model in models:
+        mod = _module(model)
+        if hasattr(mod, "prefetch") and not _scoped(mod, xpath):
+            with trace.span(model, "prefetch"):
+                mod.prefetch()
+
+    yang_data = {}
+    for model in models:
+        common.merge(yang_data, build(model, params.get(model), xpath))
+
+    return yang_data
+
+def output(yang_data, fp, compact=False):
+    """Write yang_data as JSON to fp, streaming any large lists"""
+    with trace.span("output", "json"):
+        if compact:
+            common.dump(yang_data, fp, separators=(",", ":"))
+        else:
+            common.dump(yang_data, fp, indent=2)
+        fp.write("\n")
+
+def _request(args, fp, tracepath=None):
+    """Handle a single request from a --serve client, reply to fp"""
+    models = []
+    params = []
+    xpath = None
+    compact = False
+
+    args = iter(args)
+    for arg in args:
+        if arg in ('-p', '--param'):
+            param = next(args, None)
+            if param is None:
+                raise ValueError(f"{arg} requires an argument")
+            params.append(param)
+        elif arg in ('-X', '--xpath'):
+            xpath = next(args, None)
+            if xpath is None:
+                raise ValueError(f"{arg} requires an argument")
+        elif arg in ('-C', '--compact'):
+            compact = True
+        elif arg in ('-t', '--trace'):
+            tracepath = next(args, None)
+            if tracepath is None:
+                raise ValueError(f"{arg} requires an argument")
+        elif arg.startswith('-'):
+            raise ValueError(f"unknown option: {arg}")
+        else:
+            models.append(arg)
+
+    if not models:
+        raise ValueError("missing required argument: model")
+
+    if tracepath:
+        trace.start(tracepath)
+    try:
+        output(build_all(models, params, xpath), fp, compact)
+    finally:
+        trace.stop()
 
 def main():
-    model, param, cmd_prefix, replay, capture = _parse_args(sys.argv)
+    models, params, xpath, compact, cmd_prefix, replay, capture, sockpath, session, tracepath = \
+        _parse_args(sys.argv)
 
     if cmd_prefix or capture:
-        host.HOST = host.Remotehost(cmd_prefix, capture)
+        host.HOST = host.Remotehost(cmd_prefix, capture, session)
     elif replay:
         host.HOST = host.Replayhost(replay)
     else:
         host.HOST = host.Localhost()
 
-    if model == 'ietf-interfaces':
-        from . import ietf_interfaces
-        yang_data = ietf_interfaces.operational(param)
-    elif model == 'ietf-routing':
-        from . import ietf_routing
-        yang_data = ietf_routing.operational()
-    elif model == 'ietf-ospf':
-        from . import ietf_ospf
-        yang_data = ietf_ospf.operational()
-    elif model == 'ietf-rip':
-        from . import ietf_rip
-        yang_data = ietf_rip.operational()
-    elif model == 'ietf-hardware':
-        from . import ietf_hardware
-        yang_data = ietf_hardware.operational()
-    elif model == 'infix-containers':
-        from . import infix_containers
-        yang_data = infix_containers.operational()
-    elif model == 'infix-dhcp-server':
-        from . import infix_dhcp_server
-        yang_data = infix_dhcp_server.operational()
-    elif model == 'ietf-system':
-        from . import ietf_system
-        yang_data = ietf_system.operational()
-    elif model == 'ietf-ntp':
-        from . import ietf_ntp
-        yang_data = ietf_ntp.operational()
-    elif model == 'ieee802-dot1ab-lldp':
-        from . import infix_lldp
-        yang_data = infix_lldp.operational()
-    elif model == 'infix-firewall':
-        from . import infix_firewall
-        yang_data = infix_firewall.operational()
-    elif model == 'ietf-bfd-ip-sh':
-        from . import ietf_bfd_ip_sh
-        yang_data = ietf_bfd_ip_sh.operational()
-    elif model == 'ieee1588-ptp-tt':
-        from . import ieee1588_ptp
-        yang_data = ieee1588_ptp.operational()
-    else:
-        common.LOG.warning("Unsupported model %s", model)
-        sys.exit(1)
+    if sockpath:
+        from . import server
+        # With a global trace file, it is overwritten by each request
+        server.serve(sockpath, lambda args, fp: _request(args, fp, tracepath))
+        return
 
-    print(json.dumps(yang_data, indent=2, ensure_ascii=False))
+    if tracepath:
+        trace.start(tracepath)
+    try:
+        output(build_all(models, params, xpath), sys.stdout, compact)
+    except ValueError as err:
+        common.LOG.warning("%s", err)
+        sys.exit(1)
+    finally:
+        # The summary is for humans, statd samples to files
+        trace.stop(top=10 if sys.stderr.isatty() else None)
 
 
 if __name__ == "__main__":
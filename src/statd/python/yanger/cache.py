@@ -0,0 +1,160 @@
+"""Persistent cache of slowly changing command output
+
+The memoization in Localhost only lasts for one request, but queries
+from the CLI, the web UI and NETCONF pollers often come back to back.
+Output from commands listed in POLICY is therefore also kept in files
+below CACHE_DIR, one directory per tag, and reused for up to the TTL of
+its tag, across requests and processes.
+
+An entry is considered stale when it is older than the TTL, or older
+than any of the files its tag depends on, e.g. the RAUC status file
+which is updated on every install.  Other invalidation hooks, e.g. on
+configuration changes, simply remove CACHE_DIR, or a tag below it.
+
+Each tag has a max total size, when exceeded the least recently used
+entries are evicted.  TTL and size can be changed per tag in CONF_FILE:
+
+    { "frr": { "ttl": 0 }, "containers": { "ttl": 10, "max-size": 65536 } }
+
+A TTL of 0 disables caching for that tag.
+"""
+import json
+import os
+import time
+
+from . import common
+from . import host
+
+
+CACHE_DIR = "/run/yanger/cache"
+CONF_FILE = "/etc/yanger/cache.json"
+
+# argv prefix -> tag
+POLICY = (
+    (("rauc", "status"),       "software"),
+    (("fw_printenv",),         "software"),
+    (("grub-editenv",),        "software"),
+    (("podman", "inspect"),    "containers"),
+    (("lldpcli",),             "lldp"),
+    (("vtysh",),               "frr"),
+    (("copy", "running"),      "config"),
+)
+
+# tag -> ttl (s), max-size (bytes), depends (paths)
+TAGS = {
+    "software":   {"ttl": 60, "max-size": 1 << 20, "depends": ("/mnt/aux/rauc.status",)},
+    "containers": {"ttl": 5,  "max-size": 1 << 20},
+    "lldp":       {"ttl": 5,  "max-size": 1 << 20},
+    "frr":        {"ttl": 2,  "max-size": 8 << 20},
+    "config":     {"ttl": 60, "max-size": 1 << 20},
+}
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+class Cache:
+    def __init__(self, path=CACHE_DIR, conf=CONF_FILE):
+        self.path = path
+        self.tags = {tag: dict(policy) for tag, policy in TAGS.items()}
+
+        try:
+            with open(conf, "r", encoding="utf-8") as f:
+                for tag, policy in json.load(f).items():
+                    self.tags.setdefault(tag, {}).update(policy)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as err:
+            common.LOG.warning("Ignoring %s: %s", conf, err)
+
+    def _entry(self, cmd):
+        """Get (tag policy, path) of cmd's entry, or None if not cached"""
+        for prefix, tag in POLICY:
+            if cmd[:len(prefix)] == prefix:
+                break
+        else:
+            return None
+
+        policy = self.tags.get(tag, {})
+        if policy.get("ttl", 0) <= 0:
+            return None
+
+        slug = host.Replayhost.SlugOf(cmd)
+        if len(slug) > 255:
+            return None
+
+        return policy, os.path.join(self.path, tag, slug)
+
+    def get(self, cmd):
+        """Get cached output of cmd, or None"""
+        entry = self._entry(cmd)
+        if not entry:
+            return None
+
+        policy, path = entry
+        try:
+            st = os.stat(path)
+            now = time.time()
+            if now - st.st_mtime >= policy["ttl"]:
+                return None
+            if any(_mtime(dep) > st.st_mtime for dep in policy.get("depends", ())):
+                return None
+
+            with open(path, "r", encoding="utf-8") as f:
+                out = f.read()
+
+            # Mark as recently used, for eviction
+            os.utime(path, (now, st.st_mtime))
+            return out
+        except (OSError, ValueError):
+            return None
+
+    def put(self, cmd, out):
+        """Store output of cmd, if it should be cached"""
+        entry = self._entry(cmd)
+        if not entry:
+            return
+
+        policy, path = entry
+        maxsize = policy.get("max-size", 1 << 20)
+        data = out.encode("utf-8")
+        if len(data) > maxsize:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._evict(os.path.dirname(path), maxsize - len(data))
+
+            # Atomic replace, other yangers may be reading it
+            tmp = f"{path}.{os.getpid()}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as err:
+            common.LOG.debug("Failed caching %s: %s", path, err)
+
+    def _evict(self, tagdir, room):
+        """Remove least recently used entries until tagdir fits in room"""
+        entries = []
+        with os.scandir(tagdir) as it:
+            for ent in it:
+                try:
+                    st = ent.stat()
+                    entries.append((st.st_atime, st.st_size, ent.path))
+                except OSError:
+                    pass
+
+        used = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if used <= room:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            used -= size
+
@@ -0,0 +1,280 @@
+"""Storage of captured system state, for --capture and --replay
+
+A capture maps keys to recorded text: "timestamp", "run/<slug>" for
+the output of each command (see `Replayhost.SlugOf()`), and
+"rootfs/<path>" for each file read.  Two formats are supported:
+
+Directory: each key is a file below the capture directory.  This is
+the format of the fixtures in test/case/statd, easy to inspect, edit
+and diff, but a big tree of tiny files.
+
+Archive: a single file, with any number of named captures, selected
+with ARCHIVE:NAME (default name is empty).  The layout is:
+
+    MAGIC | blob ... | index | trailer
+
+Each blob is the, usually zlib compressed, content of one or more
+keys; identical content is only stored once, also across captures.
+The index is compressed JSON:
+
+    { "blobs": [[offset, length, size, compressed, sha1], ...],
+      "captures": { NAME: { KEY: blob number, ... }, ... } }
+
+and the trailer is MAGIC, the index offset and length.  Replay maps
+the file and looks up a key in the index, then slices out its blob.
+
+To convert between the formats:
+
+    python3 -m yanger.capture pack ARCHIVE[:NAME] DIR
+    python3 -m yanger.capture unpack ARCHIVE[:NAME] DIR
+    python3 -m yanger.capture list ARCHIVE
+"""
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+
+MAGIC = b"YNGRCAP1"
+TRAILER = struct.Struct("<8sQQ")
+SUFFIX = ".ycap"
+
+
+def _split(path):
+    """Split ARCHIVE[:NAME] into (archive, name)"""
+    if os.path.exists(path) or ":" not in path:
+        return path, ""
+    archive, name = path.rsplit(":", 1)
+    return archive, name
+
+
+def is_archive(path, new=True):
+    """Whether path refers to a capture archive, rather than a directory
+
+    Existing files are archives, and so are new ones named *.ycap,
+    unless new is False.
+
+    """
+    archive, _ = _split(path)
+    return os.path.isfile(archive) or \
+        (new and archive.endswith(SUFFIX) and not os.path.isdir(archive))
+
+
+def open_capture(path, write=False):
+    """Open capture directory or archive at path"""
+    if is_archive(path):
+        return Archive(*_split(path), write=write)
+    return Directory(path, write=write)
+
+
+class Directory:
+    def __init__(self, path, write=False):
+        self.path = path
+        if write:
+            for subdir in ("rootfs", "run"):
+                os.makedirs(os.path.join(path, subdir), exist_ok=True)
+
+    def get(self, key):
+        """Get text of key, or None if not captured"""
+        try:
+            with open(os.path.join(self.path, key), "r", encoding="utf-8") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+
+    def open(self, key):
+        """Get text stream of key, or None if not captured"""
+        try:
+            return open(os.path.join(self.path, key), "r", encoding="utf-8")
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+
+    def has(self, key):
+        """Whether key, or any key below it, has been captured"""
+        return os.path.exists(os.path.join(self.path, key))
+
+    def put(self, key, text):
+        path = os.path.join(self.path, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def keys(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                yield os.path.relpath(os.path.join(root, name), self.path)
+
+    def close(self):
+        pass
+
+
+class Archive:
+    def __init__(self, path, name="", write=False):
+        self.path = path
+        self.name = name
+        self.write = write
+        self.blobs = []
+        self.captures = {}
+        self.new = {}
+        self.mm = None
+
+        try:
+            with open(path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            if not write:
+                raise
+        if self.mm is not None:
+            self._load()
+
+        if name is None:
+            # Only for listing the captures
+            self.index = {}
+            return
+        if name not in self.captures and not write:
+            if name or len(self.captures) != 1:
+                raise KeyError(f"{path}: no capture named \"{name}\", "
+                               f"available: {', '.join(map(repr, self.captures))}")
+            self.name = next(iter(self.captures))
+
+        self.index = self.captures.setdefault(self.name, {})
+        self._dirs = None
+
+    def _load(self):
+        magic, off, length = TRAILER.unpack_from(self.mm, len(self.mm) - TRAILER.size)
+        if magic != MAGIC or self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path}: not a capture archive")
+
+        index = json.loads(zlib.decompress(self.mm[off:off + length]))
+        self.blobs = index["blobs"]
+        self.captures = index["captures"]
+
+    def _blob(self, num):
+        off, length, _, compressed, _ = self.blobs[num]
+        data = self.mm[off:off + length]
+        return zlib.decompress(data) if compressed else data
+
+    def get(self, key):
+        """Get text of key, or None if not captured"""
+        if key in self.new:
+            return self.new[key].decode("utf-8")
+        if (num := self.index.get(key)) is None:
+            return None
+        return self._blob(num).decode("utf-8")
+
+    def open(self, key):
+        """Get text stream of key, or None if not captured"""
+        text = self.get(key)
+        return io.StringIO(text) if text is not None else None
+
+    def has(self, key):
+        """Whether key, or any key below it, has been captured"""
+        if key in self.index or key in self.new:
+            return True
+
+        if self._dirs is None:
+            self._dirs = set()
+            for k in self.index:
+                while (k := os.path.dirname(k)):
+                    self._dirs.add(k)
+        return key.rstrip("/") in self._dirs or \
+            any(k.startswith(key.rstrip("/") + "/") for k in self.new)
+
+    def put(self, key, text):
+        self.new[key] = text.encode("utf-8")
+
+    def keys(self):
+        return list(dict.fromkeys(list(self.index) + list(self.new)))
+
+    def close(self):
+        """Write any new entries to the archive"""
+        if self.write and self.new:
+            self._save()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def _save(self):
+        import hashlib
+
+        tmp = f"{self.path}.{os.getpid()}"
+        blobs, byhash = [], {}
+
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+
+            def add(sha1, packed, size, compressed):
+                if sha1 not in byhash:
+                    byhash[sha1] = len(blobs)
+                    blobs.append([f.tell(), len(packed), size, compressed, sha1])
+                    f.write(packed)
+                return byhash[sha1]
+
+            captures = {}
+            for name, index in self.captures.items():
+                captures[name] = {}
+                for key, num in index.items():
+                    if name == self.name and key in self.new:
+                        continue
+                    off, length, size, compressed, sha1 = self.blobs[num]
+                    captures[name][key] = add(sha1, self.mm[off:off + length],
+                                              size, compressed)
+
+            for key, data in self.new.items():
+                packed = zlib.compress(data, 9)
+                compressed = len(packed) < len(data)
+                captures[self.name][key] = add(hashlib.sha1(data).hexdigest(),
+                                               packed if compressed else data,
+                                               len(data), int(compressed))
+
+            index = zlib.compress(json.dumps({
+                "blobs": blobs,
+                "captures": captures,
+            }, separators=(",", ":")).encode("utf-8"), 9)
+            off = f.tell()
+            f.write(index)
+            f.write(TRAILER.pack(MAGIC, off, len(index)))
+
+        os.replace(tmp, self.path)
+
+
+def _copy(src, dst):
+    for key in sorted(src.keys()):
+        if (text := src.get(key)) is not None:
+            dst.put(key, text)
+
+
+def main(argv):
+    if len(argv) == 2 and argv[0] == "list":
+        archive = Archive(argv[1], None)
+        archive.close()
+
+        size = sum(blob[2] for blob in archive.blobs)
+        for name, index in archive.captures.items():
+            print(f"{name or '(default)'}: {len(index)} entries")
+        print(f"{len(archive.blobs)} unique blobs, {size} bytes, "
+              f"{os.path.getsize(argv[1])} bytes archived")
+        return 0
+
+    if len(argv) == 3 and argv[0] in ("pack", "unpack"):
+        archive, directory = argv[1], argv[2]
+        if argv[0] == "pack":
+            src, dst = Directory(directory), Archive(*_split(archive), write=True)
+            dst.index.clear()
+        else:
+            src, dst = Archive(*_split(archive)), Directory(directory, write=True)
+
+        _copy(src, dst)
+        dst.close()
+        src.close()
+        return 0
+
+    sys.stderr.write(__doc__[__doc__.index("To convert"):])
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
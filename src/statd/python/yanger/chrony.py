@@ -0,0 +1,454 @@
+"""Native chronyd command client, and the records shared by models
+
+Both ietf-ntp and ietf-system report on chronyd, and used to run
+`chronyc -c` once per report, sources, sourcestats, tracking and
+serverstats, and parse the CSV output.
+
+On the running system, this module talks chronyd's command protocol,
+see candm.h in the chrony sources, directly over its Unix socket.  All
+requests are sent in one session: first the number of sources, the
+tracking and the server statistics, then the data and statistics of
+every source at once.  Other hosts, or if chronyd cannot be reached
+like this, still run chronyc.
+
+Either way, the reports are records, dicts keyed by the names of the
+fields in candm.h, with typed values, in the order chronyc prints them.
+"""
+import os
+import socket
+import struct
+import time
+from functools import cache
+
+from .common import LOG
+from .host import HOST
+from .trace import span
+
+
+SOCKET = "/run/chrony/chronyd.sock"
+
+# Where confd puts the NTP server config, see ntp.c
+CONF_FILES = ("/etc/chrony/chrony.conf", "/etc/chrony/conf.d/ntp-server.conf")
+NTP_PORT = 123
+
+PROTO_VERSION = 6
+PKT_TYPE_CMD_REQUEST = 1
+PKT_TYPE_CMD_REPLY = 2
+STT_SUCCESS = 0
+
+REQ_N_SOURCES = 14
+REQ_SOURCE_DATA = 15
+REQ_TRACKING = 33
+REQ_SOURCESTATS = 34
+REQ_SERVER_STATS = 54
+
+RPY_N_SOURCES = 2
+RPY_SOURCE_DATA = 3
+RPY_TRACKING = 5
+RPY_SOURCESTATS = 6
+RPY_SERVER_STATS = 14
+RPY_SERVER_STATS2 = 22
+RPY_SERVER_STATS3 = 24
+RPY_SERVER_STATS4 = 25
+
+IPADDR_INET4 = 1
+IPADDR_INET6 = 2
+IPADDR_ID = 3
+
+REQUEST = struct.Struct(">BBBBHHIII")
+REPLY = struct.Struct(">BBBBHHHHHHIII")
+IPADDR = struct.Struct(">16sHH")
+
+# Replies are never larger than their request, which is padded up to
+# the largest reply, the server statistics of chrony 4.4
+REQUEST_LENGTH = REPLY.size + 21 * 8
+
+MODES = {0: "^", 1: "=", 2: "#"}
+STATES = {0: "*", 1: "?", 2: "x", 3: "~", 4: "+", 5: "-"}
+LEAP_STATUS = ("Normal", "Insert second", "Delete second", "Not synchronised")
+
+# Server statistics, in the order of chronyc, and of RPY_ServerStats4
+SERVER_STATS = (
+    "ntp_hits", "ntp_drops", "cmd_hits", "cmd_drops", "log_drops",
+    "nke_hits", "nke_drops", "ntp_auth_hits", "ntp_interleaved_hits",
+    "ntp_timestamps", "ntp_span_seconds",
+    "ntp_daemon_rx_timestamps", "ntp_daemon_tx_timestamps",
+    "ntp_kernel_rx_timestamps", "ntp_kernel_tx_timestamps",
+    "ntp_hw_rx_timestamps", "ntp_hw_tx_timestamps",
+)
+
+# Order of the counters in older replies, before they were 64-bit
+SERVER_STATS_ORDER = {
+    RPY_SERVER_STATS: ("ntp_hits", "cmd_hits", "ntp_drops", "cmd_drops",
+                       "log_drops"),
+    RPY_SERVER_STATS2: ("ntp_hits", "nke_hits", "cmd_hits", "ntp_drops",
+                        "nke_drops", "cmd_drops", "log_drops",
+                        "ntp_auth_hits"),
+    RPY_SERVER_STATS3: ("ntp_hits", "nke_hits", "cmd_hits", "ntp_drops",
+                        "nke_drops", "cmd_drops", "log_drops",
+                        "ntp_auth_hits", "ntp_interleaved_hits",
+                        "ntp_timestamps", "ntp_span_seconds"),
+    RPY_SERVER_STATS4: ("ntp_hits", "nke_hits", "cmd_hits", "ntp_drops",
+                        "nke_drops", "cmd_drops", "log_drops",
+                        "ntp_auth_hits", "ntp_interleaved_hits",
+                        "ntp_timestamps", "ntp_span_seconds",
+                        "ntp_daemon_rx_timestamps", "ntp_daemon_tx_timestamps",
+                        "ntp_kernel_rx_timestamps", "ntp_kernel_tx_timestamps",
+                        "ntp_hw_rx_timestamps", "ntp_hw_tx_timestamps"),
+}
+
+CHRONYC = {
+    "sources":     ("chronyc", "-c", "sources"),
+    "sourcestats": ("chronyc", "-c", "sourcestats"),
+    "tracking":    ("chronyc", "-c", "tracking"),
+    "serverstats": ("chronyc", "-c", "serverstats"),
+}
+
+
+def _float(data, offset):
+    """Decode chrony's 32-bit Float: 7-bit exponent, 25-bit coefficient"""
+    x = struct.unpack_from(">I", data, offset)[0]
+
+    exp = x >> 25
+    if exp >= 1 << 6:
+        exp -= 1 << 7
+    coef = x & ((1 << 25) - 1)
+    if coef >= 1 << 24:
+        coef -= 1 << 25
+
+    return coef * 2.0 ** (exp - 25)
+
+
+def _floats(data, offset, count):
+    return [_float(data, offset + 4 * i) for i in range(count)]
+
+
+def _refid(refid):
+    """Reference id as text, like chronyc, e.g. "GPS" """
+    return "".join(chr(c) for c in refid.to_bytes(4, "big")
+                   if 32 < c < 127)
+
+
+def _ipaddr(data, offset):
+    """Address, or reference id of reference clocks, as text"""
+    addr, family, _ = IPADDR.unpack_from(data, offset)
+    if family == IPADDR_INET4:
+        return socket.inet_ntop(socket.AF_INET, addr[:4])
+    if family == IPADDR_INET6:
+        return socket.inet_ntop(socket.AF_INET6, addr)
+    if family == IPADDR_ID:
+        return _refid(struct.unpack_from(">I", addr)[0])
+    return ""
+
+
+def _source_data(data):
+    name = _ipaddr(data, 0)
+    poll, stratum, state, mode, _, reach, since = \
+        struct.unpack_from(">hHHHHHI", data, IPADDR.size)
+    if since == 0xffffffff:
+        since = None
+    orig, latest, err = _floats(data, IPADDR.size + 16, 3)
+    return {
+        "mode": MODES.get(mode, "?"),
+        "state": STATES.get(state, "?"),
+        "name": name,
+        "stratum": stratum,
+        "poll": poll,
+        "reachability": reach,
+        "since_sample": since,
+        "orig_latest_meas": orig,
+        "latest_meas": latest,
+        "latest_meas_err": err,
+    }
+
+
+def _sourcestats(data):
+    refid = struct.unpack_from(">I", data)[0]
+    name = _ipaddr(data, 4) or _refid(refid)
+    samples, runs, span_seconds = struct.unpack_from(">III", data, 4 + IPADDR.size)
+    sd, resid, skew, offset, _ = _floats(data, 16 + IPADDR.size, 5)
+    return {
+        "name": name,
+        "n_samples": samples,
+        "n_runs": runs,
+        "span_seconds": span_seconds,
+        "resid_freq_ppm": resid,
+        "skew_ppm": skew,
+        "est_offset": offset,
+        "sd": sd,
+    }
+
+
+def _tracking(data):
+    refid = struct.unpack_from(">I", data)[0]
+    name = _ipaddr(data, 4) or _refid(refid)
+    stratum, leap, sec_high, sec_low, nsec = \
+        struct.unpack_from(">HHIII", data, 4 + IPADDR.size)
+    if sec_high == 0x7fffffff:
+        sec_high = 0
+    (correction, last_offset, rms_offset, freq, resid, skew, root_delay,
+     root_dispersion, interval) = _floats(data, 20 + IPADDR.size, 9)
+    return {
+        "ref_id": refid,
+        "name": name,
+        "stratum": stratum,
+        "ref_time": (sec_high << 32 | sec_low) + nsec / 1e9,
+        "current_correction": correction,
+        "last_offset": last_offset,
+        "rms_offset": rms_offset,
+        "freq_ppm": freq,
+        "resid_freq_ppm": resid,
+        "skew_ppm": skew,
+        "root_delay": root_delay,
+        "root_dispersion": root_dispersion,
+        "last_update_interval": interval,
+        "leap_status": LEAP_STATUS[leap] if leap < len(LEAP_STATUS) else "Invalid",
+    }
+
+
+def _server_stats(reply, data):
+    names = SERVER_STATS_ORDER[reply]
+    if reply == RPY_SERVER_STATS4:
+        values = [hi << 32 | lo for hi, lo in
+                  struct.iter_unpack(">II", data[:8 * len(names)])]
+    else:
+        values = struct.unpack_from(f">{len(names)}I", data)
+
+    counters = dict(zip(names, values))
+    return {name: counters[name] for name in SERVER_STATS if name in counters}
+
+
+# Reply, and its length without the header, for each request
+REPLIES = {
+    REQ_N_SOURCES:   {RPY_N_SOURCES: 4},
+    REQ_SOURCE_DATA: {RPY_SOURCE_DATA: IPADDR.size + 28},
+    REQ_TRACKING:    {RPY_TRACKING: IPADDR.size + 56},
+    REQ_SOURCESTATS: {RPY_SOURCESTATS: IPADDR.size + 36},
+    REQ_SERVER_STATS: {
+        RPY_SERVER_STATS: 5 * 4,
+        RPY_SERVER_STATS2: 8 * 4,
+        RPY_SERVER_STATS3: 11 * 4,
+        RPY_SERVER_STATS4: 21 * 8,
+    },
+}
+
+
+class Chrony:
+    """Command session with chronyd, over its Unix socket"""
+
+    def __init__(self, path=SOCKET, timeout=1.0):
+        self.timeout = timeout
+        self.seq = int.from_bytes(os.urandom(4), "big")
+
+        # Like chronyc, bind to a path next to the socket of chronyd,
+        # which replies to paths only, and drops privileges
+        self.local = os.path.join(os.path.dirname(path), f"yanger.{os.getpid()}.sock")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            if os.path.exists(self.local):
+                os.unlink(self.local)
+            self.sock.bind(self.local)
+            os.chmod(self.local, 0o666)
+            self.sock.connect(path)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.local)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        return False
+
+    def transact(self, requests):
+        """Send all (command, data) requests, get their (reply, data)
+
+        Replies are in the order of the requests, None where chronyd
+        reported an error.  Raises TimeoutError if any is missing.
+
+        """
+        pending = {}
+        for i, (command, data) in enumerate(requests):
+            self.seq = (self.seq + 1) & 0xffffffff
+            msg = REQUEST.pack(PROTO_VERSION, PKT_TYPE_CMD_REQUEST, 0, 0,
+                               command, 0, self.seq, 0, 0) + data
+            self.sock.send(msg.ljust(REQUEST_LENGTH, b"\0"))
+            pending[self.seq] = (i, command)
+
+        replies = [None] * len(requests)
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{len(pending)} chronyd replies missing")
+
+            self.sock.settimeout(remaining)
+            msg = self.sock.recv(REQUEST_LENGTH)
+            if len(msg) < REPLY.size:
+                continue
+
+            (version, pkt_type, _, _, command, reply, status, _, _, _, seq,
+             _, _) = REPLY.unpack_from(msg)
+            if version != PROTO_VERSION or pkt_type != PKT_TYPE_CMD_REPLY or \
+               seq not in pending or pending[seq][1] != command:
+                continue
+
+            i, _ = pending.pop(seq)
+            data = msg[REPLY.size:]
+            size = REPLIES[command].get(reply)
+            if status != STT_SUCCESS or size is None or len(data) < size:
+                continue
+            replies[i] = (reply, data)
+
+        return replies
+
+    def reports(self):
+        """Get all reports, by chronyc command name"""
+        nsources, tracking, stats = self.transact([
+            (REQ_N_SOURCES, b""),
+            (REQ_TRACKING, b""),
+            (REQ_SERVER_STATS, b""),
+        ])
+        if nsources is None:
+            raise OSError("chronyd did not report its sources")
+
+        count = struct.unpack_from(">I", nsources[1])[0]
+        replies = self.transact(
+            [(REQ_SOURCE_DATA, struct.pack(">i", i)) for i in range(count)] +
+            [(REQ_SOURCESTATS, struct.pack(">I", i)) for i in range(count)])
+
+        return {
+            "sources": [_source_data(r[1]) for r in replies[:count] if r],
+            "sourcestats": [_sourcestats(r[1]) for r in replies[count:] if r],
+            "tracking": [_tracking(tracking[1])] if tracking else [],
+            "serverstats": [_server_stats(*stats)] if stats else [],
+        }
+
+
+def _seconds(field):
+    # chronyc prints "-" for never
+    return int(field) if field.isdigit() else None
+
+
+def _csv_source(f):
+    return {
+        "mode": f[0],
+        "state": f[1],
+        "name": f[2],
+        "stratum": int(f[3]),
+        "poll": int(f[4]),
+        "reachability": int(f[5], 8),
+        "since_sample": _seconds(f[6]),
+        "orig_latest_meas": float(f[7]),
+        "latest_meas": float(f[8]),
+        "latest_meas_err": float(f[9]),
+    }
+
+
+def _csv_sourcestats(f):
+    return {
+        "name": f[0],
+        "n_samples": int(f[1]),
+        "n_runs": int(f[2]),
+        "span_seconds": int(f[3]),
+        "resid_freq_ppm": float(f[4]),
+        "skew_ppm": float(f[5]),
+        "est_offset": float(f[6]),
+        "sd": float(f[7]),
+    }
+
+
+def _csv_tracking(f):
+    return {
+        "ref_id": int(f[0], 16),
+        "name": f[1],
+        "stratum": int(f[2]),
+        "ref_time": float(f[3]),
+        "current_correction": float(f[4]),
+        "last_offset": float(f[5]),
+        "rms_offset": float(f[6]),
+        "freq_ppm": float(f[7]),
+        "resid_freq_ppm": float(f[8]),
+        "skew_ppm": float(f[9]),
+        "root_delay": float(f[10]),
+        "root_dispersion": float(f[11]),
+        "last_update_interval": float(f[12]),
+        "leap_status": f[13].strip(),
+    }
+
+
+def _csv_serverstats(f):
+    return {name: int(val) for name, val in zip(SERVER_STATS, f)}
+
+
+CSV = {
+    "sources":     (10, _csv_source),
+    "sourcestats": (8, _csv_sourcestats),
+    "tracking":    (14, _csv_tracking),
+    "serverstats": (5, _csv_serverstats),
+}
+
+
+@cache
+def _native():
+    """All reports of chronyd in one session, or None to run chronyc"""
+    if not HOST.NATIVE:
+        return None
+
+    try:
+        with span(SOCKET, "cmdmon"), Chrony() as session:
+            return session.reports()
+    except OSError as err:
+        LOG.debug("chronyd command session failed, falling back to chronyc: %s", err)
+        return None
+
+
+def report(name):
+    """Get the records of a chronyc report, e.g. "sources" """
+    if (native := _native()) is not None:
+        return native[name]
+
+    fields, parse = CSV[name]
+    records = []
+    for line in HOST.run_multiline(CHRONYC[name], []):
+        parts = line.split(",")
+        if len(parts) < fields:
+            continue
+        try:
+            records.append(parse(parts))
+        except ValueError:
+            continue
+
+    return records
+
+
+def commands(*names):
+    """chronyc commands of reports, to prefetch, none if read natively"""
+    return [] if HOST.NATIVE else [CHRONYC[name] for name in names]
+
+
+def server_port():
+    """NTP server port of chronyd, from its config, or None if not a server
+
+    Like chronyd, the port is only opened if clients are allowed.
+    """
+    port, allow = NTP_PORT, False
+    for path in CONF_FILES:
+        for line in HOST.read_multiline(path, []):
+            words = line.split("#", 1)[0].split()
+            if not words:
+                continue
+            if words[0] == "allow":
+                allow = True
+            elif words[0] == "port" and len(words) > 1 and words[1].isdigit():
+                port = int(words[1])
+
+    return port if allow and port else None
@@ -1,3 +1,4 @@
+import json
 import syslog
 from datetime import timedelta
 
@@ -46,6 +47,10 @@ class SysLog:
 
 LOG = SysLog("yanger")
 
+# Set when serving requests, see server.py, then models may keep data
+# across requests, as long as they know when it goes stale
+PERSISTENT = False
+
 class YangDate:
     def __init__(self, dt=None):
         self.dt = dt if dt else host.HOST.now()
@@ -80,3 +85,94 @@ def insert(obj, *path_and_value):
         curr = curr[key]
 
     curr[path[-1]] = value
+
+
+def merge(dst, src):
+    """Recursively merge the json object src into dst
+
+    Objects are merged key by key and lists are concatenated, e.g. the
+    control-plane-protocol lists from ietf-ospf and ietf-rip.
+    """
+    for key, value in src.items():
+        curr = dst.get(key)
+        if isinstance(curr, dict) and isinstance(value, dict):
+            merge(curr, value)
+        elif isinstance(curr, list) and isinstance(value, list):
+            curr.extend(value)
+        else:
+            dst[key] = value
+
+    return dst
+
+
+class Stream:
+    """List whose items are produced while the output is written
+
+    For lists too large to hold in memory all at once, e.g. the routes
+    of a full table RIB.  Items are converted and written one by one by
+    `dump()`, so the iterable can only be consumed once.
+    """
+    def __init__(self, items):
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _has_stream(obj):
+    if isinstance(obj, Stream):
+        return True
+    if isinstance(obj, dict):
+        return any(_has_stream(v) for v in obj.values())
+    if isinstance(obj, list):
+        return any(_has_stream(v) for v in obj)
+    return False
+
+
+def _dump(obj, fp, indent, separators, depth):
+    if not _has_stream(obj):
+        text = json.dumps(obj, indent=indent, separators=separators,
+                          ensure_ascii=False)
+        if indent is not None and depth:
+            # Newlines in JSON are always indentation, never in strings
+            text = text.replace("\n", "\n" + " " * (indent * depth))
+        fp.write(text)
+        return
+
+    item_sep, key_sep = separators
+    if indent is None:
+        nl = close = ""
+    else:
+        nl = "\n" + " " * (indent * (depth + 1))
+        close = "\n" + " " * (indent * depth)
+
+    if isinstance(obj, dict):
+        fp.write("{")
+        items = obj.items()
+    else:
+        fp.write("[")
+        items = ((None, item) for item in obj)
+
+    first = True
+    for key, value in items:
+        fp.write(nl if first else item_sep + nl)
+        if key is not None:
+            fp.write(json.dumps(key, ensure_ascii=False) + key_sep)
+        _dump(value, fp, indent, separators, depth + 1)
+        first = False
+
+    if not first:
+        fp.write(close)
+    fp.write("}" if isinstance(obj, dict) else "]")
+
+
+def dump(obj, fp, indent=None, separators=None):
+    """Write obj as JSON to fp, like json.dump() with ensure_ascii=False
+
+    The output is identical, but any `Stream` in obj is expanded as a
+    list, one item at a time.
+    """
+    if separators is None:
+        separators = (", ", ": ") if indent is None else (",", ": ")
+
+    _dump(obj, fp, indent, separators, 0)
@@ -0,0 +1,292 @@
+"""Native ethtool netlink client
+
+Link settings and statistics of Ethernet ports used to be read by
+running `ethtool --json PORT` and `ethtool --json -S PORT --all-groups`,
+two processes per port.  On switches with many ports, that is most of
+the time spent in an interfaces query.
+
+This module dumps the same data, for all ports at once, over the
+ethtool generic netlink family: one request each for link info, link
+modes, link state and standard statistics.  The results are shaped
+like the output of those commands, keyed by interface name, so the
+models can use them as-is.
+
+Only the running system can be queried like this, see `Host.NATIVE`.
+"""
+import struct
+
+from .netlink import Netlink, NETLINK_GENERIC, _attr, _attrs, _iterattrs, \
+    _str, _u8, _u16, _u32, _u64
+
+
+GENL_ID_CTRL = 16
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+ETHTOOL_GENL_VERSION = 1
+
+ETHTOOL_MSG_LINKINFO_GET = 2
+ETHTOOL_MSG_LINKMODES_GET = 4
+ETHTOOL_MSG_LINKSTATE_GET = 6
+ETHTOOL_MSG_STATS_GET = 32
+
+ETHTOOL_A_HEADER_DEV_INDEX = 1
+ETHTOOL_A_HEADER_DEV_NAME = 2
+
+# Same attribute number for link info, link modes and link state
+ETHTOOL_A_LINK_HEADER = 1
+
+ETHTOOL_A_LINKINFO_PORT = 2
+ETHTOOL_A_LINKINFO_PHYADDR = 3
+ETHTOOL_A_LINKINFO_TRANSCEIVER = 6
+
+ETHTOOL_A_LINKMODES_AUTONEG = 2
+ETHTOOL_A_LINKMODES_OURS = 3
+ETHTOOL_A_LINKMODES_SPEED = 5
+ETHTOOL_A_LINKMODES_DUPLEX = 6
+
+ETHTOOL_A_LINKSTATE_LINK = 2
+
+ETHTOOL_A_BITSET_NOMASK = 1
+ETHTOOL_A_BITSET_SIZE = 2
+ETHTOOL_A_BITSET_BITS = 3
+ETHTOOL_A_BITSET_VALUE = 4
+ETHTOOL_A_BITSET_BIT_NAME = 2
+ETHTOOL_A_BITSET_BIT_VALUE = 3
+
+ETHTOOL_A_STATS_HEADER = 2
+ETHTOOL_A_STATS_GROUPS = 3
+ETHTOOL_A_STATS_GRP = 4
+ETHTOOL_A_STATS_GRP_ID = 2
+ETHTOOL_A_STATS_GRP_STAT = 4
+ETHTOOL_A_STATS_GRP_HIST_RX = 5
+ETHTOOL_A_STATS_GRP_HIST_TX = 6
+ETHTOOL_A_STATS_GRP_HIST_BKT_LOW = 7
+ETHTOOL_A_STATS_GRP_HIST_BKT_HI = 8
+ETHTOOL_A_STATS_GRP_HIST_VAL = 9
+
+PORTS = {
+    0x00: "Twisted Pair", 0x01: "AUI", 0x02: "MII", 0x03: "FIBRE",
+    0x04: "BNC", 0x05: "Direct Attach Copper", 0xef: "None",
+    0xff: "Other",
+}
+DUPLEX = {0: "Half", 1: "Full"}
+SPEED_UNKNOWN = (0, 0xffff, 0xffffffff)
+TRANSCEIVERS = {0: "internal", 1: "external"}
+
+# Standard statistics groups, in ETHTOOL_STATS_* order, and the names
+# of their counters, in ETHTOOL_A_STATS_* order, same as the kernel's
+# string sets that ethtool(8) prints them by.
+STATS_GROUPS = ("eth-phy", "eth-mac", "eth-ctrl", "rmon")
+STATS_NAMES = {
+    "eth-phy": (
+        "SymbolErrorDuringCarrier",
+    ),
+    "eth-mac": (
+        "FramesTransmittedOK", "SingleCollisionFrames",
+        "MultipleCollisionFrames", "FramesReceivedOK",
+        "FrameCheckSequenceErrors", "AlignmentErrors",
+        "OctetsTransmittedOK", "FramesWithDeferredXmissions",
+        "LateCollisions", "FramesAbortedDueToXSColls",
+        "FramesLostDueToIntMACXmitError", "CarrierSenseErrors",
+        "OctetsReceivedOK", "FramesLostDueToIntMACRcvError",
+        "MulticastFramesXmittedOK", "BroadcastFramesXmittedOK",
+        "FramesWithExcessiveDeferral", "MulticastFramesReceivedOK",
+        "BroadcastFramesReceivedOK", "InRangeLengthErrors",
+        "OutOfRangeLengthField", "FrameTooLongErrors",
+    ),
+    "eth-ctrl": (
+        "MACControlFramesTransmitted", "MACControlFramesReceived",
+        "UnsupportedOpcodesReceived",
+    ),
+    "rmon": (
+        "etherStatsUndersizePkts", "etherStatsOversizePkts",
+        "etherStatsFragments", "etherStatsJabbers",
+    ),
+}
+
+
+NLA_F_NESTED = 0x8000
+
+
+def _nest(atype, *attrs):
+    # Required by the strict validation of ethtool requests
+    return _attr(atype | NLA_F_NESTED, b"".join(attrs))
+
+
+def _header(data):
+    """Get ifname from an ETHTOOL_A_*_HEADER nest"""
+    tb = _attrs(data, 0, len(data))
+    if ETHTOOL_A_HEADER_DEV_NAME in tb:
+        return _str(tb[ETHTOOL_A_HEADER_DEV_NAME])
+    return f"if{_u32(tb.get(ETHTOOL_A_HEADER_DEV_INDEX, bytes(4)))}"
+
+
+def _link_modes(data):
+    """Get (supported, advertised) link modes from a verbose bitset
+
+    The bitset lists every supported bit, with a value flag on the
+    advertised ones.  Only actual link modes are kept, like ethtool(8)
+    does, not e.g. Autoneg, TP and Pause, which share the bitset.
+    """
+    supported, advertised = [], []
+    tb = _attrs(data, 0, len(data))
+    bits = tb.get(ETHTOOL_A_BITSET_BITS, b"")
+    for _, bit in _iterattrs(bits, 0, len(bits)):
+        btb = _attrs(bit, 0, len(bit))
+        name = _str(btb.get(ETHTOOL_A_BITSET_BIT_NAME, b""))
+        if "base" not in name:
+            continue
+        supported.append(name)
+        if ETHTOOL_A_BITSET_BIT_VALUE in btb:
+            advertised.append(name)
+    return supported, advertised
+
+
+def _hist(data):
+    tb = _attrs(data, 0, len(data))
+    return {
+        "low": _u32(tb.get(ETHTOOL_A_STATS_GRP_HIST_BKT_LOW, bytes(4))),
+        "high": _u32(tb.get(ETHTOOL_A_STATS_GRP_HIST_BKT_HI, bytes(4))),
+        "val": _u64(tb.get(ETHTOOL_A_STATS_GRP_HIST_VAL, bytes(8))),
+    }
+
+
+def _stats_group(data):
+    """Get (name, counters) of an ETHTOOL_A_STATS_GRP nest"""
+    gid, counters, rx, tx = None, {}, [], []
+    for atype, val in _iterattrs(data, 0, len(data)):
+        if atype == ETHTOOL_A_STATS_GRP_ID:
+            gid = _u32(val)
+        elif atype == ETHTOOL_A_STATS_GRP_STAT:
+            # A nest of one attribute, its type is the counter index
+            for index, counter in _iterattrs(val, 0, len(val)):
+                if len(counter) == 8:   # Not padding
+                    counters[index] = _u64(counter)
+        elif atype == ETHTOOL_A_STATS_GRP_HIST_RX:
+            rx.append(_hist(val))
+        elif atype == ETHTOOL_A_STATS_GRP_HIST_TX:
+            tx.append(_hist(val))
+
+    if gid is None or gid >= len(STATS_GROUPS):
+        return None, None
+
+    group = STATS_GROUPS[gid]
+    names = STATS_NAMES[group]
+    out = {names[i] if i < len(names) else f"{group}-{i}": val
+           for i, val in sorted(counters.items())}
+    if rx:
+        out["rx-pktsNtoM"] = rx
+    if tx:
+        out["tx-pktsNtoM"] = tx
+    return group, out
+
+
+class Ethtool(Netlink):
+    """Generic netlink socket talking to the ethtool family"""
+
+    def __init__(self):
+        super().__init__(protocol=NETLINK_GENERIC)
+        try:
+            self.family = self._family("ethtool")
+        except OSError:
+            self.close()
+            raise
+
+    def _family(self, name):
+        body = struct.pack("=BBxx", CTRL_CMD_GETFAMILY, 1) + \
+            _attr(CTRL_ATTR_FAMILY_NAME, name.encode() + b"\0")
+        for _, data, start, end in self.request(GENL_ID_CTRL, body, dump=False):
+            tb = _attrs(data, start + 4, end)
+            if CTRL_ATTR_FAMILY_ID in tb:
+                return _u16(tb[CTRL_ATTR_FAMILY_ID])
+        raise OSError(f"No generic netlink family {name}")
+
+    def dump(self, cmd, *attrs):
+        """Yield (ifname, attributes) of each port in reply to cmd"""
+        body = struct.pack("=BBxx", cmd, ETHTOOL_GENL_VERSION) + b"".join(attrs)
+        header = ETHTOOL_A_STATS_HEADER if cmd == ETHTOOL_MSG_STATS_GET \
+            else ETHTOOL_A_LINK_HEADER
+
+        for mtype, data, start, end in self.request(self.family, body):
+            if mtype != self.family:
+                continue
+            tb = _attrs(data, start + 4, end)
+            if header in tb:
+                yield _header(tb[header]), data, start + 4, end, tb
+
+    def settings(self):
+        """Get ifname -> `ethtool --json PORT` of all ports"""
+        ports = {}
+
+        def port(ifname):
+            return ports.setdefault(ifname, {"ifname": ifname})
+
+        hdr = _nest(ETHTOOL_A_LINK_HEADER)
+        for ifname, _, _, _, tb in self.dump(ETHTOOL_MSG_LINKMODES_GET, hdr):
+            out = port(ifname)
+            if ETHTOOL_A_LINKMODES_OURS in tb:
+                supported, advertised = _link_modes(tb[ETHTOOL_A_LINKMODES_OURS])
+                out["supported-link-modes"] = supported
+                out["advertised-link-modes"] = advertised
+            # Values that are unknown, e.g. without link, are left out,
+            # same as by ethtool(8)
+            if ETHTOOL_A_LINKMODES_SPEED in tb:
+                speed = _u32(tb[ETHTOOL_A_LINKMODES_SPEED])
+                if speed not in SPEED_UNKNOWN:
+                    out["speed"] = speed
+            if ETHTOOL_A_LINKMODES_DUPLEX in tb:
+                duplex = _u8(tb[ETHTOOL_A_LINKMODES_DUPLEX])
+                if duplex in DUPLEX:
+                    out["duplex"] = DUPLEX[duplex]
+            if ETHTOOL_A_LINKMODES_AUTONEG in tb:
+                out["auto-negotiation"] = _u8(tb[ETHTOOL_A_LINKMODES_AUTONEG]) == 1
+
+        for ifname, _, _, _, tb in self.dump(ETHTOOL_MSG_LINKINFO_GET, hdr):
+            out = port(ifname)
+            if ETHTOOL_A_LINKINFO_PORT in tb:
+                num = _u8(tb[ETHTOOL_A_LINKINFO_PORT])
+                if num in PORTS:
+                    out["port"] = PORTS[num]
+            if ETHTOOL_A_LINKINFO_PHYADDR in tb:
+                out["phyad"] = _u8(tb[ETHTOOL_A_LINKINFO_PHYADDR])
+            if ETHTOOL_A_LINKINFO_TRANSCEIVER in tb:
+                num = _u8(tb[ETHTOOL_A_LINKINFO_TRANSCEIVER])
+                if num in TRANSCEIVERS:
+                    out["transceiver"] = TRANSCEIVERS[num]
+
+        for ifname, _, _, _, tb in self.dump(ETHTOOL_MSG_LINKSTATE_GET, hdr):
+            if ETHTOOL_A_LINKSTATE_LINK in tb:
+                port(ifname)["link-detected"] = bool(_u8(tb[ETHTOOL_A_LINKSTATE_LINK]))
+
+        return ports
+
+    def statistics(self):
+        """Get ifname -> `ethtool --json -S PORT --all-groups` of all ports"""
+        groups = _nest(ETHTOOL_A_STATS_GROUPS,
+                       _attr(ETHTOOL_A_BITSET_NOMASK, b""),
+                       _attr(ETHTOOL_A_BITSET_SIZE, struct.pack("=I", len(STATS_GROUPS))),
+                       _attr(ETHTOOL_A_BITSET_VALUE,
+                             struct.pack("=I", (1 << len(STATS_GROUPS)) - 1)))
+
+        ports = {}
+        for ifname, data, start, end, _ in self.dump(ETHTOOL_MSG_STATS_GET,
+                                                     _nest(ETHTOOL_A_STATS_HEADER),
+                                                     groups):
+            out = ports[ifname] = {"ifname": ifname}
+            out.update((group, {}) for group in STATS_GROUPS)
+            for atype, val in _iterattrs(data, start, end):
+                if atype != ETHTOOL_A_STATS_GRP:
+                    continue
+                group, counters = _stats_group(val)
+                if group:
+                    out[group] = counters
+
+        return ports
+
+
+def ethtool():
+    """Get (settings, statistics) of all ports, see `Ethtool`"""
+    with Ethtool() as et:
+        return et.settings(), et.statistics()
@@ -0,0 +1,231 @@
+"""FRR query layer, shared by the routing protocol models
+
+ietf-ospf, ietf-rip, ietf-bfd-ip-sh and ietf-routing all ask FRR for
+their state, and used to run `vtysh -c CMD` once per command.  Every
+vtysh connects to the VTY socket of every FRR daemon before running
+its single command.
+
+On the running system, this module instead talks to the VTY socket of
+the daemon owning each command directly, like vtysh itself does.  All
+commands of a batch for the same daemon are run in one session.  A
+reply ends with three NUL bytes and the status of the command, so
+replies are split reliably, and a failed command is told from one with
+empty output.  Other hosts, or if a daemon's socket cannot be used,
+still run vtysh.
+
+Replies are memoized for the request, so models share them.
+"""
+import io
+import socket
+from contextlib import contextmanager
+from functools import cache
+
+from .common import LOG
+from .host import HOST
+from .trace import span
+
+
+VTY_DIR = "/var/run/frr"
+
+# Command prefix -> daemon answering it
+DAEMONS = (
+    ("show ip ospf",    "ospfd"),
+    ("show ip rip",     "ripd"),
+    ("show bfd",        "bfdd"),
+    ("show ip route",   "zebra"),
+    ("show ipv6 route", "zebra"),
+)
+
+CMD_SUCCESS = 0
+TERMINATOR = 4          # b"\0\0\0" + status
+
+
+class Error(Exception):
+    """An FRR command failed, or its daemon is not running"""
+
+
+def daemon_of(cmd):
+    """Daemon answering cmd, or None if not known"""
+    for prefix, daemon in DAEMONS:
+        if cmd == prefix or cmd.startswith(prefix + " "):
+            return daemon
+    return None
+
+
+def vtysh(cmd):
+    """Argv running cmd with vtysh"""
+    return ("vtysh", "-c", cmd)
+
+
+class _Reply(io.RawIOBase):
+    """Output of a command, read from a VTY session up to its terminator"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.tail = b""
+        self.status = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.status is None:
+            data = self.sock.recv(max(len(b), 4096))
+            if not data:
+                raise ConnectionError("VTY session closed mid-reply")
+
+            data = self.tail + data
+            if len(data) >= TERMINATOR and data[-TERMINATOR:-1] == b"\0\0\0":
+                self.status = data[-1]
+                data, self.tail = data[:-TERMINATOR], b""
+            else:
+                # Hold back what may be the start of the terminator
+                data, self.tail = data[:-TERMINATOR], data[-TERMINATOR:]
+
+            if data:
+                n = min(len(b), len(data))
+                b[:n] = data[:n]
+                self.tail = data[n:] + self.tail
+                return n
+
+        n = min(len(b), len(self.tail))
+        b[:n], self.tail = self.tail[:n], self.tail[n:]
+        return n
+
+
+class Vty:
+    """Session with the VTY socket of an FRR daemon"""
+
+    def __init__(self, daemon, timeout=5.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(f"{VTY_DIR}/{daemon}.vty")
+        except OSError:
+            self.sock.close()
+            raise
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        return False
+
+    def send(self, cmd):
+        """Send cmd, return its reply as a binary stream"""
+        self.sock.sendall(cmd.encode("utf-8") + b"\0")
+        return _Reply(self.sock)
+
+    def execute(self, cmd):
+        """Run cmd, return (status, output)"""
+        reply = self.send(cmd)
+        out = reply.read()
+        return reply.status, out.decode("utf-8", errors="replace")
+
+
+@cache
+def _replies():
+    """Output of the commands run over VTY sockets, None if failed"""
+    return {}
+
+
+def prefetch(*cmds):
+    """Run cmds ahead of `show()`, in one session per daemon
+
+    Other hosts get to start their vtysh runs concurrently instead.
+    """
+    if not HOST.NATIVE:
+        HOST.prefetch([vtysh(cmd) for cmd in cmds])
+        return
+
+    replies = _replies()
+    batches = {}
+    for cmd in dict.fromkeys(cmds):
+        daemon = daemon_of(cmd)
+        if daemon and cmd not in replies:
+            batches.setdefault(daemon, []).append(cmd)
+
+    for daemon, batch in batches.items():
+        try:
+            with span(f"{daemon}.vty", "vty"), Vty(daemon) as vty:
+                for cmd in batch:
+                    status, out = vty.execute(cmd)
+                    replies[cmd] = out if status == CMD_SUCCESS else None
+        except (FileNotFoundError, ConnectionRefusedError):
+            # Not running, vtysh would not get an answer either
+            replies.update(dict.fromkeys(batch))
+        except OSError as err:
+            LOG.debug("%s VTY session failed, falling back to vtysh: %s",
+                      daemon, err)
+
+
+def show(cmd, default=None):
+    """Get the output of FRR command cmd, e.g. "show bfd peers json"
+
+    On failure, return the default value if provided, otherwise raise
+    an exception.
+    """
+    if HOST.NATIVE:
+        replies = _replies()
+        if cmd not in replies:
+            prefetch(cmd)
+        if cmd in replies:
+            if replies[cmd] is not None:
+                return replies[cmd]
+            if default is not None:
+                return default
+            raise Error(f"{cmd}: failed, or {daemon_of(cmd)} not running")
+
+    return HOST.run(vtysh(cmd), default)
+
+
+def show_json(cmd, default=None):
+    """Get the JSON output of FRR command cmd, see `show()`"""
+    import json
+
+    try:
+        txt = show(cmd)
+        with span(cmd, "json"):
+            return json.loads(txt)
+    except Exception:
+        if default is not None:
+            return default
+        raise
+
+
+@contextmanager
+def stream(cmd):
+    """Get the output of cmd as a text stream, see `Host.run_stream()`
+
+    For output too large to hold in memory, e.g. a full routing table.
+    """
+    if HOST.NATIVE and daemon_of(cmd):
+        replies = _replies()
+        if cmd in replies:
+            if replies[cmd] is None:
+                raise Error(f"{cmd}: failed, or {daemon_of(cmd)} not running")
+            yield io.StringIO(replies[cmd])
+            return
+
+        try:
+            vty = Vty(daemon_of(cmd))
+        except (FileNotFoundError, ConnectionRefusedError) as err:
+            raise Error(f"{daemon_of(cmd)} not running") from err
+        except OSError as err:
+            LOG.debug("%s VTY session failed, falling back to vtysh: %s",
+                      daemon_of(cmd), err)
+        else:
+            with vty:
+                reply = vty.send(cmd)
+                yield io.TextIOWrapper(io.BufferedReader(reply),
+                                       encoding="utf-8", errors="replace")
+                if reply.status not in (None, CMD_SUCCESS):
+                    raise Error(f"{cmd}: failed with status {reply.status}")
+            return
+
+    with HOST.run_stream(vtysh(cmd)) as fp:
+        yield fp
@@ -0,0 +1,152 @@
+"""gpsd client, for the GPS receivers of ietf-hardware
+
+gpsd reports the fix (TPV) and sky view (SKY) of each receiver to its
+clients.  Asking for them, ?WATCH and ?POLL on a new connection, takes
+up to a gpsd reporting cycle, and used to be done for every query.
+
+A long-lived yanger (--serve) instead keeps one connection to gpsd,
+watching it in a thread of its own, and keeps the latest TPV and SKY of
+each device along with when they arrived.  A query then only copies
+those, skipping reports older than `STALE` seconds, e.g. from a receiver
+that has gone silent.  If gpsd is not running, or restarts, the watcher
+reconnects every `RETRY` seconds.
+
+Without that watch, e.g. a yanger started for a single query, gpsd is
+polled once per query, like before.
+"""
+import json
+import socket
+import threading
+import time
+
+from . import common
+from .trace import span
+
+
+ADDRESS = ("127.0.0.1", 2947)
+TIMEOUT = 0.5           # Seconds to wait for a ?POLL reply
+STALE = 10.0            # Seconds before a report is too old to use
+RETRY = 5.0             # Seconds between attempts to connect
+
+WATCH = b'?WATCH={"enable":true,"json":true};\n'
+POLL = b"?POLL;\n"
+
+
+def _messages(sock):
+    """Messages from gpsd, one JSON object per line, until it closes"""
+    with sock.makefile("rb") as fp:
+        for line in fp:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(msg, dict):
+                yield msg
+
+
+def poll_once(address=ADDRESS):
+    """Connect to gpsd and ?POLL it, returns the reply or {} on failure"""
+    try:
+        deadline = time.monotonic() + TIMEOUT
+        with span("gpsd", "poll"), \
+             socket.create_connection(address, TIMEOUT) as sock:
+            sock.sendall(WATCH + POLL)
+            for msg in _messages(sock):
+                if msg.get("class") == "POLL":
+                    return msg
+                if time.monotonic() > deadline:
+                    break
+    except OSError:
+        pass
+
+    return {}
+
+
+class Watcher:
+    """Latest reports from gpsd, kept up to date by a watching thread"""
+
+    def __init__(self, address=ADDRESS):
+        self.address = address
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+        self.active = set()     # Paths of activated devices
+        self.tpv = {}           # Device path -> (time received, TPV)
+        self.sky = {}           # Device path -> (time received, SKY)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="gpsd",
+                                           daemon=True)
+            self.thread.start()
+
+    def update(self, msg):
+        """Keep what msg, from gpsd, says about its devices"""
+        now = time.monotonic()
+        cls = msg.get("class")
+
+        with self.lock:
+            if cls == "DEVICES":
+                self.active = {dev.get("path") for dev in msg.get("devices", [])
+                               if dev.get("activated")}
+            elif cls == "DEVICE":
+                if msg.get("activated"):
+                    self.active.add(msg.get("path"))
+                else:
+                    self.active.discard(msg.get("path"))
+            elif cls == "TPV":
+                self.tpv[msg.get("device", "")] = (now, msg)
+            elif cls == "SKY":
+                self.sky[msg.get("device", "")] = (now, msg)
+            elif cls == "POLL":
+                for tpv in msg.get("tpv", []):
+                    self.tpv[tpv.get("device", "")] = (now, tpv)
+                for sky in msg.get("sky", []):
+                    self.sky[sky.get("device", "")] = (now, sky)
+                self.ready.set()
+
+    def _run(self):
+        connected = True
+        while True:
+            try:
+                with socket.create_connection(self.address, RETRY) as sock:
+                    sock.settimeout(None)
+                    sock.sendall(WATCH + POLL)
+                    connected = True
+                    for msg in _messages(sock):
+                        self.update(msg)
+            except OSError as e:
+                if connected:
+                    common.LOG.debug("Not watching gpsd, retrying: %s", e)
+                connected = False
+
+            with self.lock:
+                self.active.clear()
+            # Nothing to wait for, until reconnected
+            self.ready.set()
+            time.sleep(RETRY)
+
+    def poll(self):
+        """The latest reports, like a reply to ?POLL, without stale ones"""
+        self.ready.wait(TIMEOUT)
+
+        oldest = time.monotonic() - STALE
+        with self.lock:
+            return {
+                "class": "POLL",
+                "active": len(self.active),
+                "tpv": [tpv for t, tpv in self.tpv.values() if t >= oldest],
+                "sky": [sky for t, sky in self.sky.values() if t >= oldest],
+            }
+
+
+WATCHER = Watcher()
+
+
+def poll():
+    """Current state of gpsd, like a reply to ?POLL, or {} if unavailable"""
+    if common.PERSISTENT:
+        WATCHER.start()
+        return WATCHER.poll()
+
+    return poll_once()
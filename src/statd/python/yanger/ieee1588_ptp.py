@@ -1,17 +1,33 @@
 """Operational data for ieee1588-ptp-tt (and ieee802-dot1as-gptp).
 
-Queries each running ptp4l instance via pmc and maps the output to the
-YANG model structure.  One ptp4l process runs per instance-index, with
-its config at /etc/linuxptp/ptp4l-<idx>.conf and its UDS socket at
-/var/run/ptp4l-<idx>.
+Queries each running ptp4l instance over its management socket and
+maps the datasets to the YANG model structure.  One ptp4l process runs
+per instance-index, with its config at /etc/linuxptp/ptp4l-<idx>.conf
+and its UDS socket at /var/run/ptp4l-<idx>.
+
+On the running system all datasets of an instance are read in one
+session, see pmc.py, otherwise pmc(8) is run once per dataset.  Both
+give the same key→value dicts, as printed by pmc.
 """
 
-import glob
 import os
 import re
 
 from .common import insert, LOG
 from .host import HOST
+from .trace import span
+from . import pmc
+
+
+# Datasets read from each instance
+DATASETS = (
+    "DEFAULT_DATA_SET",
+    "CURRENT_DATA_SET",
+    "PARENT_DATA_SET",
+    "TIME_PROPERTIES_DATA_SET",
+    "PORT_DATA_SET",
+    "PORT_STATS_NP",
+)
 
 
 # ---------------------------------------------------------------------------
@@ -51,10 +67,50 @@ def _pmc_get(conf, command):
     return blocks
 
 
-def _pmc_get_one(conf, command):
-    """Like _pmc_get but return only the first (or only) block."""
-    blocks = _pmc_get(conf, command)
-    return blocks[0] if blocks else {}
+def _conf_global(conf_path):
+    """Return the [global] settings of a ptp4l conf as key→value dict."""
+    settings = {}
+    section = "global"
+    try:
+        with open(conf_path) as f:
+            for line in f:
+                s = line.split("#", 1)[0].strip()
+                if s.startswith('[') and s.endswith(']'):
+                    section = s[1:-1]
+                elif s and section == "global":
+                    key, _, val = s.partition(" ")
+                    settings[key] = val.strip()
+    except OSError:
+        pass
+    return settings
+
+
+def _native(uds_path, conf_path):
+    """All datasets of an instance in one session, or None to run pmc."""
+    if not HOST.NATIVE:
+        return None
+
+    settings = _conf_global(conf_path)
+    try:
+        with span(uds_path, "pmc"):
+            return pmc.pmc(uds_path, DATASETS,
+                           domain=int(settings.get("domainNumber", 0)),
+                           transport_specific=int(settings.get("transportSpecific", "0"), 0))
+    except (OSError, ValueError) as err:
+        LOG.debug("%s: management query failed, falling back to pmc: %s", uds_path, err)
+        return None
+
+
+def _datasets(uds_path, conf_path):
+    """Return {dataset: [blocks]} for all DATASETS of an instance."""
+    if (datasets := _native(uds_path, conf_path)) is not None:
+        return datasets
+
+    cmds = [["pmc", "-u", "-b", "0", "-f", conf_path, f"GET {command}"]
+            for command in DATASETS]
+    HOST.prefetch(cmds)
+
+    return {command: _pmc_get(conf_path, command) for command in DATASETS}
 
 
 # ---------------------------------------------------------------------------
@@ -176,10 +232,14 @@ def _time_source_identity(raw):
 # delay-mechanism and port-state mapping
 # ---------------------------------------------------------------------------
 
+# pmc prints the number, e.g. 1 for E2E
 _DELAY_MECH_MAP = {
     "E2E":  "e2e",
     "P2P":  "p2p",
     "AUTO": "no-mechanism",
+    "1":    "e2e",
+    "2":    "p2p",
+    "0":    "no-mechanism",
 }
 
 _PORT_STATE_MAP = {
@@ -513,12 +573,17 @@ def _instance_type_from_config(conf_path):
     return None
 
 
-def _build_instance(idx, conf_path):
+def _build_instance(idx, conf_path, uds_path):
     """Build one instance dict from pmc queries for instance index idx."""
     inst = {"instance-index": idx}
+    datasets = _datasets(uds_path, conf_path)
+
+    def first(command):
+        blocks = datasets.get(command)
+        return blocks[0] if blocks else {}
 
     # default-ds
-    dd = _pmc_get_one(conf_path, "DEFAULT_DATA_SET")
+    dd = first("DEFAULT_DATA_SET")
     if dd:
         dds = _build_default_ds(dd)
         # Derive instance-type from numberPorts + config file
@@ -530,29 +595,29 @@ def _build_instance(idx, conf_path):
         inst["default-ds"] = dds
 
     # current-ds
-    cd = _pmc_get_one(conf_path, "CURRENT_DATA_SET")
+    cd = first("CURRENT_DATA_SET")
     if cd:
         cds = _build_current_ds(cd)
         if cds:
             inst["current-ds"] = cds
 
     # parent-ds
-    pd = _pmc_get_one(conf_path, "PARENT_DATA_SET")
+    pd = first("PARENT_DATA_SET")
     if pd:
         pds = _build_parent_ds(pd)
         if pds:
             inst["parent-ds"] = pds
 
     # time-properties-ds
-    tp = _pmc_get_one(conf_path, "TIME_PROPERTIES_DATA_SET")
+    tp = first("TIME_PROPERTIES_DATA_SET")
     if tp:
         tpds = _build_time_properties_ds(tp)
         if tpds:
             inst["time-properties-ds"] = tpds
 
     # ports: PORT_DATA_SET returns one block per port
-    port_blocks  = _pmc_get(conf_path, "PORT_DATA_SET")
-    stats_blocks = _pmc_get(conf_path, "PORT_STATS_NP")
+    port_blocks  = datasets.get("PORT_DATA_SET", [])
+    stats_blocks = datasets.get("PORT_STATS_NP", [])
     ifaces       = _port_interfaces(conf_path)
 
     # Build a stats map keyed by portIdentity for quick lookup
@@ -597,6 +662,8 @@ def _build_instance(idx, conf_path):
 
 def operational():
     """Return operational data for ieee1588-ptp-tt."""
+    import glob
+
     out = {}
     instances = []
 
@@ -613,7 +680,7 @@ def operational():
             continue
 
         try:
-            inst = _build_instance(idx, conf_path)
+            inst = _build_instance(idx, conf_path, uds_path)
             instances.append(inst)
         except Exception as e:
             LOG.debug("ptp4l-%d: skipping instance: %s", idx, e)
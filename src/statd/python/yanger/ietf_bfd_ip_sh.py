@@ -1,5 +1,5 @@
+from . import frr
 from .common import insert
-from .host import HOST
 
 
 def frr_to_ietf_state(state):
@@ -15,8 +15,7 @@ def frr_to_ietf_state(state):
 
 def add_sessions(control_protocols):
     """Fetch BFD session data from FRR"""
-    cmd = ['vtysh', '-c', 'show bfd peers json']
-    data = HOST.run_json(cmd, default=[])
+    data = frr.show_json('show bfd peers json', default=[])
     if not data:
         return  # No BFD sessions available
 
@@ -3,8 +3,11 @@ import os
 import re
 import sys
 
+from . import gpsd
 from .common import insert, YangDate
 from .host import HOST
+from .trace import traced
+from .xpath import select
 
 
 def vpd_vendor_extensions(data):
@@ -46,10 +49,12 @@ def vpd_component(vpd):
     return component
 
 
+@traced()
 def vpd_components(systemjson):
     return [vpd_component(vpd) for vpd in systemjson.get("vpd", {}).values()]
 
 
+@traced()
 def usb_port_components(systemjson):
     usb_ports = systemjson.get("usb-ports", [])
 
@@ -74,6 +79,7 @@ def usb_port_components(systemjson):
     return ports
 
 
+@traced()
 def motherboard_component(systemjson):
     """
     Create a mainboard/chassis component from system.json data.
@@ -152,12 +158,13 @@ def normalize_sensor_name(name):
 def _dt_phandle(path):
     """Read a device-tree phandle cell as a normalized hex string.
 
-    phandle/phy-handle properties are 4-byte big-endian cells.  Read them via
-    od(1) so the binary content survives the text-based HOST transport (works
-    both locally and over the ssh-style remote transport).
+    phandle/phy-handle properties are 4-byte big-endian cells.
     """
-    out = HOST.run(("od", "-An", "-tx1", path), default="")
-    return "".join(out.split()) if out else None
+    data = HOST.read_bytes(path)
+    return data.hex() if data else None
+
+
+_phy_ifname = (None, {})
 
 
 def phy_handle_to_ifname():
@@ -167,15 +174,23 @@ def phy_handle_to_ifname():
     The reverse map lets us name a switch PHY's hwmon temperature sensor after
     the front-panel port (e.g. e1) instead of the unreadable name the kernel
     derives from the full device-tree path (cp0busbusf2000000mdio...).
+
+    The map is kept between queries, for as long as the same interfaces exist.
     """
+    global _phy_ifname
+
+    ifnames = tuple(HOST.listdir("/sys/class/net"))
+    if _phy_ifname[0] == ifnames:
+        return _phy_ifname[1]
+
     mapping = {}
-    for ifname in HOST.run(("ls", "/sys/class/net"), default="").split():
+    for ifname in ifnames:
         handle_path = os.path.join("/sys/class/net", ifname, "of_node", "phy-handle")
-        if not HOST.exists(handle_path):
-            continue
         handle = _dt_phandle(handle_path)
         if handle:
             mapping[handle] = ifname
+
+    _phy_ifname = (ifnames, mapping)
     return mapping
 
 
@@ -234,6 +249,89 @@ def get_wifi_phy_info():
     return phy_info
 
 
+def _read_int(path):
+    """Integer value of sysfs attribute path, or None if not readable"""
+    try:
+        return int(HOST.read(path).strip())
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Sensor attributes, in the order they are reported: prefix, value-type,
+# value-scale, and the suffix and number of the unlabeled first sensor,
+# None for types named like temp sensors, e.g. "e1" or "e12"
+SENSOR_TYPES = (
+    ("temp",  "celsius",  "milli", None),
+    ("fan",   "rpm",      "units", None),
+    ("pwm",   "other",    "milli", None),
+    ("in",    "volts-DC", "milli", ("voltage", "0")),
+    ("curr",  "amperes",  "milli", ("current", "1")),
+    ("power", "watts",    "micro", ("power", "1")),
+)
+
+# hwmon device path -> (name, entries, device info), see hwmon_device()
+_hwmon_devices = {}
+
+
+def hwmon_device(path):
+    """Scan hwmon device path, or get it from the last scan
+
+    Everything but the sensor values stays the same while the device
+    exists: its name, phandle, and which sensors it has, with labels.
+    That is kept between queries, and only scanned again if the name or
+    the attributes of the device change, e.g. when an SFP is replaced.
+
+    Returns (device name, phandle, sensors) where sensors is a list of
+    (attribute, type, number, label), or None if not a device.
+    """
+    name = HOST.read(os.path.join(path, "name"))
+    if not name:
+        return None
+
+    entries = HOST.listdir(path)
+    cached = _hwmon_devices.get(path)
+    if cached and cached[0] == name and cached[1] == entries:
+        return cached[2]
+
+    # Check if device/name exists (e.g., for WiFi radios) and use that instead
+    device_name = (HOST.read(os.path.join(path, "device", "name")) or name).strip()
+
+    phandle = _dt_phandle(os.path.join(path, "device", "of_node", "phandle"))
+
+    names = set(entries)
+    sensors = []
+    for prefix, *_ in SENSOR_TYPES:
+        for entry in entries:
+            if not entry.startswith(prefix):
+                continue
+
+            if prefix == "pwm":
+                # Only pwm1, pwm2, etc., not pwm*_enable, pwm*_mode, ...
+                num = entry[3:]
+                if not num.isdigit():
+                    continue
+            elif entry.endswith("_input"):
+                num = entry.split('_')[0][len(prefix):]
+            else:
+                continue
+
+            label = None
+            if f"{prefix}{num}_label" in names:
+                label = HOST.read(os.path.join(path, f"{prefix}{num}_label"))
+                label = label.strip() if label is not None else None
+
+            sensors.append((entry, prefix, num, label))
+
+    # PWM duty cycle only for devices without a tachometer (avoid duplicates)
+    if any(prefix == "fan" for _, prefix, _, _ in sensors):
+        sensors = [sensor for sensor in sensors if sensor[1] != "pwm"]
+
+    device = (device_name, phandle, sensors)
+    _hwmon_devices[path] = (name, entries, device)
+    return device
+
+
+@traced()
 def hwmon_sensor_components():
     """
     Discover hwmon sensors and create sensor components with parent/child relationships.
@@ -245,10 +343,34 @@ def hwmon_sensor_components():
     - Child sensor components that reference the parent via "parent" field
 
     For simple devices with only one sensor, creates standalone sensor components.
+
+    Devices are scanned by `hwmon_device()`, only sensor values are read
+    on every query.
     """
     components = []
     device_sensors = {}  # Track {device_base_name: [list of sensor components]}
-    phy_ifname = phy_handle_to_ifname()
+    types = {prefix: rest for prefix, *rest in SENSOR_TYPES}
+
+    # Helper to create sensor component with human-readable description
+    def create_sensor(sensor_name, value, value_type, value_scale, label=None):
+        component = {
+            "name": sensor_name,
+            "class": "iana-hardware:sensor",
+            "sensor-data": {
+                "value": value,
+                "value-type": value_type,
+                "value-scale": value_scale,
+                "value-precision": 0,
+                "value-timestamp": str(YangDate()),
+                "oper-status": "ok"
+            }
+        }
+        # Add human-readable description if we have a label
+        if label:
+            # Format label nicely: "RX_power" -> "RX Power", "VCC" -> "VCC"
+            desc = label.replace('_', ' ').title()
+            component["description"] = desc
+        return component
 
     def add_sensor(base_name, sensor_component):
         """Helper to track sensors per device"""
@@ -256,194 +378,59 @@ def hwmon_sensor_components():
             device_sensors[base_name] = []
         device_sensors[base_name].append(sensor_component)
 
-    try:
-        hwmon_entries = HOST.run(("ls", "/sys/class/hwmon"), default="").split()
-        hwmon_devices = [os.path.join("/sys/class/hwmon", entry) for entry in hwmon_entries if entry.startswith("hwmon")]
+    hwmon = "/sys/class/hwmon"
+    scanned = []
+    for entry in HOST.listdir(hwmon):
+        if entry.startswith("hwmon"):
+            path = os.path.join(hwmon, entry)
+            device = hwmon_device(path)
+            if device:
+                scanned.append((path, device))
+
+    # Forget devices gone since the last query, e.g. unplugged SFPs, or
+    # the cache grows with every hot-swap in a long running server
+    for path in set(_hwmon_devices) - {path for path, _ in scanned}:
+        del _hwmon_devices[path]
+
+    phy_ifname = {}
+    if any(phandle for _, (_, phandle, _) in scanned):
+        phy_ifname = phy_handle_to_ifname()
+
+    for path, (device_name, phandle, sensors) in scanned:
+        base_name = normalize_sensor_name(device_name)
+
+        # Switch PHYs get an hwmon name derived from their full
+        # device-tree path (e.g. cp0busbusf2000000mdio12a200switch2mdio01).
+        # If this PHY drives a known port, name the sensor after that
+        # port (e1, e2, ...) instead.
+        ifname = phy_ifname.get(phandle)
+        if ifname:
+            base_name = ifname
+
+        for attr, prefix, num, label in sensors:
+            value = _read_int(os.path.join(path, attr))
+            if value is None:
+                continue
 
-        for hwmon_path in hwmon_devices:
-            try:
-                name_path = os.path.join(hwmon_path, "name")
-                if not HOST.exists(name_path):
-                    continue
+            value_type, value_scale, unlabeled = types[prefix]
+            if label is not None:
+                sensor_name = f"{base_name}-{normalize_sensor_name(label)}"
+            elif unlabeled:
+                label, first = unlabeled
+                sensor_name = f"{base_name}-{label}" if num == first else f"{base_name}-{label}{num}"
+            else:
+                sensor_name = base_name if num == '1' else f"{base_name}{num}"
 
-                device_name = HOST.read(name_path).strip()
-
-                # Check if device/name exists (e.g., for WiFi radios) and use that instead
-                device_name_path = os.path.join(hwmon_path, "device", "name")
-                if HOST.exists(device_name_path):
-                    device_name = HOST.read(device_name_path).strip()
-
-                base_name = normalize_sensor_name(device_name)
-
-                # Switch PHYs get an hwmon name derived from their full
-                # device-tree path (e.g. cp0busbusf2000000mdio12a200switch2mdio01).
-                # If this PHY drives a known port, name the sensor after that
-                # port (e1, e2, ...) instead.
-                phandle_path = os.path.join(hwmon_path, "device", "of_node", "phandle")
-                if HOST.exists(phandle_path):
-                    ifname = phy_ifname.get(_dt_phandle(phandle_path))
-                    if ifname:
-                        base_name = ifname
-
-                # Helper to create sensor component with human-readable description
-                def create_sensor(sensor_name, value, value_type, value_scale, label=None):
-                    component = {
-                        "name": sensor_name,
-                        "class": "iana-hardware:sensor",
-                        "sensor-data": {
-                            "value": value,
-                            "value-type": value_type,
-                            "value-scale": value_scale,
-                            "value-precision": 0,
-                            "value-timestamp": str(YangDate()),
-                            "oper-status": "ok"
-                        }
-                    }
-                    # Add human-readable description if we have a label
-                    if label:
-                        # Format label nicely: "RX_power" -> "RX Power", "VCC" -> "VCC"
-                        desc = label.replace('_', ' ').title()
-                        component["description"] = desc
-                    return component
-
-                # List hwmon directory once, reuse for all sensor types
-                all_entries = HOST.run(("ls", hwmon_path), default="").split()
-
-                # Temperature sensors
-                temp_entries = all_entries
-                temp_files = [os.path.join(hwmon_path, e) for e in temp_entries if e.startswith("temp") and e.endswith("_input")]
-                for temp_file in temp_files:
-                    try:
-                        sensor_num = os.path.basename(temp_file).split('_')[0].replace('temp', '')
-                        value = int(HOST.read(temp_file).strip())
-                        label_file = os.path.join(hwmon_path, f"temp{sensor_num}_label")
-                        raw_label = None
-                        if HOST.exists(label_file):
-                            raw_label = HOST.read(label_file).strip()
-                            label = normalize_sensor_name(raw_label)
-                            sensor_name = f"{base_name}-{label}"
-                        else:
-                            sensor_name = base_name if sensor_num == '1' else f"{base_name}{sensor_num}"
-                        add_sensor(base_name, create_sensor(sensor_name, value, "celsius", "milli", raw_label))
-                    except (FileNotFoundError, ValueError, IOError):
-                        continue
-
-                # Fan sensors (RPM from tachometer)
-                fan_entries = all_entries
-                fan_files = [os.path.join(hwmon_path, e) for e in fan_entries if e.startswith("fan") and e.endswith("_input")]
-                for fan_file in fan_files:
-                    try:
-                        sensor_num = os.path.basename(fan_file).split('_')[0].replace('fan', '')
-                        value = int(HOST.read(fan_file).strip())
-                        label_file = os.path.join(hwmon_path, f"fan{sensor_num}_label")
-                        raw_label = None
-                        if HOST.exists(label_file):
-                            raw_label = HOST.read(label_file).strip()
-                            label = normalize_sensor_name(raw_label)
-                            sensor_name = f"{base_name}-{label}"
-                        else:
-                            sensor_name = base_name if sensor_num == '1' else f"{base_name}{sensor_num}"
-                        add_sensor(base_name, create_sensor(sensor_name, value, "rpm", "units", raw_label))
-                    except (FileNotFoundError, ValueError, IOError):
-                        continue
-
-                # PWM fan sensors (duty cycle percentage)
-                # Only add if no fan*_input exists for this device (avoid duplicates)
-                has_rpm_sensor = bool(fan_files)
-                if not has_rpm_sensor:
-                    pwm_entries = all_entries
-                    pwm_files = [os.path.join(hwmon_path, e) for e in pwm_entries if e.startswith("pwm") and e[3:].replace('_', '').isdigit() if len(e) > 3]
-                    for pwm_file in pwm_files:
-                        # Skip pwm*_enable, pwm*_mode, etc. - only process pwm1, pwm2, etc.
-                        pwm_basename = os.path.basename(pwm_file)
-                        if not pwm_basename.replace('pwm', '').isdigit():
-                            continue
-                        try:
-                            sensor_num = pwm_basename.replace('pwm', '')
-                            pwm_raw = int(HOST.read(pwm_file).strip())
-                            # Convert PWM duty cycle (0-255) to percentage (0-100)
-                            # Note: Some devices are inverted (255=off, 0=max), but we report as-is
-                            # The value represents duty cycle, not necessarily fan speed
-                            # Use "other" value-type since PWM duty cycle isn't a standard IETF type
-                            value = int((pwm_raw / 255.0) * 100 * 1000)  # Convert to milli-percent (0-100000)
-                            label_file = os.path.join(hwmon_path, f"pwm{sensor_num}_label")
-                            raw_label = None
-                            if HOST.exists(label_file):
-                                raw_label = HOST.read(label_file).strip()
-                                label = normalize_sensor_name(raw_label)
-                                sensor_name = f"{base_name}-{label}"
-                            else:
-                                sensor_name = base_name if sensor_num == '1' else f"{base_name}{sensor_num}"
-                            # Use "PWM Fan" as description so it displays nicely in show hardware
-                            add_sensor(base_name, create_sensor(sensor_name, value, "other", "milli", raw_label or "PWM Fan"))
-                        except (FileNotFoundError, ValueError, IOError):
-                            continue
-
-                # Voltage sensors
-                voltage_entries = all_entries
-                voltage_files = [os.path.join(hwmon_path, e) for e in voltage_entries if e.startswith("in") and e.endswith("_input")]
-                for voltage_file in voltage_files:
-                    try:
-                        sensor_num = os.path.basename(voltage_file).split('_')[0].replace('in', '')
-                        value = int(HOST.read(voltage_file).strip())
-                        label_file = os.path.join(hwmon_path, f"in{sensor_num}_label")
-                        raw_label = None
-                        if HOST.exists(label_file):
-                            raw_label = HOST.read(label_file).strip()
-                            label = normalize_sensor_name(raw_label)
-                            sensor_name = f"{base_name}-{label}"
-                        else:
-                            raw_label = "voltage"
-                            sensor_name = f"{base_name}-voltage" if sensor_num == '0' else f"{base_name}-voltage{sensor_num}"
-                        add_sensor(base_name, create_sensor(sensor_name, value, "volts-DC", "milli", raw_label))
-                    except (FileNotFoundError, ValueError, IOError):
-                        continue
-
-                # Current sensors
-                current_entries = all_entries
-                current_files = [os.path.join(hwmon_path, e) for e in current_entries if e.startswith("curr") and e.endswith("_input")]
-                for current_file in current_files:
-                    try:
-                        sensor_num = os.path.basename(current_file).split('_')[0].replace('curr', '')
-                        value = int(HOST.read(current_file).strip())
-                        label_file = os.path.join(hwmon_path, f"curr{sensor_num}_label")
-                        raw_label = None
-                        if HOST.exists(label_file):
-                            raw_label = HOST.read(label_file).strip()
-                            label = normalize_sensor_name(raw_label)
-                            sensor_name = f"{base_name}-{label}"
-                        else:
-                            raw_label = "current"
-                            sensor_name = f"{base_name}-current" if sensor_num == '1' else f"{base_name}-current{sensor_num}"
-                        add_sensor(base_name, create_sensor(sensor_name, value, "amperes", "milli", raw_label))
-                    except (FileNotFoundError, ValueError, IOError):
-                        continue
-
-                # Power sensors
-                power_entries = all_entries
-                power_files = [os.path.join(hwmon_path, e) for e in power_entries if e.startswith("power") and e.endswith("_input")]
-                for power_file in power_files:
-                    try:
-                        sensor_num = os.path.basename(power_file).split('_')[0].replace('power', '')
-                        value = int(HOST.read(power_file).strip())
-                        label_file = os.path.join(hwmon_path, f"power{sensor_num}_label")
-                        raw_label = None
-                        if HOST.exists(label_file):
-                            raw_label = HOST.read(label_file).strip()
-                            label = normalize_sensor_name(raw_label)
-                            sensor_name = f"{base_name}-{label}"
-                        else:
-                            raw_label = "power"
-                            sensor_name = f"{base_name}-power" if sensor_num == '1' else f"{base_name}-power{sensor_num}"
-                        add_sensor(base_name, create_sensor(sensor_name, value, "watts", "micro", raw_label))
-                    except (FileNotFoundError, ValueError, IOError):
-                        continue
-
-            except (FileNotFoundError, ValueError, IOError):
-                continue
+            if prefix == "pwm":
+                # Convert PWM duty cycle (0-255) to percentage (0-100)
+                # Note: Some devices are inverted (255=off, 0=max), but we report as-is
+                # The value represents duty cycle, not necessarily fan speed
+                # Use "other" value-type since PWM duty cycle isn't a standard IETF type
+                value = int((value / 255.0) * 100 * 1000)  # Convert to milli-percent (0-100000)
+                # Use "PWM Fan" as description so it displays nicely in show hardware
+                label = label or "PWM Fan"
 
-    except Exception:
-        pass
+            add_sensor(base_name, create_sensor(sensor_name, value, value_type, value_scale, label))
 
     # Now create parent/child relationships
     for base_name, sensors in device_sensors.items():
@@ -469,17 +456,13 @@ def hwmon_sensor_components():
         name = component.get("name", "")
         # Match radio0, radio1, etc. sensors
         if name.startswith("radio") and name in wifi_info:
-            phy = wifi_info[name]
             # Add WiFi-specific description
-            component["description"] = phy["description"]
-            # Optionally change class to wifi for WiFi PHY sensors
-            if component.get("class") == "iana-hardware:sensor":
-                # Keep as sensor but we could create a parent WiFi component later if needed
-                pass
+            component["description"] = wifi_info[name]["description"]
 
     return components
 
 
+@traced()
 def thermal_sensor_components():
     """
     Discover thermal zones and create sensor components.
@@ -487,53 +470,41 @@ def thermal_sensor_components():
     """
     components = []
 
-    try:
-        # Find all thermal zones
-        thermal_entries = HOST.run(("ls", "/sys/class/thermal"), default="").split()
-        thermal_zones = [os.path.join("/sys/class/thermal", entry) for entry in thermal_entries if entry.startswith("thermal_zone")]
-
-        for zone_path in thermal_zones:
-            try:
-                # Read zone type (e.g., "cpu-thermal", "gpu-thermal")
-                type_path = os.path.join(zone_path, "type")
-                if not HOST.exists(type_path):
-                    continue
+    thermal = "/sys/class/thermal"
+    for entry in HOST.listdir(thermal):
+        if not entry.startswith("thermal_zone"):
+            continue
 
-                zone_type = HOST.read(type_path).strip()
+        zone_path = os.path.join(thermal, entry)
 
-                # Read temperature in millidegrees Celsius
-                temp_path = os.path.join(zone_path, "temp")
-                if not HOST.exists(temp_path):
-                    continue
+        # Read zone type (e.g., "cpu-thermal", "gpu-thermal")
+        zone_type = HOST.read(os.path.join(zone_path, "type"))
+        if not zone_type:
+            continue
 
-                temp_millidegrees = int(HOST.read(temp_path).strip())
-
-                # Create component with sensor-data
-                # Component name: strip "-thermal" suffix for cleaner display
-                component_name = normalize_sensor_name(zone_type)
-
-                component = {
-                    "name": component_name,
-                    "class": "iana-hardware:sensor",
-                    "sensor-data": {
-                        "value": temp_millidegrees,
-                        "value-type": "celsius",
-                        "value-scale": "milli",
-                        "value-precision": 0,
-                        "value-timestamp": str(YangDate()),
-                        "oper-status": "ok"
-                    }
-                }
+        # Read temperature in millidegrees Celsius
+        temp_millidegrees = _read_int(os.path.join(zone_path, "temp"))
+        if temp_millidegrees is None:
+            continue
 
-                components.append(component)
+        # Create component with sensor-data
+        # Component name: strip "-thermal" suffix for cleaner display
+        component_name = normalize_sensor_name(zone_type.strip())
 
-            except (FileNotFoundError, ValueError, IOError):
-                # Skip this thermal zone if we can't read it
-                continue
+        component = {
+            "name": component_name,
+            "class": "iana-hardware:sensor",
+            "sensor-data": {
+                "value": temp_millidegrees,
+                "value-type": "celsius",
+                "value-scale": "milli",
+                "value-precision": 0,
+                "value-timestamp": str(YangDate()),
+                "oper-status": "ok"
+            }
+        }
 
-    except Exception:
-        # If we can't access /sys/class/thermal at all, just return empty list
-        pass
+        components.append(component)
 
     return components
 
@@ -622,6 +593,7 @@ def convert_iw_phy_info_for_yanger(phy_info):
     return result
 
 
+@traced()
 def wifi_radio_components():
     """
     Create WiFi radio components with complete operational data.
@@ -711,53 +683,12 @@ def wifi_radio_components():
     return components
 
 
-def _gpsd_poll():
-    """Query gpsd for current state via ?POLL command.
-
-    Returns a dict keyed by device path with tpv/sky data merged,
-    or empty dict on failure.
-    """
-    import json
-    import socket
-
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        sock.connect(("127.0.0.1", 2947))
-
-        # Read VERSION banner
-        sock.recv(4096)
-
-        # Send POLL request
-        sock.sendall(b'?WATCH={"enable":true,"json":true};\n?POLL;\n')
-
-        # Read until we get the POLL response
-        buf = b""
-        for _ in range(5):
-            chunk = sock.recv(4096)
-            if not chunk:
-                break
-            buf += chunk
-            for line in buf.decode(errors="replace").splitlines():
-                try:
-                    msg = json.loads(line)
-                except (json.JSONDecodeError, ValueError):
-                    continue
-                if msg.get("class") == "POLL":
-                    sock.close()
-                    return msg
-        sock.close()
-    except (OSError, socket.error):
-        pass
-
-    return {}
-
-
+@traced()
 def gps_receiver_components():
     """Discover GPS/GNSS receivers and populate operational state.
 
     GPS devices are discovered via /dev/gps* symlinks (created by udev
-    rules).  Status is queried live from gpsd via the ?POLL command.
+    rules).  Status is the latest reported by gpsd, see `gpsd.poll()`.
     """
     components = []
 
@@ -765,9 +696,9 @@ def gps_receiver_components():
     gps_devices = {}
     for i in range(4):
         dev_path = f"/dev/gps{i}"
-        if not HOST.exists(dev_path):
+        actual = HOST.realpath(dev_path)
+        if not actual:
             continue
-        actual = HOST.run(("readlink", "-f", dev_path), default="").strip()
         gps_devices[actual] = {
             "name": f"gps{i}",
             "symlink": dev_path,
@@ -776,8 +707,7 @@ def gps_receiver_components():
     if not gps_devices:
         return components
 
-    # Query gpsd directly for current state
-    poll = _gpsd_poll()
+    poll = gpsd.poll()
     active = poll.get("active", 0)
 
     # Index TPV and SKY responses by device path
@@ -870,19 +800,48 @@ def gps_receiver_components():
     return components
 
 
-def operational():
+def prefetch():
+    # Directories and symlinks are read with commands on other hosts,
+    # see Host.listdir() and Host.realpath()
+    listed = [] if HOST.NATIVE else [
+        ("ls", "/sys/class/hwmon"),
+        ("ls", "/sys/class/thermal"),
+    ] + [("realpath", f"/dev/gps{i}") for i in range(4)]
+    HOST.prefetch(listed + [
+        ("/usr/libexec/infix/iw.py", "list"),
+        ("/usr/libexec/infix/iw.py", "dev"),
+    ], [
+        "/run/system.json",
+        "/sys/class/hwmon/*/name",
+        "/sys/class/hwmon/*/device/name",
+        "/sys/class/hwmon/*/*_input",
+        "/sys/class/hwmon/*/*_label",
+        "/sys/class/hwmon/*/pwm*",
+        "/sys/class/thermal/thermal_zone*/type",
+        "/sys/class/thermal/thermal_zone*/temp",
+    ])
+
+
+PRODUCERS = (
+    ("/ietf-hardware:hardware/component[name='mainboard']", motherboard_component),
+    ("/ietf-hardware:hardware/component", vpd_components),
+    ("/ietf-hardware:hardware/component", usb_port_components),
+    ("/ietf-hardware:hardware/component", lambda _: hwmon_sensor_components()),
+    ("/ietf-hardware:hardware/component", lambda _: thermal_sensor_components()),
+    ("/ietf-hardware:hardware/component", lambda _: wifi_radio_components()),
+    ("/ietf-hardware:hardware/component[name='gps*']", lambda _: gps_receiver_components()),
+)
+
+
+def operational(xpath=None):
     systemjson = HOST.read_json("/run/system.json", {})
 
+    component = []
+    for _, producer in select(PRODUCERS, xpath):
+        component += producer(systemjson)
+
     return {
         "ietf-hardware:hardware": {
-            "component":
-            motherboard_component(systemjson) +
-            vpd_components(systemjson) +
-            usb_port_components(systemjson) +
-            hwmon_sensor_components() +
-            thermal_sensor_components() +
-            wifi_radio_components() +
-            gps_receiver_components() +
-            [],
+            "component": component,
         },
     }
@@ -1,7 +1,8 @@
-from . import container
-from . import link
-
 def operational(ifname=None):
+    # Imported here, other models only need .common, e.g. ietf-routing
+    from . import container
+    from . import link
+
     return {
         "ietf-interfaces:interfaces": {
             "interface":
@@ -53,25 +53,51 @@ def stp_port_statistics(port):
     return stats
 
 
-def lower_stp_tree(iplink, msti):
-    if not (tport := HOST.run_json(["mstpctl", "-f", "json",
-                                   "showtreeport",
-                                    iplink["master"], iplink["ifname"], str(msti)],
-                                   default={})):
+def mstp_port(brname, port):
+    """Port details of a single port of a bridge, or {}"""
+    details = HOST.run_json(["mstpctl", "-f", "json",
+                             "showportdetail", brname, port],
+                            default=[{}])
+    return details[0] if details else {}
+
+
+@cache
+def mstp_ports(brname):
+    """Port details of all ports of a bridge, by port
+
+    One `showportdetail` lists every port, in the order requested, and
+    also holds the CIST tree port state of each port.  Should it fail,
+    or not list every port, e.g. one mstpd does not know yet, each port
+    is asked for on its own, so that only the odd one goes without.
+
+    """
+    ports = sorted(iplinks_lower_of(brname))
+    if not ports:
         return {}
 
+    details = HOST.run_json(["mstpctl", "-f", "json",
+                             "showportdetail", brname] + ports,
+                            default=[])
+    if not isinstance(details, list) or len(details) != len(ports):
+        LOG.debug(f"Unexpected mstpctl port details of {brname}, asking per port")
+        details = [mstp_port(brname, port) for port in ports]
+
+    return dict(zip(ports, details))
+
+
+def lower_stp_tree(tport):
     port = {
         "port-id": stp_port_id(tport["port-id"]),
         # "state": None # Sourced from bridge
         "role": tport["role"].lower(),
-        "disputed": tport["disputed"] == "yes",
+        "disputed": tport.get("disputed") == "yes",
     }
 
     designated = {}
-    if dbr := tport["designated-bridge"]:
+    if dbr := tport.get("designated-bridge"):
         designated["bridge-id"] = stp_bridge_id(dbr)
 
-    if dp := tport["designated-port"]:
+    if dp := tport.get("designated-port"):
         designated["port-id"] = stp_port_id(dp)
 
     if designated:
@@ -84,10 +110,7 @@ def lower_stp(iplink):
     info = iplink["linkinfo"]["info_slave_data"]
     ciststate = info.get("state", "disabled")
 
-    if not (port := HOST.run_json(["mstpctl", "-f", "json",
-                                   "showportdetail",
-                                   iplink["master"], iplink["ifname"]],
-                                  default=[{}])[0]):
+    if not (port := mstp_ports(iplink["master"]).get(iplink["ifname"])):
         return {
             "cist": {
                 "state": ciststate,
@@ -96,7 +119,7 @@ def lower_stp(iplink):
 
     stp = {
         "edge": port.get("oper-edge-port") == "yes",
-        "cist": lower_stp_tree(iplink, 0),
+        "cist": lower_stp_tree(port),
     }
 
     stp["cist"]["state"] = ciststate
@@ -1,11 +1,30 @@
 from functools import cache
 
+from ..common import LOG
 from ..host import HOST
+from .. import netlink
+from ..trace import span
+
+
+def _native(query, ifname, netns):
+    """Run netlink query, or return None to fall back to ip(8)"""
+    if not HOST.NATIVE:
+        return None
+
+    try:
+        with span(query.__name__, "netlink", ifname=ifname, netns=netns):
+            return query(ifname, netns)
+    except OSError as err:
+        LOG.debug("Netlink query failed, falling back to ip: %s", err)
+        return None
 
 
 @cache
 def iplinks(ifname=None, netns=None):
     def _iplinks(ifname, netns):
+        if (links := _native(netlink.iplinks, ifname, netns)) is not None:
+            return links
+
         pre = [ "ip", "netns", "exec", netns ] if netns else []
         filt = ["dev", ifname] if ifname else []
         return HOST.run_json(pre + ["ip", "-s", "-d", "-j", "link", "show"] + filt)
@@ -23,6 +42,9 @@ def iplinks_lower_of(upper):
 @cache
 def ipaddrs(ifname=None, netns=None):
     def _ipaddrs(ifname, netns):
+        if (addrs := _native(netlink.ipaddrs, ifname, netns)) is not None:
+            return addrs
+
         pre = [ "ip", "netns", "exec", netns ] if netns else []
         filt = ["dev", ifname] if ifname else []
         return HOST.run_json(pre + ["ip", "-j", "addr", "show"] + filt)
@@ -33,6 +55,9 @@ def ipaddrs(ifname=None, netns=None):
 @cache
 def ipneighs(ifname=None, netns=None):
     def _ipneighs(ifname, netns):
+        if (neighs := _native(netlink.ipneighs, ifname, netns)) is not None:
+            return neighs
+
         pre = ["ip", "netns", "exec", netns] if netns else []
         filt = ["dev", ifname] if ifname else []
         return HOST.run_json(pre + ["ip", "-j", "neigh", "show"] + filt, [])
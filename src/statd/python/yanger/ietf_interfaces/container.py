@@ -1,5 +1,6 @@
 from ..host import HOST
 from ..infix_containers import podman_ps
+from ..trace import traced
 
 from . import common
 from . import link
@@ -34,6 +35,7 @@ def podman_interfaces():
     return interfaces
 
 
+@traced()
 def interfaces(ifname):
     interfaces = []
 
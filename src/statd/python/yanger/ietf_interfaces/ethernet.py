@@ -1,4 +1,9 @@
+from functools import cache
+
+from ..common import LOG
 from ..host import HOST
+from ..trace import span
+from .. import ethtool as _ethtool
 
 
 def frame_statistics(etstats):
@@ -55,10 +60,30 @@ def frame_statistics(etstats):
     return fstats
 
 
+@cache
+def _native():
+    """Get (settings, statistics) of all ports, or None to run ethtool
+
+    One netlink dump for all ports, instead of two ethtool(8) runs per
+    port, when querying the running system.
+    """
+    if not HOST.NATIVE:
+        return None
+
+    try:
+        with span("ethtool", "netlink"):
+            return _ethtool.ethtool()
+    except OSError as err:
+        LOG.debug("Ethtool netlink query failed, falling back to ethtool: %s", err)
+        return None
+
+
 def statistics(ifname):
-    if etstats := HOST.run_json(["ethtool", "--json", "-S", ifname, "--all-groups"], []):
+    if (native := _native()) is not None:
+        etstats = native[1].get(ifname)
+    elif etstats := HOST.run_json(["ethtool", "--json", "-S", ifname, "--all-groups"], []):
         etstats = etstats[0]
-    else:
+    if not etstats:
         return None
 
     statistics = {}
@@ -185,9 +210,11 @@ def link(ifname):
     Returns (eth_container_dict, interface_speed_bps_or_None); the
     interface speed is lifted onto ietf-interfaces:speed by the caller.
     """
-    if data := HOST.run_json(["ethtool", "--json", ifname], {}):
+    if (native := _native()) is not None:
+        data = native[0].get(ifname)
+    elif data := HOST.run_json(["ethtool", "--json", ifname], {}):
         data = data[0]
-    else:
+    if not data:
         return {}, None
 
     eth = {"auto-negotiation": {"enable": data.get("auto-negotiation", False)}}
@@ -1,4 +1,5 @@
 from ..host import HOST
+from ..trace import traced
 from . import common
 
 from . import bridge
@@ -140,6 +141,7 @@ def ptp_capabilities(ifname, systemjson):
     return result or None
 
 
+@traced()
 def interface(iplink, ipaddr, systemjson=None):
     interface = interface_common(iplink, ipaddr)
 
@@ -194,6 +196,7 @@ def interface(iplink, ipaddr, systemjson=None):
     return interface
 
 
+@traced()
 def interfaces(ifname=None):
     from ..host import HOST
 
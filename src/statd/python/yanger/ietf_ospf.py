@@ -1,7 +1,11 @@
-from .common import insert
+from . import frr
+from .common import insert, LOG
 from .host import HOST
 
 
+ROUTES = "show ip ospf route json"
+
+
 def frr_to_ietf_neighbor_state(state):
     """Fetch OSPF neighbor state from Frr"""
     state = state.split("/")[0]
@@ -20,8 +24,7 @@ def frr_to_ietf_neighbor_role(role):
 
 def add_routes(ospf):
     """Fetch OSPF routes from Frr"""
-    cmd = ['vtysh', '-c', "show ip ospf route json"]
-    data = HOST.run_json(cmd, default=[])
+    data = frr.show_json(ROUTES, default=[])
     if data == []:
         return  # No OSPF routes available
 
@@ -77,10 +80,30 @@ def add_routes(ospf):
     insert(ospf, "ietf-ospf:local-rib", "ietf-ospf:route", routes)
 
 
+def ospf_status():
+    """Areas, with their interfaces and neighbors, see ospf-status
+
+    On the running system, the output of ospf-status is produced right
+    here, from one session with ospfd, see frr.py.
+    """
+    if HOST.NATIVE:
+        try:
+            from ospf_status.ospf_status import COMMANDS, transform
+        except ImportError as err:
+            LOG.debug("Running ospf-status, cannot join natively: %s", err)
+        else:
+            frr.prefetch(*COMMANDS, ROUTES)
+            try:
+                return transform(*(frr.show_json(cmd) for cmd in COMMANDS))
+            except Exception:
+                return {}  # OSPF not running
+
+    return HOST.run_json(['/usr/libexec/statd/ospf-status'], default={})
+
+
 def add_areas(control_protocols):
     """Populate OSPF status"""
-    cmd = ['/usr/libexec/statd/ospf-status']
-    data = HOST.run_json(cmd, default={})
+    data = ospf_status()
     if data == {}:
         return  # No OSPF data available
 
@@ -1,5 +1,5 @@
 import re
-from .host import HOST
+from . import frr
 
 
 def parse_rip_status():
@@ -9,8 +9,7 @@ def parse_rip_status():
                            default-metric, distance, interfaces (list), neighbors (list)
     """
     try:
-        # HOST.run expects tuple, returns text string directly
-        text = HOST.run(tuple(['vtysh', '-c', 'show ip rip status']), default="")
+        text = frr.show('show ip rip status', default="")
         if not text:
             return {}
     except Exception as e:
@@ -194,7 +193,7 @@ def add_rip(control_protocols):
 
     # Get RIP-learned routes from routing table (JSON)
     # This shows routes learned via RIP (R(n) entries), not redistributed routes
-    route_data = HOST.run_json(['vtysh', '-c', 'show ip route rip json'], default={})
+    route_data = frr.show_json('show ip route rip json', default={})
 
     routes = []
     for prefix, entries in route_data.items():
@@ -253,9 +252,11 @@ def add_rip(control_protocols):
             }
 
     # Add the control-protocol
-    if "ietf-routing:control-plane-protocol" not in control_protocols:
-        control_protocols["ietf-routing:control-plane-protocol"] = []
-    control_protocols["ietf-routing:control-plane-protocol"].append(control_protocol)
+    control_protocols.setdefault("control-plane-protocol", []).append(control_protocol)
+
+
+def prefetch():
+    frr.prefetch('show ip rip status', 'show ip route rip json')
 
 
 def operational():
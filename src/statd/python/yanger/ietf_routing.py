@@ -1,10 +1,74 @@
+"""ietf-routing operational data
+
+Routes are read from FRR's RIB, see frr.py, by default.  The model
+parameter selects another source, and filters, as a comma separated
+list, e.g. `-p fib,vrf=red,prefix=10.0.0.0/8`:
+
+    rib            FRR's RIB, all routes known to zebra (default)
+    fib            The kernel's FIB, only the routes installed, read
+                   over netlink, or with ip(8).  Routes installed by
+                   FRR get its protocol, distance and metric
+    table=TABLE    Kernel routing table, name or number, or "all", to
+                   read instead of main (fib only)
+    vrf=NAME       Routes of VRF NAME instead of the default VRF
+    prefix=PREFIX  Only routes within PREFIX, e.g. to page through a
+                   full table in parts
+"""
+import json
+import socket
 from datetime import timedelta
 from re import match
 
-from .common import insert, YangDate
+from . import frr
+from .common import insert, LOG, Stream, YangDate
 from .host import HOST
-
-def uptime2datetime(uptime):
+from .ietf_interfaces.common import iplinks
+from . import netlink
+from .trace import span
+
+# Mapping of FRR protocol names to IETF routing-protocol
+PMAP = {
+    'kernel': 'infix-routing:kernel',
+    'connected': 'direct',
+    'static': 'static',
+    'ospf': 'ietf-ospf:ospfv2',
+    'ospf6': 'ietf-ospf:ospfv3',
+    'rip': 'ietf-rip:rip',
+}
+
+# Kernel route protocols of routes installed by FRR, see rt_protos.d
+# in FRR, by name or by number if they are not installed
+FRR_PROTOS = {
+    "zebra", "bgp", "isis", "ospf", "rip", "ripng", "nhrp", "eigrp",
+    "ldp", "sharp", "pbr", "static", "openfabric", "srte",
+} | {str(num) for num in (11, *range(186, 199))}
+
+SPECIAL_NEXT_HOPS = ("blackhole", "unreachable", "prohibit")
+
+
+def parse_param(param):
+    """Get (source, filters) from the model parameter, see above"""
+    source, filters = "rib", {}
+    for word in param.split(",") if param else ():
+        key, sep, val = word.strip().partition("=")
+        if not sep and key in ("rib", "fib"):
+            source = key
+        elif sep and val and key in ("table", "vrf", "prefix"):
+            filters[key] = val
+        else:
+            raise ValueError(f"Invalid ietf-routing parameter: {word}")
+
+    if "table" in filters and source != "fib":
+        raise ValueError("table= is only supported with the fib source")
+    if "table" in filters and "vrf" in filters:
+        raise ValueError("table= and vrf= cannot be combined")
+    if "prefix" in filters:
+        import ipaddress
+        filters["prefix"] = ipaddress.ip_network(filters["prefix"], strict=False)
+
+    return source, filters
+
+def uptime2datetime(uptime, now=None):
     """
     Convert uptime to YANG format (YYYY-MM-DDTHH:MM:SS+00:00)
 
@@ -12,6 +76,8 @@ def uptime2datetime(uptime):
     HH:MM:SS
     XdXXhXXm
     XXwXdXXh
+
+    The time is relative to now, if given, otherwise the current time.
     """
     h = m = s = 0
 
@@ -35,27 +101,103 @@ def uptime2datetime(uptime):
         h += days * 24
 
     uptime_delta = timedelta(hours=h, minutes=m, seconds=s)
+    if now is not None:
+        return str(YangDate(now - uptime_delta))
     return str(YangDate.from_delta(uptime_delta))
 
 
-def add_protocol(routes, proto):
-    """Populate routes from vtysh JSON output"""
+def iterobject(fp, chunk=1 << 16):
+    """Yield (key, value) of the JSON object in text stream fp
 
+    Reads and decodes one member at a time, so that only the current
+    one is held in memory, e.g. the routes to one prefix in the output
+    of `show ip route json`.  Empty input is an empty object.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def more():
+        nonlocal buf, pos, eof
+        data = fp.read(chunk)
+        eof = not data
+        buf, pos = buf[pos:] + data, 0
+        return not eof
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                return ""
+
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                val, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+                continue
+
+            # A number may continue in the next chunk
+            if end == len(buf) and not eof and more():
+                continue
+            pos = end
+            return val
+
+    if peek() == "":
+        return
+    if peek() != "{":
+        raise ValueError(f"expected JSON object, got {buf[pos:pos + 20]!r}")
+
+    pos += 1
+    if peek() == "}":
+        return
+
+    while True:
+        key = value()
+        if peek() != ":":
+            raise ValueError(f"expected ':' after {key!r}")
+        pos += 1
+        yield key, value()
+
+        sep = peek()
+        pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise ValueError(f"expected ',' or '}}' after {key!r}")
+
+
+def frr_routes(proto, vrf=None, prefix=None):
+    """Yield the routes in FRR's RIB, as read from zebra"""
     frrproto = "ip" if proto == "ipv4" else proto
-    data = HOST.run_json(['vtysh', '-c', f"show {frrproto} route json"], {})
-
-    # Mapping of FRR protocol names to IETF routing-protocol
-    pmap = {
-        'kernel': 'infix-routing:kernel',
-        'connected': 'direct',
-        'static': 'static',
-        'ospf': 'ietf-ospf:ospfv2',
-        'ospf6': 'ietf-ospf:ospfv3',
-        'rip': 'ietf-rip:rip',
-    }
-
-    out = {}
-    out["route"] = []
+    vrf = f" vrf {vrf}" if vrf else ""
+    prefix = f" {prefix} longer-prefixes" if prefix else ""
+    cmd = f"show {frrproto} route{vrf}{prefix} json"
+
+    started = False
+    try:
+        with frr.stream(cmd) as fp:
+            for _, entries in iterobject(fp):
+                for entry in entries:
+                    started = True
+                    yield entry
+    except Exception as err:
+        # A RIB cut short must not pass for a complete one
+        if started:
+            raise
+        # Same as for run_json() with a default, FRR may not be running
+        LOG.debug("Failed reading %s routes: %s", proto, err)
+
+
+def routes(proto, vrf=None, prefix=None):
+    """Yield routes converted from FRR to ietf-routing, one at a time"""
 
     if proto == "ipv4":
         default = "0.0.0.0/0"
@@ -64,73 +206,281 @@ def add_protocol(routes, proto):
         default = "::/0"
         host_prefix_length = "128"
 
-    for prefix, entries in data.items():
-        for route in entries:
-            new = {}
-            dst = route.get('prefix', default)
-            if '/' not in dst:
-                dst = f"{dst}/{route.get('prefixLen', host_prefix_length)}"
+    # Routes installed at the same time share their uptime, so convert
+    # each one only once, relative to the same now.
+    now = HOST.now()
+    updated = {}
+
+    for route in frr_routes(proto, vrf, prefix):
+        new = {}
+        dst = route.get('prefix', default)
+        if '/' not in dst:
+            dst = f"{dst}/{route.get('prefixLen', host_prefix_length)}"
+
+        new[f'ietf-{proto}-unicast-routing:destination-prefix'] = dst
+        rproto = route.get('protocol', 'infix-routing:kernel')
+        new['source-protocol'] = PMAP.get(rproto, 'infix-routing:kernel')
+        new['route-preference'] = route.get('distance', 0)
+
+        # Metric only available in the model for OSPF and RIP routes
+        if 'ospf' in rproto:
+            new['ietf-ospf:metric'] = route.get('metric', 0)
+        elif 'rip' in rproto:
+            new['ietf-rip:metric'] = route.get('metric', 0)
+
+        # See https://datatracker.ietf.org/doc/html/rfc7951#section-6.9
+        # for details on how presence leaves are encoded in JSON: [null]
+        if route.get('selected', False):
+            new['active'] = [None]
+
+        uptime = route.get('uptime', 0)
+        if uptime not in updated:
+            updated[uptime] = uptime2datetime(uptime, now)
+        new['last-updated'] = updated[uptime]
+        installed = route.get('installed', False)
+
+        next_hops = []
+        for hop in route.get('nexthops', []):
+            next_hop = {}
+            if hop.get('ip'):
+                next_hop[f'ietf-{proto}-unicast-routing:address'] = hop['ip']
+            elif hop.get('interfaceName'):
+                next_hop['outgoing-interface'] = hop['interfaceName']
+            # See zebra/zebra_vty.c:re_status_outpupt_char()
+            if installed and hop.get('fib', False):
+                next_hop['infix-routing:installed'] = [None]
+            next_hops.append(next_hop)
+
+        if next_hops:
+            new['next-hop'] = {'next-hop-list': {'next-hop': next_hops}}
+        else:
+            next_hop = {}
+            protocol = route.get('protocol', 'unicast')
+            if protocol == "blackhole":
+                next_hop['special-next-hop'] = "blackhole"
+            elif protocol == "unreachable":
+                next_hop['special-next-hop'] = "unreachable"
+            else:
+                if route.get('interfaceName'):
+                    next_hop['outgoing-interface'] = route['interfaceName']
+                if route.get('nexthop'):
+                    next_hop[f'ietf-{proto}-unicast-routing:next-hop-address'] = route['nexthop']
+
+            new['next-hop'] = next_hop
 
-            new[f'ietf-{proto}-unicast-routing:destination-prefix'] = dst
-            frr = route.get('protocol', 'infix-routing:kernel')
-            new['source-protocol'] = pmap.get(frr, 'infix-routing:kernel')
-            new['route-preference'] = route.get('distance', 0)
+        yield new
 
-            # Metric only available in the model for OSPF and RIP routes
-            if 'ospf' in frr:
-                new['ietf-ospf:metric'] = route.get('metric', 0)
-            elif 'rip' in frr:
-                new['ietf-rip:metric'] = route.get('metric', 0)
 
-            # See https://datatracker.ietf.org/doc/html/rfc7951#section-6.9
-            # for details on how presence leaves are encoded in JSON: [null]
-            if route.get('selected', False):
-                new['active'] = [None]
+def vrf_table(vrf):
+    """Get the kernel routing table of VRF vrf"""
+    try:
+        return iplinks(vrf)[vrf]["linkinfo"]["info_data"]["table"]
+    except Exception:
+        raise ValueError(f"No such VRF: {vrf}") from None
 
-            new['last-updated'] = uptime2datetime(route.get('uptime', 0))
-            installed = route.get('installed', False)
 
-            next_hops = []
-            for hop in route.get('nexthops', []):
-                next_hop = {}
-                if hop.get('ip'):
-                    next_hop[f'ietf-{proto}-unicast-routing:address'] = hop['ip']
-                elif hop.get('interfaceName'):
-                    next_hop['outgoing-interface'] = hop['interfaceName']
-                # See zebra/zebra_vty.c:re_status_outpupt_char()
-                if installed and hop.get('fib', False):
-                    next_hop['infix-routing:installed'] = [None]
-                next_hops.append(next_hop)
-
-            if next_hops:
-                new['next-hop'] = {'next-hop-list': {'next-hop': next_hops}}
-            else:
-                next_hop = {}
-                protocol = route.get('protocol', 'unicast')
-                if protocol == "blackhole":
-                    next_hop['special-next-hop'] = "blackhole"
-                elif protocol == "unreachable":
-                    next_hop['special-next-hop'] = "unreachable"
-                else:
-                    if route.get('interfaceName'):
-                        next_hop['outgoing-interface'] = route['interfaceName']
-                    if route.get('nexthop'):
-                        next_hop[f'ietf-{proto}-unicast-routing:next-hop-address'] = route['nexthop']
+def kernel_routes(proto, table):
+    """Routes in kernel table, as in `ip -j route show table TABLE`"""
+    if HOST.NATIVE:
+        family = socket.AF_INET if proto == "ipv4" else socket.AF_INET6
+        number = netlink.rttable(table)
+        try:
+            with span("iproutes", "netlink", table=table):
+                return netlink.iproutes(family, number)
+        except OSError as err:
+            LOG.debug("Netlink query failed, falling back to ip: %s", err)
+
+    flag = "-4" if proto == "ipv4" else "-6"
+    return HOST.run_json(["ip", "-j", flag, "route", "show", "table", str(table)], [])
+
+
+def kernel_nexthops():
+    """Nexthop objects, by id, as in `ip -j nexthop show`"""
+    nexthops = None
+    if HOST.NATIVE:
+        try:
+            with span("ipnexthops", "netlink"):
+                nexthops = netlink.ipnexthops()
+        except OSError as err:
+            LOG.debug("Netlink query failed, falling back to ip: %s", err)
 
-                new['next-hop'] = next_hop
+    if nexthops is None:
+        # Not supported by older kernels, nor by ip(8) there
+        nexthops = HOST.run_json(["ip", "-j", "nexthop", "show"], [])
 
-            out['route'].append(new)
+    return {nh["id"]: nh for nh in nexthops if "id" in nh}
+
+
+def frr_installed(proto, vrf=None, prefix=None):
+    """Get (protocol, distance, metric, uptime) of routes FRR installed
+
+    Keyed by destination prefix, only for the selected route of each
+    prefix that is in the FIB, and not only known to FRR through the
+    kernel, e.g. connected routes.
+    """
+    host_prefix_length = "32" if proto == "ipv4" else "128"
+
+    installed = {}
+    for route in frr_routes(proto, vrf, prefix):
+        rproto = route.get('protocol', 'kernel')
+        if rproto in ('kernel', 'connected', 'local') or \
+           not (route.get('selected') and route.get('installed')):
+            continue
+
+        dst = route.get('prefix', "")
+        if '/' not in dst:
+            dst = f"{dst}/{route.get('prefixLen', host_prefix_length)}"
+        installed[dst] = (rproto, route.get('distance', 0),
+                          route.get('metric', 0), route.get('uptime', 0))
+
+    return installed
+
+
+def fib_routes(proto, table="main", vrf=None, prefix=None):
+    """Get routes in the kernel FIB converted to ietf-routing
+
+    The table is looked up, and the dump started, right away, to fail
+    before any output is written, the routes are then converted one
+    at a time.  FRR is only asked about the routes it owns, when the
+    first one is found, so that a FIB without any does not depend on
+    zebra.
+    """
+    if vrf:
+        table = vrf_table(vrf)
 
-    insert(routes, 'routes', out)
+    return _fib_routes(proto, kernel_routes(proto, table), vrf, prefix)
+
+
+def _fib_routes(proto, kroutes, vrf, prefix):
+    if proto == "ipv4":
+        default = "0.0.0.0/0"
+        host_prefix_length = "32"
+    else:
+        default = "::/0"
+        host_prefix_length = "128"
+
+    if prefix:
+        import ipaddress
+
+    nexthops = None
+    installed = None
+    now = HOST.now()
+    updated = {}
+
+    for route in kroutes:
+        rtype = route.get('type', 'unicast')
+        if rtype != 'unicast' and rtype not in SPECIAL_NEXT_HOPS:
+            continue
+
+        dst = route.get('dst', 'default')
+        if dst == 'default':
+            dst = default
+        elif '/' not in dst:
+            dst = f"{dst}/{host_prefix_length}"
+        if prefix and not ipaddress.ip_network(dst).subnet_of(prefix):
+            continue
+
+        meta = None
+        kproto = route.get('protocol', 'boot')
+        if kproto in FRR_PROTOS:
+            if installed is None:
+                installed = frr_installed(proto, vrf, prefix)
+            meta = installed.get(dst)
+
+        new = {}
+        new[f'ietf-{proto}-unicast-routing:destination-prefix'] = dst
+        if meta:
+            frrproto, distance, metric, uptime = meta
+            new['source-protocol'] = PMAP.get(frrproto, 'infix-routing:kernel')
+            new['route-preference'] = distance
+            if 'ospf' in frrproto:
+                new['ietf-ospf:metric'] = metric
+            elif 'rip' in frrproto:
+                new['ietf-rip:metric'] = metric
+        else:
+            # Routes the kernel adds for local addresses, as connected
+            # routes from FRR, all other routes from outside FRR.
+            new['source-protocol'] = 'direct' if kproto == 'kernel' \
+                else 'infix-routing:kernel'
+            new['route-preference'] = 0
+
+        # Everything in the FIB is used for forwarding
+        new['active'] = [None]
+        if meta:
+            if uptime not in updated:
+                updated[uptime] = uptime2datetime(uptime, now)
+            new['last-updated'] = updated[uptime]
+
+        hops = route.get('nexthops')
+        if hops is None and 'nhid' in route and \
+           not ('gateway' in route or 'via' in route or 'dev' in route):
+            # Nexthop object not expanded, nexthop_compat_mode=0
+            if nexthops is None:
+                nexthops = kernel_nexthops()
+            nh = nexthops.get(route['nhid'], {})
+            if 'blackhole' in nh:
+                rtype = 'blackhole'
+            elif 'group' in nh:
+                hops = [nexthops.get(member['id'], {}) for member in nh['group']]
+            else:
+                hops = [nh]
+        elif hops is None:
+            hops = [route]
+
+        next_hop = {}
+        if rtype in SPECIAL_NEXT_HOPS:
+            next_hop['special-next-hop'] = rtype
+        else:
+            next_hops = []
+            for hop in hops:
+                entry = {}
+                address = hop.get('gateway')
+                via = hop.get('via', {})
+                if via.get('family') == ("inet" if proto == "ipv4" else "inet6"):
+                    address = via.get('host')
+                if address:
+                    entry[f'ietf-{proto}-unicast-routing:address'] = address
+                elif hop.get('dev'):
+                    entry['outgoing-interface'] = hop['dev']
+                if not {'dead', 'linkdown'} & set(hop.get('flags', [])):
+                    entry['infix-routing:installed'] = [None]
+                next_hops.append(entry)
+            next_hop['next-hop-list'] = {'next-hop': next_hops}
+
+        new['next-hop'] = next_hop
+
+        yield new
+
+
+def add_protocol(rib, proto, source="rib", filters=None):
+    """Populate rib with routes from vtysh JSON output, or the FIB
+
+    The routes are streamed, read and converted while the output is
+    written, since a full table can have millions of them.
+    """
+    filters = filters or {}
+    prefix = filters.get("prefix")
+    if prefix and prefix.version != (4 if proto == "ipv4" else 6):
+        insert(rib, 'routes', {'route': []})
+        return
+
+    if source == "fib":
+        gen = fib_routes(proto, filters.get("table", "main"),
+                         filters.get("vrf"), prefix)
+    else:
+        gen = routes(proto, filters.get("vrf"), prefix)
+
+    insert(rib, 'routes', {'route': Stream(gen)})
 
 
 def get_routing_interfaces():
     """Get list of interfaces with IPv4 or IPv6 forwarding enabled"""
-    import json
 
-    # Get all interfaces
-    links_json = HOST.run(tuple(['ip', '-j', 'link', 'show']), default="[]")
-    links = json.loads(links_json)
+    # Same link dump as ietf-interfaces, shared when run together
+    try:
+        links = iplinks()
+    except Exception:
+        links = {}
 
     # Fetch all forwarding sysctls in two calls instead of 2 per interface
     ipv4_sysctls = HOST.run(tuple(['sysctl', 'net.ipv4.conf']), default="")
@@ -154,18 +504,16 @@ def get_routing_interfaces():
                 ipv6_fwd.add(parts[3])
 
     routing_ifaces = []
-    for link in links:
-        ifname = link.get('ifname')
-        if not ifname:
-            continue
-
+    for ifname in links:
         if ifname in ipv4_fwd or ifname in ipv6_fwd:
             routing_ifaces.append(ifname)
 
     return routing_ifaces
 
 
-def operational():
+def operational(param=None):
+    source, filters = parse_param(param)
+
     out = {
         "ietf-routing:routing": {
             "interfaces": {
@@ -185,7 +533,7 @@ def operational():
 
     ipv4routes = out['ietf-routing:routing']['ribs']['rib'][0]
     ipv6routes = out['ietf-routing:routing']['ribs']['rib'][1]
-    add_protocol(ipv4routes, "ipv4")
-    add_protocol(ipv6routes, "ipv6")
+    add_protocol(ipv4routes, "ipv4", source, filters)
+    add_protocol(ipv6routes, "ipv6", source, filters)
 
     return out
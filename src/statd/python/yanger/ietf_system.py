@@ -1,9 +1,10 @@
 import subprocess
-import ipaddress
 import re
 
 from .common import insert,YangDate
 from .host import HOST
+from .xpath import root, select
+from . import chrony
 
 def uboot_get_boot_order():
     data = HOST.run_multiline("fw_printenv BOOT_ORDER".split(), [])
@@ -36,30 +37,7 @@ def get_boot_order():
     return order
 
 def add_ntp(out):
-    """Add NTP source information from chronyc sources.
-
-    The chronyc -c sources output is CSV with the following fields:
-      [0] Mode indicator:
-          ^  server (we're a client to this source)
-          =  peer (symmetric mode)
-          #  local reference clock (GPS, PPS, etc.) - skipped, no IP address
-      [1] State indicator:
-          *  selected (current sync source)
-          +  candidate
-          -  outlier
-          ?  unusable
-          x  falseticker
-          ~  unstable
-      [2] Address (IP address or refclock name like "GPS")
-      [3] Stratum
-      [4] Poll interval (log2 seconds)
-      [5] Reach (octal reachability register)
-      [6] LastRx (seconds since last response)
-      [7] Last offset (seconds)
-      [8] Offset at last update (seconds)
-      [9] Error estimate (seconds)
-    """
-    data = HOST.run_multiline(["chronyc", "-c", "sources"], [])
+    """Add NTP source information from chronyd sources, see chrony.py"""
     source = []
     state_mode_map = {
         "^": "server",
@@ -74,23 +52,24 @@ def add_ntp(out):
         "x": "falseticker",
         "~": "unstable"
     }
-    for line in data:
-        src = {}
-        line = line.split(',')
+    for src in chrony.report("sources"):
         # Skip reference clocks (mode "#") as they have names like "GPS" instead of IP addresses
-        if line[0] == "#":
+        if src["mode"] == "#":
             continue
-        src["address"] = line[2]
-        src["mode"] = state_mode_map[line[0]]
-        src["state"] = source_state_map[line[1]]
-        src["stratum"] = int(line[3])
-        src["poll"] = int(line[4])
-        source.append(src)
+        source.append({
+            "address": src["name"],
+            "mode": state_mode_map[src["mode"]],
+            "state": source_state_map[src["state"]],
+            "stratum": src["stratum"],
+            "poll": src["poll"],
+        })
 
     insert(out, "infix-system:ntp", "sources", "source", source)
 
 
 def add_dns(out):
+    import ipaddress
+
     options = {}
     servers = []
     search = []
@@ -268,7 +247,7 @@ def add_contact_location(out):
             out[name] = val
 
 def add_timezone(out):
-    path = HOST.run(tuple("realpath /etc/localtime".split()), "")
+    path = HOST.realpath("/etc/localtime")
     timezone = None
     prefixes = [
         '/usr/share/zoneinfo/posix/',
@@ -450,25 +429,53 @@ def add_resource_usage(out):
     if resource:
         insert(out, "infix-system:resource-usage", resource)
 
-def operational():
+def prefetch():
+    HOST.prefetch([
+        ("hostname",),
+        ("copy", "running", "-x", "/system/contact"),
+        ("copy", "running", "-x", "/system/location"),
+        ("getent", "passwd"),
+        ("getent", "shadow"),
+        ("rauc", "status", "--detailed", "--output-format=json"),
+        ("fw_printenv", "BOOT_ORDER"),
+        ("rauc-installation-status",),
+        ("/sbin/resolvconf", "-l"),
+        ("initctl", "-j"),
+    ] + chrony.commands("sources") + [
+        ("df", "-k", mount) for mount in ("/", "/var", "/cfg", "/run", "/tmp")
+    ] + ([] if HOST.NATIVE else [
+        ("realpath", "/etc/localtime"),       # See Host.realpath()
+    ]), [
+        "/etc/resolv.conf.head",
+        "/etc/os-release",
+        "/proc/uptime",
+        "/proc/meminfo",
+        "/proc/loadavg",
+    ])
+
+PRODUCERS = (
+    ("/ietf-system:system/hostname", add_hostname),
+    (("/ietf-system:system/contact",
+      "/ietf-system:system/location"), add_contact_location),
+    ("/ietf-system:system/authentication", add_users),
+    ("/ietf-system:system/clock", add_timezone),
+    ("/ietf-system:system-state/infix-system:software", add_software),
+    ("/ietf-system:system-state/infix-system:ntp", add_ntp),
+    ("/ietf-system:system-state/infix-system:dns-resolver", add_dns),
+    ("/ietf-system:system-state/clock", add_clock),
+    ("/ietf-system:system-state/platform", add_platform),
+    ("/ietf-system:system-state/infix-system:services", add_services),
+    ("/ietf-system:system-state/infix-system:resource-usage", add_resource_usage),
+)
+
+def operational(xpath=None):
     out = {
         "ietf-system:system": {
         },
         "ietf-system:system-state": {
         }
     }
-    out_state = out["ietf-system:system-state"]
-    out_system = out["ietf-system:system"]
-    add_hostname(out_system)
-    add_contact_location(out_system)
-    add_users(out_system)
-    add_timezone(out_system)
-    add_software(out_state)
-    add_ntp(out_state)
-    add_dns(out_state)
-    add_clock(out_state)
-    add_platform(out_state)
-    add_services(out_state)
-    add_resource_usage(out_state)
+    for path, producer in select(PRODUCERS, xpath):
+        producer(out[root(path)])
 
     return out
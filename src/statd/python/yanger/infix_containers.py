@@ -1,15 +1,23 @@
 """Operational data provider for infix-containers YANG model.
 
 Collects container status, network info, resource limits from cgroups,
-and runtime statistics via podman commands.
+and runtime statistics directly from each container's cgroup and
+network namespace.  Podman is only used to discover the containers.
+
+CPU usage is the share of a core used since the previous sample, which
+is kept in SAMPLES between queries, or since the container started.
 """
+import datetime
+import json
 import os
-import re
 
 from .common import LOG
 from .host import HOST
 
 
+SAMPLES = "/run/yanger/containers.json"
+MIN_INTERVAL = 1
+
 # Catch errors (check=True), at this point we've run 'podman ps' (below)
 def podman_inspect(name):
     """Call podman inspect {name}, return object at {path} or None."""
@@ -54,33 +62,6 @@ def network(ps, inspect):
     return net
 
 
-def parse_size_kib(size_str):
-    """Parse size string like '1.5MB' or '512kB' to KiB (kibibytes)."""
-    if not size_str:
-        return 0
-
-    size_str = size_str.strip().upper()
-
-    # Extract numeric part and unit
-    match = re.match(r'([0-9.]+)\s*([KMGT]?I?B)?', size_str)
-    if not match:
-        return 0
-
-    value = float(match.group(1))
-    unit = match.group(2) if match.group(2) else 'B'
-
-    # Convert to KiB (kibibytes)
-    multipliers = {
-        'B': 1/1024,
-        'KB': 1000/1024, 'KIB': 1,
-        'MB': (1000**2)/1024, 'MIB': 1024,
-        'GB': (1000**3)/1024, 'GIB': 1024**2,
-        'TB': (1000**4)/1024, 'TIB': 1024**3,
-    }
-
-    return int(value * multipliers.get(unit, 1))
-
-
 def parse_cgroup_memory(mem_str):
     """Parse cgroup memory.max value (bytes) to KiB."""
     if not mem_str or mem_str == "max":
@@ -108,8 +89,8 @@ def parse_cgroup_cpu(cpu_str):
         return 0
 
 
-def read_cgroup_limits(inspect):
-    """Read resource limits from cgroup files for a container."""
+def cgroup_dir(inspect):
+    """Get the cgroup v2 directory of a container, or None"""
     if not inspect or not isinstance(inspect, dict):
         return None
 
@@ -117,28 +98,20 @@ def read_cgroup_limits(inspect):
     if not cgroup_path:
         return None
 
-    cgroup_base = f"/sys/fs/cgroup{cgroup_path}"
-    mem_val = 0
-    cpu_val = 0
+    return f"/sys/fs/cgroup{cgroup_path}"
 
-    try:
-        # Read memory limit (in bytes, convert to KiB)
-        mem_max_path = os.path.join(cgroup_base, "memory.max")
-        if os.path.exists(mem_max_path):
-            with open(mem_max_path, 'r') as f:
-                mem_str = f.read().strip()
-                mem_val = parse_cgroup_memory(mem_str)
-
-        # Read CPU limit (quota and period in microseconds, convert to millicores)
-        cpu_max_path = os.path.join(cgroup_base, "cpu.max")
-        if os.path.exists(cpu_max_path):
-            with open(cpu_max_path, 'r') as f:
-                cpu_str = f.read().strip()
-                cpu_val = parse_cgroup_cpu(cpu_str)
-    except Exception as e:
-        LOG.error(f"failed reading cgroup limits: {e}")
+
+def read_cgroup_limits(inspect):
+    """Read resource limits from cgroup files for a container."""
+    if not (cgroup_base := cgroup_dir(inspect)):
         return None
 
+    # Read memory limit (in bytes, convert to KiB)
+    mem_val = parse_cgroup_memory(HOST.read(os.path.join(cgroup_base, "memory.max")))
+
+    # Read CPU limit (quota and period in microseconds, convert to millicores)
+    cpu_val = parse_cgroup_cpu(HOST.read(os.path.join(cgroup_base, "cpu.max")))
+
     if mem_val > 0 or cpu_val > 0:
         result = {}
         if mem_val > 0:
@@ -150,70 +123,192 @@ def read_cgroup_limits(inspect):
     return None
 
 
-def resource_stats(name):
-    """Get resource usage stats for a running container using podman stats."""
-    cmd = ['podman', 'stats', '--no-stream', '--format', 'json', '--no-reset', name]
+def parse_keyed(text):
+    """Parse flat keyed cgroup files, e.g. cpu.stat, to {key: int}"""
+    stats = {}
+    for line in (text or "").splitlines():
+        key, _, val = line.partition(" ")
+        if val.strip().isdigit():
+            stats[key] = int(val)
+    return stats
+
+
+def parse_io_stat(text):
+    """Sum bytes read and written, over all devices, in io.stat"""
+    rbytes, wbytes = 0, 0
+    for line in (text or "").splitlines():
+        for field in line.split()[1:]:
+            key, _, val = field.partition("=")
+            if key == "rbytes" and val.isdigit():
+                rbytes += int(val)
+            elif key == "wbytes" and val.isdigit():
+                wbytes += int(val)
+    return rbytes, wbytes
+
+
+def parse_net_dev(text):
+    """Sum bytes received and sent, over all but lo, in /proc/net/dev"""
+    rx, tx = 0, 0
+    for line in (text or "").splitlines()[2:]:
+        ifname, _, counters = line.partition(":")
+        counters = counters.split()
+        if ifname.strip() == "lo" or len(counters) < 9:
+            continue
+        rx += int(counters[0])
+        tx += int(counters[8])
+    return rx, tx
+
+
+def started_at(inspect):
+    """Get the start time of a container as seconds since the epoch"""
+    started = inspect.get("State", {}).get("StartedAt", "")
+
+    # Podman has nanoseconds, which datetime does not grok, and its
+    # local time offset, e.g. +01:00, or Z for UTC
+    date, dot, frac = started.partition(".")
+    if dot:
+        digits = len(frac) - len(frac.lstrip("0123456789"))
+        started = f"{date}.{(frac[:digits] + '000000')[:6]}{frac[digits:]}"
+    if started.endswith("Z"):
+        started = started[:-1] + "+00:00"
+
     try:
-        stats = HOST.run_json(cmd, default=[])
-        if not stats or len(stats) == 0:
-            return None
-
-        stat = stats[0]
-        rusage = {}
-
-        # Memory usage - parse used memory, convert to KiB
-        # Encode as string for uint64 compatibility
-        mem_usage_str = stat.get("mem_usage", "")
-        if "/" in mem_usage_str:
-            mem_used_str = mem_usage_str.split("/")[0].strip()
-            mem_used_kib = parse_size_kib(mem_used_str)
-            rusage["memory"] = f"{mem_used_kib}"
-
-        # CPU percentage - format as decimal64 with 2 fractional digits
-        cpu_perc = stat.get("cpu_percent", "0%").rstrip("%")
-        try:
-            rusage["cpu"] = "{:.2f}".format(float(cpu_perc))
-        except (ValueError, TypeError):
-            pass
-
-        block_io = stat.get("block_io", "0B / 0B")
-        if "/" in block_io:
-            block_read_str, block_write_str = block_io.split("/")
-            block_read_kib = parse_size_kib(block_read_str.strip())
-            block_write_kib = parse_size_kib(block_write_str.strip())
-
-            rusage["block-io"] = {}
-            if block_read_kib > 0:
-                rusage["block-io"]["read"] = f"{block_read_kib}"
-            if block_write_kib > 0:
-                rusage["block-io"]["write"] = f"{block_write_kib}"
-
-        net_io = stat.get("net_io", "0B / 0B")
-        if "/" in net_io:
-            net_rx_str, net_tx_str = net_io.split("/")
-            net_rx_kib = parse_size_kib(net_rx_str.strip())
-            net_tx_kib = parse_size_kib(net_tx_str.strip())
-
-            rusage["net-io"] = {}
-            if net_rx_kib > 0:
-                rusage["net-io"]["received"] = f"{net_rx_kib}"
-            if net_tx_kib > 0:
-                rusage["net-io"]["sent"] = f"{net_tx_kib}"
-
-        pids = stat.get("pids", "0")
-        try:
-            rusage["pids"] = int(pids)
-        except (ValueError, TypeError):
-            pass
-
-        return rusage if rusage else None
+        secs = datetime.datetime.fromisoformat(started)
+    except ValueError:
+        return None
+    if secs.tzinfo is None:
+        secs = secs.replace(tzinfo=datetime.timezone.utc)
+    return secs.timestamp()
 
-    except Exception as e:
-        LOG.error(f"failed getting stats for {name}: {e}")
+
+def run_state(ps, inspect):
+    """Get the PID and start time of a running container
+
+    From `podman ps`, which is never cached, unlike `podman inspect`,
+    so a restarted container is not taken for its previous run, with
+    another PID.  The start time from inspect is more precise, it is
+    used if it is of the same run.
+
+    """
+    pid = ps.get("Pid") or None
+    started = None
+    if pid and inspect.get("State", {}).get("Pid") == pid:
+        started = started_at(inspect)
+    if started is None and isinstance(ps.get("StartedAt"), (int, float)):
+        started = ps["StartedAt"] or None
+
+    return pid, started
+
+
+def load_samples():
+    """Get the previous CPU usage samples, by container id"""
+    # Only meaningful on the system the samples were taken on
+    if not HOST.NATIVE:
+        return {}
+
+    try:
+        with open(SAMPLES, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_samples(samples):
+    if not HOST.NATIVE:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(SAMPLES), exist_ok=True)
+
+        # Atomic replace, other yangers may be reading it
+        tmp = f"{SAMPLES}.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(samples, f)
+        os.replace(tmp, SAMPLES)
+    except OSError as err:
+        LOG.debug(f"Failed saving {SAMPLES}: {err}")
+
+
+def cpu_percent(usage, now, started, prev):
+    """CPU usage since the previous sample, or since start, and the sample
+
+    Like `podman stats`, 100% is one CPU core fully used.  Samples
+    taken closer than MIN_INTERVAL apart are too noisy, the previous
+    one is then kept, and its figure reused.
+
+    """
+    if prev and prev.get("started") == started and \
+       prev.get("usage", 0) <= usage and prev.get("time", 0) < now:
+        if now - prev["time"] < MIN_INTERVAL:
+            return prev.get("cpu"), prev
+        since, base = prev["time"], prev["usage"]
+    elif started and started < now:
+        since, base = started, 0
+    else:
+        return None, None
+
+    cpu = (usage - base) / ((now - since) * 1e6) * 100
+    return cpu, {"started": started, "time": now, "usage": usage, "cpu": cpu}
+
+
+def resource_stats(ps, inspect, now, samples):
+    """Get resource usage of a running container from its cgroup
+
+    The CPU usage sample is updated in samples, by container id.
+
+    """
+    if not (cgroup_base := cgroup_dir(inspect)):
         return None
 
+    memory = (HOST.read(os.path.join(cgroup_base, "memory.current")) or "").strip()
+    cpustat = parse_keyed(HOST.read(os.path.join(cgroup_base, "cpu.stat")))
+    if not memory and not cpustat:
+        return None
 
-def container(ps):
+    rusage = {}
+    pid, started = run_state(ps, inspect)
+
+    # Encode as string for uint64 compatibility
+    if memory.isdigit():
+        rusage["memory"] = f"{int(memory) // 1024}"
+
+    if "usage_usec" in cpustat:
+        cid = inspect.get("Id", "")
+        cpu, sample = cpu_percent(cpustat["usage_usec"], now, started,
+                                  samples.get(cid))
+        if sample:
+            samples[cid] = sample
+        if cpu is not None:
+            # decimal64 with 2 fractional digits
+            rusage["cpu"] = "{:.2f}".format(cpu)
+
+    rbytes, wbytes = parse_io_stat(HOST.read(os.path.join(cgroup_base, "io.stat")))
+    rusage["block-io"] = {}
+    if rbytes >= 1024:
+        rusage["block-io"]["read"] = f"{rbytes // 1024}"
+    if wbytes >= 1024:
+        rusage["block-io"]["write"] = f"{wbytes // 1024}"
+
+    # The counters of all interfaces in the container's network
+    # namespace, as seen by its init process.  Host network containers
+    # would count those of the host, like podman, leave them out.
+    networks = inspect.get("NetworkSettings", {}).get("Networks") or {}
+    if pid and "host" not in networks:
+        rx, tx = parse_net_dev(HOST.read(f"/proc/{pid}/net/dev"))
+        rusage["net-io"] = {}
+        if rx >= 1024:
+            rusage["net-io"]["received"] = f"{rx // 1024}"
+        if tx >= 1024:
+            rusage["net-io"]["sent"] = f"{tx // 1024}"
+
+    pids = (HOST.read(os.path.join(cgroup_base, "pids.current")) or "").strip()
+    if pids.isdigit():
+        rusage["pids"] = int(pids)
+
+    return rusage
+
+
+def container(ps, inspect, now, samples):
     out = {
         "name":     ps["Names"][0],
         "id":       ps["Id"],
@@ -223,12 +318,6 @@ def container(ps):
         "status":   ps["Status"]
     }
 
-    inspect = podman_inspect(out["name"])
-    if inspect and isinstance(inspect, list) and len(inspect) > 0:
-        inspect = inspect[0]
-    else:
-        inspect = {}
-
     path = inspect.get("Path", "")
     args = inspect.get("Args", [])
     if path:
@@ -243,16 +332,54 @@ def container(ps):
         out["resource-limit"] = limits
 
     if out["running"]:
-        rusage = resource_stats(out["name"])
+        rusage = resource_stats(ps, inspect, now, samples)
         if rusage:
             out["resource-usage"] = rusage
 
     return out
 
 
+def inspect_of(ps):
+    inspect = podman_inspect(ps["Names"][0])
+    if inspect and isinstance(inspect, list) and len(inspect) > 0:
+        return inspect[0]
+
+    return {}
+
+
+def usage_paths(ps, inspect):
+    """Files read for the resource usage of a container"""
+    if ps["State"] != "running" or not (cgroup_base := cgroup_dir(inspect)):
+        return []
+
+    paths = [os.path.join(cgroup_base, name) for name in
+             ("memory.max", "cpu.max", "memory.current", "cpu.stat",
+              "io.stat", "pids.current")]
+    if pid := run_state(ps, inspect)[0]:
+        paths.append(f"/proc/{pid}/net/dev")
+
+    return paths
+
+
 def operational():
+    containers = [(ps, inspect_of(ps)) for ps in podman_ps()]
+
+    # All cgroup and namespace counters are sampled in one pass
+    HOST.prefetch(paths=[path for ps, inspect in containers
+                         for path in usage_paths(ps, inspect)])
+
+    now, samples = None, {}
+    if any(ps["State"] == "running" for ps, _ in containers):
+        now, samples = HOST.now().timestamp(), load_samples()
+    out = [container(ps, inspect, now, samples) for ps, inspect in containers]
+
+    # Forget containers that are gone
+    ids = {inspect.get("Id") for _, inspect in containers}
+    if now is not None:
+        save_samples({cid: s for cid, s in samples.items() if cid in ids})
+
     return {
         "infix-containers:containers": {
-            "container": [container(ps) for ps in podman_ps()]
+            "container": out
         }
     }
@@ -4,52 +4,123 @@ Collect operational data for infix-dhcp-server.yang from dnsmasq
 """
 from datetime import datetime, timezone
 import json
-import dbus
 
+from .host import HOST
+from .xpath import parse, root, select
+
+LEASES_FILE = "/var/lib/misc/dnsmasq.leases"
+
+
+def parse_lease(line):
+    """Parse a line of the dnsmasq leases file to a row, None if invalid
+
+    A row is a tuple of (expires, phys-address, address, hostname,
+    client-id), all of them strings, in the format of the model.
+    """
+    tokens = line.strip().split(" ")
+    if len(tokens) != 5:
+        return None
+
+    # Handle infinite lease time as specified in RFC 2131
+    if tokens[0] == "0":
+        expires = "never"
+    else:
+        try:
+            dt = datetime.fromtimestamp(int(tokens[0]), tz=timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            return None
+        expires = dt.isoformat()
+
+    return (expires, tokens[1], tokens[2],
+            tokens[3] if tokens[3] != '*' else "",
+            tokens[4] if tokens[4] != '*' else "")
+
+
+class LeaseIndex:
+    """Leases of the dnsmasq leases file, kept up to date incrementally
+
+    Sites with tens of thousands of leases are polled constantly, so the
+    index is kept across requests and only refreshed when the inode,
+    size or mtime of the file changes.  dnsmasq rewrites the whole file
+    on every change, but most of its lines stay the same, so rows are
+    memoized by line and only new or changed lines are parsed.
+
+    Rows are tuples, see `parse_lease()`, in file order, indexed by
+    address and by MAC address.
+    """
+    def __init__(self, path=LEASES_FILE):
+        self.path = path
+        self.stat = None
+        self.rows = []
+        self.by_address = {}
+        self.by_mac = {}
+        self.memo = {}
+
+    def refresh(self):
+        st = HOST.stat(self.path)
+        stat = (st.st_ino, st.st_size, st.st_mtime) if st else None
+        if stat and stat == self.stat:
+            return
+
+        text = HOST.read(self.path) if st else None
+        lines = text.splitlines() if text else []
+
+        memo = {}
+        for line in lines:
+            row = self.memo.get(line)
+            if row is None and line not in self.memo:
+                row = parse_lease(line)
+            memo[line] = row
+
+        self.stat = stat
+        self.memo = memo
+        self.rows = [memo[line] for line in lines if memo[line]]
+        self.by_address = {row[2]: i for i, row in enumerate(self.rows)}
+        self.by_mac = {}
+        for i, row in enumerate(self.rows):
+            self.by_mac.setdefault(row[1], []).append(i)
+
+    def select(self, address=None, mac=None):
+        """Get rows, optionally only those of address and/or mac"""
+        self.refresh()
+
+        if address is not None:
+            i = self.by_address.get(address)
+            rows = [] if i is None else [self.rows[i]]
+            if mac is not None:
+                rows = [row for row in rows if row[1] == mac]
+        elif mac is not None:
+            rows = [self.rows[i] for i in self.by_mac.get(mac, [])]
+        else:
+            rows = self.rows
+
+        return list(rows)
+
+
+LEASES = LeaseIndex()
+
+
+def leases(leases_file=LEASES_FILE, address=None):
+    """Populate DHCP leases table, optionally only address"""
+    index = LEASES if leases_file == LEASES.path else LeaseIndex(leases_file)
 
-def leases(leases_file):
-    """Populate DHCP leases table"""
     table = []
-    try:
-        with open(leases_file, 'r', encoding='utf-8') as fd:
-            for line in fd:
-                tokens = line.strip().split(" ")
-                if len(tokens) != 5:
-                    continue
-
-                # Handle infinite lease time as specified in RFC 2131
-                if tokens[0] == "0":
-                    expires = "never"
-                else:
-                    dt = datetime.fromtimestamp(int(tokens[0]),
-                                                tz=timezone.utc)
-                    expires = dt.isoformat()
-
-                row = {
-                    "expires": expires,
-                    "address": tokens[2],
-                    "phys-address": tokens[1],
-                }
-
-                if tokens[3] != '*':
-                    row["hostname"] = tokens[3]
-                else:
-                    row["hostname"] = ""
-
-                if tokens[4] != '*':
-                    row["client-id"] = tokens[4]
-                else:
-                    row["client-id"] = ""
-
-                table.append(row)
-    except (IOError, OSError, ValueError):
-        pass
+    for expires, mac, addr, hostname, clientid in index.select(address=address):
+        table.append({
+            "expires": expires,
+            "address": addr,
+            "phys-address": mac,
+            "hostname": hostname,
+            "client-id": clientid,
+        })
 
     return table
 
 
 def statistics():
     """Fetch DHCP server metrics over D-Bus"""
+    import dbus     # Slow to import, only when needed
+
     try:
         bus = dbus.SystemBus()
         obj = bus.get_object("uk.org.thekelleys.dnsmasq",
@@ -81,16 +152,39 @@ def statistics():
     }
 
 
-def operational(leases_file="/var/lib/misc/dnsmasq.leases"):
+def requested_address(xpath):
+    """Address of the single lease requested by xpath, if any"""
+    for name, keys in parse(xpath) or []:
+        if name == "lease":
+            address = keys.get("address")
+            if address and not any(c in address for c in "*?["):
+                return address
+    return None
+
+
+def add_statistics(out, *_):
+    out["statistics"] = statistics()
+
+
+def add_leases(out, xpath, leases_file):
+    out["leases"] = {"lease": leases(leases_file, requested_address(xpath))}
+
+
+PRODUCERS = (
+    ("/infix-dhcp-server:dhcp-server/statistics", add_statistics),
+    ("/infix-dhcp-server:dhcp-server/leases/lease[address='*']", add_leases),
+)
+
+
+def operational(xpath=None, leases_file=LEASES_FILE):
     """Return operational status for DHCP server"""
-    return {
-        "infix-dhcp-server:dhcp-server": {
-            "statistics": statistics(),
-            "leases": {
-                "lease": leases(leases_file)
-            }
-        }
+    out = {
+        "infix-dhcp-server:dhcp-server": {}
     }
+    for path, producer in select(PRODUCERS, xpath):
+        producer(out[root(path)], xpath, leases_file)
+
+    return out
 
 
 if __name__ == "__main__":
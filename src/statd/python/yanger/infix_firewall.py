@@ -6,9 +6,9 @@ for the full API, see:
    gdbus introspect --system --dest org.fedoraproject.FirewallD1 \
                     --object-path /org/fedoraproject/FirewallD1
 """
-import dbus
-import ipaddress
 import re
+from functools import cache
+
 from . import common
 from .host import HOST
 
@@ -17,10 +17,18 @@ SHADOW_DIR = "/run/confd/address-sets"
 
 def normalize_entry(entry):
     """Match firewalld entry normalization: bare address for host entries"""
+    import ipaddress
+
+    entry = str(entry)
+    # Fast path for the bulk of large sets, IPv4 hosts and ranges, which
+    # ipaddress would either return unchanged or reject
+    if "-" in entry or entry.replace(".", "").isdigit():
+        return entry
+
     try:
-        net = ipaddress.ip_network(str(entry), strict=False)
+        net = ipaddress.ip_network(entry, strict=False)
     except ValueError:
-        return str(entry)
+        return entry
 
     if net.prefixlen == net.max_prefixlen:
         return str(net.network_address)
@@ -41,6 +49,8 @@ def split_sources(sources):
 
 
 def get_interface(interface="org.fedoraproject.FirewallD1"):
+    import dbus     # Slow to import, only when needed
+
     try:
         bus = dbus.SystemBus()
         obj = bus.get_object("org.fedoraproject.FirewallD1",
@@ -314,19 +324,20 @@ def get_policies(fw):
     return policies
 
 
-def nft_set_elems(name):
-    """Live contents of firewalld's nftables set
+@cache
+def nft_sets():
+    """Live contents of all sets in firewalld's nftables table, by name
 
     The kernel is the only source that sees entries in timeout sets,
     and the only one tracking per-entry expiry.  The firewalld table
-    is owner-protected, but reading is fine.
+    is owner-protected, but reading is fine.  Blocklists can hold
+    hundreds of thousands of entries, so the table is dumped once, not
+    once per set, and elements are kept as nft returns them.
     """
-    data = HOST.run_json(("nft", "-j", "list", "set", "inet", "firewalld", name),
+    data = HOST.run_json(("nft", "-j", "list", "table", "inet", "firewalld"),
                          default={})
-    for obj in data.get("nftables", []):
-        if "set" in obj:
-            return obj["set"].get("elem", [])
-    return []
+    return {obj["set"]["name"]: obj["set"].get("elem", [])
+            for obj in data.get("nftables", []) if "set" in obj}
 
 
 def nft_elem_parse(elem):
@@ -346,7 +357,18 @@ def nft_elem_parse(elem):
     return normalize_entry(entry), expires
 
 
-def get_address_set(fwi, name):
+def current_entries(elems, timeout, shadow):
+    """Generate the current list, one entry at a time, from nft elements"""
+    for elem in elems:
+        entry, expires = nft_elem_parse(elem)
+        cur = {"entry": entry, "dynamic": bool(timeout) or entry in shadow}
+        if expires is not None:
+            cur["expires"] = int(expires)
+        yield cur
+
+
+def get_ipset_settings(fwi, name):
+    """Configuration of an ipset, as (address-set, tracked entries)"""
     try:
         settings = fwi.getIPSetSettings(name)
         # (version, short, description, type, options, entries)
@@ -368,27 +390,10 @@ def get_address_set(fwi, name):
     if timeout:
         aset["timeout"] = timeout
 
-    lines = HOST.read_multiline(f"{SHADOW_DIR}/{name}", default=[])
-    shadow = {normalize_entry(line) for line in lines if line}
-
-    static = [e for e in tracked if e not in shadow]
-    if static:
-        aset["entry"] = static
-
-    current = []
-    for elem in nft_set_elems(name):
-        entry, expires = nft_elem_parse(elem)
-        cur = {"entry": entry, "dynamic": bool(timeout) or entry in shadow}
-        if expires is not None:
-            cur["expires"] = int(expires)
-        current.append(cur)
-    if current:
-        aset["current"] = current
-
-    return aset
+    return aset, tracked
 
 
-def get_address_sets():
+def get_ipsets():
     sets = []
     fwi = get_interface("org.fedoraproject.FirewallD1.ipset")
     if not fwi:
@@ -401,13 +406,33 @@ def get_address_sets():
         return sets
 
     for name in names:
-        data = get_address_set(fwi, name)
+        data = get_ipset_settings(fwi, name)
         if data:
             sets.append(data)
 
     return sets
 
 
+def get_address_set(config, tracked):
+    """Live state of a configured set, from the shadow file and nft"""
+    aset = dict(config)
+    name = aset["name"]
+    timeout = aset.get("timeout", 0)
+
+    lines = HOST.read_multiline(f"{SHADOW_DIR}/{name}", default=[])
+    shadow = {normalize_entry(line) for line in lines if line}
+
+    static = [e for e in tracked if e not in shadow]
+    if static:
+        aset["entry"] = static
+
+    elems = nft_sets().get(name)
+    if elems:
+        aset["current"] = common.Stream(current_entries(elems, timeout, shadow))
+
+    return aset
+
+
 def get_service_data(fw, name):
     try:
         settings = fw.getServiceSettings2(name)
@@ -457,7 +482,8 @@ def get_services(fw):
     return services
 
 
-def operational():
+def get_config():
+    """Snapshot of the firewalld configuration, {} if it is not running"""
     try:
         fw = get_interface()
         if not fw:
@@ -467,28 +493,104 @@ def operational():
         common.LOG.warning("Failed checking firewalld state: %s", e)
         return {}
 
-    data = {
-        "infix-firewall:firewall": {
-            "default": fw.getDefaultZone(),
-            "logging": fw.getLogDenied(),
-            "lockdown": bool(fw.queryPanicMode())
-        }
+    return {
+        "default": fw.getDefaultZone(),
+        "logging": fw.getLogDenied(),
+        "lockdown": bool(fw.queryPanicMode()),
+        "zone": get_zones(fw),
+        "policy": get_policies(fw),
+        "service": get_services(fw),
+        "ipset": get_ipsets(),
     }
 
-    zones = get_zones(fw)
-    if zones:
-        data["infix-firewall:firewall"]["zone"] = zones
 
-    policies = get_policies(fw)
-    if policies:
-        data["infix-firewall:firewall"]["policy"] = policies
+class Snapshot:
+    """The firewalld configuration, kept for as long as it is valid
+
+    firewalld is slow to answer, and a query takes one D-Bus call per
+    zone, policy, service and ipset.  A long-lived yanger (--serve)
+    therefore keeps the snapshot until firewalld signals a change, any
+    signal at all, e.g. Reloaded or DefaultZoneChanged, or restarts.
+    Signals are received by a GLib main loop in a thread of its own.
+
+    Without that watch, e.g. a yanger started for a single query, the
+    snapshot is dropped after each request like all memoized data, see
+    `server.flush()`.  Live state, sets and counters, is never kept.
+    """
+    BUS_NAME = "org.fedoraproject.FirewallD1"
+
+    def __init__(self):
+        self.config = None
+        self.generation = 0
+        self.watched = False
+
+    def invalidate(self, *_):
+        self.generation += 1
+        self.config = None
+
+    def cache_clear(self):
+        if not self.watched:
+            self.config = None
+
+    def _watch(self):
+        try:
+            # Slow to import, only when needed
+            import threading
+            import dbus
+            from dbus.mainloop.glib import DBusGMainLoop
+            from gi.repository import GLib
+        except ImportError as e:
+            common.LOG.debug("Not watching firewalld, no main loop: %s", e)
+            return False
+
+        try:
+            bus = dbus.SystemBus(private=True, mainloop=DBusGMainLoop())
+            bus.add_signal_receiver(self.invalidate, bus_name=self.BUS_NAME)
+            bus.add_signal_receiver(self.invalidate, "NameOwnerChanged",
+                                    "org.freedesktop.DBus", arg0=self.BUS_NAME)
+        except dbus.exceptions.DBusException as e:
+            common.LOG.debug("Not watching firewalld: %s", e)
+            return False
+
+        threading.Thread(target=GLib.MainLoop().run, name="firewalld",
+                         daemon=True).start()
+        return True
+
+    def get(self):
+        if common.PERSISTENT and not self.watched:
+            self.watched = self._watch()
+
+        config = self.config
+        if config is None:
+            generation = self.generation
+            config = get_config()
+            # Keep it unless a change was signaled while reading it
+            if generation == self.generation:
+                self.config = config
+
+        return config
+
+
+SNAPSHOT = Snapshot()
 
-    services = get_services(fw)
-    if services:
-        data["infix-firewall:firewall"]["service"] = services
 
-    address_sets = get_address_sets()
+def operational():
+    config = SNAPSHOT.get()
+    if not config:
+        return {}
+
+    firewall = {
+        "default": config["default"],
+        "logging": config["logging"],
+        "lockdown": config["lockdown"],
+    }
+    for key in ("zone", "policy", "service"):
+        if config[key]:
+            firewall[key] = config[key]
+
+    address_sets = [get_address_set(aset, tracked)
+                    for aset, tracked in config["ipset"]]
     if address_sets:
-        data["infix-firewall:firewall"]["address-set"] = address_sets
+        firewall["address-set"] = address_sets
 
-    return data
+    return {"infix-firewall:firewall": firewall}
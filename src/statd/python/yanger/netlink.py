@@ -0,0 +1,1098 @@
+"""Native rtnetlink client
+
+Link, address and neighbor state used to be read by running `ip -j`,
+once per table and namespace, and then parsing the resulting JSON.
+On systems with many interfaces, or large neighbor tables, that is
+the most expensive part of an interfaces query.
+
+This module dumps the same tables directly from the kernel, and
+returns objects shaped like the output of `ip -s -d -j link show`,
+`ip -j addr show`, `ip -j neigh show`, `ip -j route show` and `ip -j
+nexthop show`, so the models can use them as-is.  Container
+namespaces are entered with setns(2), only for as long as it takes to
+open the socket.
+
+Routes are yielded as they are read, a full table does not fit in
+memory as objects.
+
+Links are read-only mappings that decode their attributes on first
+access, most models only look at a handful of them.
+
+Only the running system can be queried like this, see `Host.NATIVE`.
+"""
+import os
+import socket
+import struct
+from collections.abc import Mapping
+
+
+NETLINK_GENERIC = 16
+SOL_NETLINK = 270
+NETLINK_GET_STRICT_CHK = 12
+CLONE_NEWNET = 0x40000000
+
+NLM_F_REQUEST = 0x001
+NLM_F_MULTI = 0x002
+NLM_F_DUMP = 0x300
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+RTM_NEWNEXTHOP = 104
+RTM_GETNEXTHOP = 106
+
+IFLA_ADDRESS = 1
+IFLA_BROADCAST = 2
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_LINK = 5
+IFLA_QDISC = 6
+IFLA_MASTER = 10
+IFLA_TXQLEN = 13
+IFLA_OPERSTATE = 16
+IFLA_LINKMODE = 17
+IFLA_LINKINFO = 18
+IFLA_IFALIAS = 20
+IFLA_STATS64 = 23
+IFLA_GROUP = 27
+IFLA_EXT_MASK = 29
+IFLA_PROMISCUITY = 30
+IFLA_NUM_TX_QUEUES = 31
+IFLA_NUM_RX_QUEUES = 32
+IFLA_LINK_NETNSID = 37
+IFLA_MIN_MTU = 50
+IFLA_MAX_MTU = 51
+IFLA_PERM_ADDRESS = 54
+IFLA_PARENT_DEV_NAME = 56
+IFLA_PARENT_DEV_BUS_NAME = 57
+IFLA_ALLMULTI = 61
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+IFLA_INFO_SLAVE_KIND = 4
+IFLA_INFO_SLAVE_DATA = 5
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+IFA_CACHEINFO = 6
+IFA_FLAGS = 8
+IFA_PROTO = 11
+
+NDA_DST = 1
+NDA_LLADDR = 2
+NDA_IFINDEX = 8
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_MULTIPATH = 9
+RTA_TABLE = 15
+RTA_VIA = 18
+RTA_PREF = 20
+RTA_NH_ID = 30
+
+NHA_ID = 1
+NHA_GROUP = 2
+NHA_BLACKHOLE = 4
+NHA_OIF = 5
+NHA_GATEWAY = 6
+
+RTN_UNICAST = 1
+RTM_F_CLONED = 0x200
+
+RT_TABLE_MAIN = 254
+
+RTEXT_FILTER_SKIP_STATS = 8
+
+IFF_UP = 0x1
+IFF_POINTOPOINT = 0x10
+IFF_RUNNING = 0x40
+
+IFA_F_SECONDARY = 0x01
+IFA_F_PERMANENT = 0x80
+
+NUD_NOARP = 0x40
+
+BUFSIZE = 1 << 16
+
+
+# Flag names, in the order ip(8) lists them
+IFF_NAMES = (
+    (0x8, "LOOPBACK"), (0x2, "BROADCAST"), (0x10, "POINTOPOINT"),
+    (0x1000, "MULTICAST"), (0x80, "NOARP"), (0x200, "ALLMULTI"),
+    (0x100, "PROMISC"), (0x400, "MASTER"), (0x800, "SLAVE"),
+    (0x4, "DEBUG"), (0x8000, "DYNAMIC"), (0x4000, "AUTOMEDIA"),
+    (0x2000, "PORTSEL"), (0x20, "NOTRAILERS"), (0x1, "UP"),
+    (0x10000, "LOWER_UP"), (0x20000, "DORMANT"), (0x40000, "ECHO"),
+)
+
+IFA_F_NAMES = (
+    (0x02, "nodad"), (0x04, "optimistic"), (0x08, "dadfailed"),
+    (0x10, "home"), (0x20, "deprecated"), (0x40, "tentative"),
+    (0x100, "mngtmpaddr"), (0x200, "noprefixroute"),
+    (0x400, "autojoin"), (0x800, "stable-privacy"),
+)
+
+NUD_NAMES = (
+    (0x01, "INCOMPLETE"), (0x02, "REACHABLE"), (0x04, "STALE"),
+    (0x08, "DELAY"), (0x10, "PROBE"), (0x20, "FAILED"),
+    (0x40, "NOARP"), (0x80, "PERMANENT"),
+)
+
+NTF_NAMES = (
+    (0x80, "router"), (0x08, "proxy"), (0x10, "extern_learn"),
+    (0x20, "offload"),
+)
+
+OPERSTATES = ("UNKNOWN", "NOTPRESENT", "DOWN", "LOWERLAYERDOWN",
+              "TESTING", "DORMANT", "UP")
+LINKMODES = ("DEFAULT", "DORMANT", "TESTING")
+
+ARPHRD = {
+    1: "ether", 24: "ieee1394", 32: "infiniband", 256: "slip",
+    280: "can", 512: "ppp", 519: "rawip", 768: "ipip",
+    769: "tunnel6", 772: "loopback", 776: "sit", 778: "gre",
+    801: "ieee802.11", 803: "ieee802.11/radiotap",
+    804: "ieee802.15.4", 823: "gre6", 824: "netlink",
+    825: "6lowpan", 65534: "none", 65535: "void",
+}
+
+SCOPES = {0: "global", 200: "site", 253: "link", 254: "host", 255: "nowhere"}
+
+RTN_NAMES = ("unspec", "unicast", "local", "broadcast", "anycast",
+             "multicast", "blackhole", "unreachable", "prohibit", "throw",
+             "nat", "xresolve")
+
+# Route and nexthop flags, in the order ip(8) lists them
+RTNH_F_NAMES = (
+    (0x01, "dead"), (0x04, "onlink"), (0x02, "pervasive"),
+    (0x08, "offload"), (0x40, "trap"), (0x100, "notify"),
+    (0x10, "linkdown"), (0x20, "unresolved"), (0x4000, "rt_offload"),
+    (0x8000, "rt_trap"), (0x20000000, "rt_offload_failed"),
+)
+
+RT_PREFS = {0: "medium", 1: "high", 3: "low"}
+
+RT_TABLES = {0: "unspec", 253: "default", 254: "main", 255: "local"}
+
+# Including the ones FRR installs in rt_protos.d/frr.conf
+RT_PROTOS = {
+    0: "unspec", 1: "redirect", 2: "kernel", 3: "boot", 4: "static",
+    8: "gated", 9: "ra", 10: "mrt", 11: "zebra", 12: "bird",
+    13: "dnrouted", 14: "xorp", 15: "ntk", 16: "dhcp",
+    17: "keepalived", 18: "babel", 99: "openr", 186: "bgp", 187: "isis",
+    188: "ospf", 189: "rip", 190: "ripng", 191: "nhrp", 192: "eigrp",
+    193: "ldp", 194: "sharp", 195: "pbr", 196: "static",
+    197: "openfabric", 198: "srte",
+}
+
+ETH_P = {0x8100: "802.1Q", 0x88a8: "802.1ad"}
+
+STATS64 = ("rx_packets", "tx_packets", "rx_bytes", "tx_bytes",
+           "rx_errors", "tx_errors", "rx_dropped", "tx_dropped",
+           "multicast", "collisions", "rx_length_errors",
+           "rx_over_errors", "rx_crc_errors", "rx_frame_errors",
+           "rx_fifo_errors", "rx_missed_errors", "tx_aborted_errors",
+           "tx_carrier_errors", "tx_fifo_errors", "tx_heartbeat_errors",
+           "tx_window_errors", "rx_compressed", "tx_compressed")
+
+
+def _rtnl_names(name, builtin):
+    """Read number -> name table from iproute2's configuration"""
+    names = dict(builtin)
+    paths = [f"/usr/share/iproute2/{name}", f"/etc/iproute2/{name}"]
+    for confdir in (f"/usr/share/iproute2/{name}.d", f"/etc/iproute2/{name}.d"):
+        try:
+            paths += sorted(os.path.join(confdir, conf) for conf in os.listdir(confdir)
+                            if conf.endswith(".conf"))
+        except OSError:
+            pass
+
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.split("#", 1)[0].split()
+                    if len(fields) >= 2:
+                        names[int(fields[0], 0)] = fields[1]
+        except (OSError, ValueError):
+            pass
+    return names
+
+
+_TABLES = {}
+
+def _rtnl_name(table, num, builtin):
+    if table not in _TABLES:
+        _TABLES[table] = _rtnl_names(table, builtin)
+    return _TABLES[table].get(num, str(num))
+
+
+def rttable(name):
+    """Get number of routing table name, e.g. "main", or "all" for 0"""
+    if name == "all":
+        return 0
+    if str(name).isdigit():
+        return int(name)
+
+    _rtnl_name("rt_tables", 0, RT_TABLES)
+    for num, tname in _TABLES["rt_tables"].items():
+        if tname == name:
+            return num
+    raise ValueError(f"Unknown routing table {name}")
+
+
+def _setns(fd):
+    if hasattr(os, "setns"):
+        os.setns(fd, CLONE_NEWNET)
+        return
+
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.setns(fd, CLONE_NEWNET) < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def _iterattrs(data, off, end):
+    """Yield (type, payload) of the attributes in data[off:end], in order"""
+    while off + 4 <= end:
+        alen, atype = struct.unpack_from("=HH", data, off)
+        if alen < 4:
+            break
+        yield atype & 0x3fff, data[off + 4:off + alen]
+        off += (alen + 3) & ~3
+
+
+def _attrs(data, off, end):
+    """Get type -> payload of the attributes in data[off:end]"""
+    tb = {}
+    while off + 4 <= end:
+        alen, atype = struct.unpack_from("=HH", data, off)
+        if alen < 4:
+            break
+        tb[atype & 0x3fff] = data[off + 4:off + alen]
+        off += (alen + 3) & ~3
+    return tb
+
+
+def _attr(atype, payload):
+    return struct.pack("=HH", 4 + len(payload), atype) + payload + \
+        bytes(-len(payload) % 4)
+
+
+def _u8(val):
+    return val[0]
+
+def _u16(val):
+    return struct.unpack("=H", val[:2])[0]
+
+def _u32(val):
+    return struct.unpack("=I", val[:4])[0]
+
+def _s32(val):
+    return struct.unpack("=i", val[:4])[0]
+
+def _u64(val):
+    return struct.unpack("=Q", val[:8])[0]
+
+def _be16(val):
+    return struct.unpack("!H", val[:2])[0]
+
+def _bool(val):
+    return bool(val[0])
+
+def _str(val):
+    return val.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+def _hex(num):
+    # Like printf("%#x"), which does not prefix zero
+    return hex(num) if num else "0"
+
+def _mac(val):
+    return ":".join(f"{b:02x}" for b in val)
+
+def _inet(val):
+    if len(val) == 4:
+        return socket.inet_ntop(socket.AF_INET, val)
+    if len(val) == 16:
+        return socket.inet_ntop(socket.AF_INET6, val)
+    return _mac(val)
+
+def _inet_any(val):
+    return _inet(val) if any(val) else "any"
+
+def _lladdr(val, hatype):
+    # Tunnels use their outer IP address as link address
+    if (len(val) == 4 and hatype in (768, 776, 778)) or \
+       (len(val) == 16 and hatype in (769, 823)):
+        return _inet(val)
+    return _mac(val)
+
+def _enum(*names):
+    return lambda val: names[val[0]] if val[0] < len(names) else str(val[0])
+
+def _brid(val):
+    # Like ip(8), with ether_ntoa(3), which does not zero pad
+    return f"{val[0]:02x}{val[1]:02x}." + ":".join(f"{b:x}" for b in val[2:8])
+
+def _ethp(val):
+    proto = _be16(val)
+    return ETH_P.get(proto, _hex(proto))
+
+def _bits(num, names):
+    return [name for bit, name in names if num & bit]
+
+
+LACP_STATE_NAMES = (
+    (0x01, "active"), (0x02, "short_timeout"), (0x04, "aggregating"),
+    (0x08, "in_sync"), (0x10, "collecting"), (0x20, "distributing"),
+    (0x40, "defaulted"), (0x80, "expired"),
+)
+
+def _lacp_state(key, fn):
+    def decode(val, out):
+        out[key] = fn(val)
+        out[key + "_str"] = _bits(out[key], LACP_STATE_NAMES)
+    return decode
+
+def _bond_ad_info(val, out):
+    tb = _attrs(val, 0, len(val))
+    info = {}
+    for atype, (key, fn) in {
+            1: ("aggregator", _u16), 2: ("num_ports", _u16),
+            3: ("actor_key", _u16), 4: ("partner_key", _u16),
+            5: ("partner_mac", _mac)}.items():
+        if atype in tb:
+            info[key] = fn(tb[atype])
+    out["ad_info"] = info
+
+def _br_boolopt(val, out):
+    optval = _u32(val)
+    out["no_linklocal_learn"] = optval & 1
+    out["mcast_vlan_snooping"] = optval >> 1 & 1
+
+
+# Per link kind: attribute type -> (key, decoder), or a function
+# adding keys to the output dict, for attributes that need more than
+# a single key.  Keys and value formats are the same as in ip(8).
+INFO_DATA = {
+    "bridge": {
+        1: ("forward_delay", _u32), 2: ("hello_time", _u32),
+        3: ("max_age", _u32), 4: ("ageing_time", _u32),
+        5: ("stp_state", _u32), 6: ("priority", _u16),
+        7: ("vlan_filtering", _u8), 8: ("vlan_protocol", _ethp),
+        9: ("group_fwd_mask", lambda v: _hex(_u16(v))),
+        10: ("root_id", _brid), 11: ("bridge_id", _brid),
+        12: ("root_port", _u16), 13: ("root_path_cost", _u32),
+        14: ("topology_change", _u8),
+        15: ("topology_change_detected", _u8),
+        20: ("group_addr", _mac), 22: ("mcast_router", _u8),
+        23: ("mcast_snooping", _u8),
+        24: ("mcast_query_use_ifaddr", _u8),
+        25: ("mcast_querier", _u8),
+        26: ("mcast_hash_elasticity", _u32),
+        27: ("mcast_hash_max", _u32),
+        28: ("mcast_last_member_cnt", _u32),
+        29: ("mcast_startup_query_cnt", _u32),
+        30: ("mcast_last_member_intvl", _u64),
+        31: ("mcast_membership_intvl", _u64),
+        32: ("mcast_querier_intvl", _u64),
+        33: ("mcast_query_intvl", _u64),
+        34: ("mcast_query_response_intvl", _u64),
+        35: ("mcast_startup_query_intvl", _u64),
+        36: ("nf_call_iptables", _u8), 37: ("nf_call_ip6tables", _u8),
+        38: ("nf_call_arptables", _u8), 39: ("vlan_default_pvid", _u16),
+        41: ("vlan_stats_enabled", _u8), 42: ("mcast_stats_enabled", _u8),
+        43: ("mcast_igmp_version", _u8), 44: ("mcast_mld_version", _u8),
+        45: ("vlan_stats_per_port", _u8), 46: _br_boolopt,
+    },
+    "bond": {
+        1: ("mode", _enum("balance-rr", "active-backup", "balance-xor",
+                          "broadcast", "802.3ad", "balance-tlb",
+                          "balance-alb")),
+        3: ("miimon", _u32), 4: ("updelay", _u32),
+        5: ("downdelay", _u32), 6: ("use_carrier", _u8),
+        14: ("xmit_hash_policy", _enum("layer2", "layer3+4", "layer2+3",
+                                       "encap2+3", "encap3+4",
+                                       "vlan+srcmac")),
+        18: ("min_links", _u32),
+        21: ("ad_lacp_rate", _enum("slow", "fast")),
+        23: _bond_ad_info, 24: ("ad_actor_sys_prio", _u16),
+        29: ("ad_lacp_active", _enum("off", "on")),
+    },
+    "vlan": {
+        5: ("protocol", _ethp), 1: ("id", _u16),
+        2: ("flags", lambda v: _bits(_u32(v), (
+            (0x1, "REORDER_HDR"), (0x2, "GVRP"), (0x4, "LOOSE_BINDING"),
+            (0x8, "MVRP"), (0x10, "BRIDGE_BINDING")))),
+    },
+    "vxlan": {
+        1: ("id", _u32),
+        2: lambda v, out: out.__setitem__(
+            "group" if 224 <= v[0] <= 239 else "remote", _inet(v)),
+        16: lambda v, out: out.__setitem__(
+            "group6" if v[0] == 0xff else "remote6", _inet(v)),
+        4: ("local", _inet), 17: ("local6", _inet),
+        15: ("port", _be16), 5: ("ttl", _u8), 7: ("learning", _bool),
+    },
+    "gre": {
+        7: ("remote", _inet_any), 6: ("local", _inet_any),
+        8: ("ttl", _u8), 10: ("pmtudisc", _bool),
+    },
+    "ip6gre": {
+        7: ("remote", _inet_any), 6: ("local", _inet_any),
+        8: ("ttl", _u8), 11: ("encap_limit", _u8),
+    },
+}
+INFO_DATA["vrf"] = {1: ("table", _u32)}
+INFO_DATA["gretap"] = INFO_DATA["gre"]
+INFO_DATA["ip6gretap"] = INFO_DATA["ip6gre"]
+
+INFO_SLAVE_DATA = {
+    "bridge": {
+        1: ("state", _enum("disabled", "listening", "learning",
+                           "forwarding", "blocking")),
+        2: ("priority", _u16), 3: ("cost", _u32), 4: ("hairpin", _bool),
+        5: ("guard", _bool), 6: ("root_block", _bool),
+        7: ("fastleave", _bool), 8: ("learning", _bool),
+        9: ("flood", _bool), 10: ("proxy_arp", _bool),
+        12: ("proxy_arp_wifi", _bool),
+        13: ("root_id", _brid), 14: ("bridge_id", _brid),
+        15: ("designated_port", _u16), 16: ("designated_cost", _u16),
+        17: ("id", lambda v: _hex(_u16(v))),
+        18: ("no", lambda v: _hex(_u16(v))),
+        19: ("topology_change_ack", _u8), 20: ("config_pending", _u8),
+        25: ("multicast_router", _u8), 27: ("mcast_flood", _bool),
+        28: ("mcast_to_unicast", _bool), 29: ("vlan_tunnel", _bool),
+        30: ("bcast_flood", _bool), 32: ("neigh_suppress", _bool),
+        33: ("isolated", _bool), 39: ("locked", _bool),
+    },
+    "bond": {
+        1: ("state", _enum("ACTIVE", "BACKUP")),
+        2: ("mii_status", _enum("UP", "GOING_DOWN", "DOWN", "GOING_BACK")),
+        3: ("link_failure_count", _u32), 4: ("perm_hwaddr", _mac),
+        5: ("queue_id", _u16), 6: ("ad_aggregator_id", _u16),
+        7: _lacp_state("ad_actor_oper_port_state", _u8),
+        8: _lacp_state("ad_partner_oper_port_state", _u16),
+    },
+}
+
+
+def _info_data(spec, val):
+    tb = _attrs(val, 0, len(val))
+    out = {}
+    for atype, dec in spec.items():
+        if atype not in tb:
+            continue
+        if callable(dec):
+            dec(tb[atype], out)
+        else:
+            key, fn = dec
+            out[key] = fn(tb[atype])
+    return out
+
+
+def _linkinfo(val):
+    tb = _attrs(val, 0, len(val))
+    info = {}
+
+    if IFLA_INFO_KIND in tb:
+        kind = info["info_kind"] = _str(tb[IFLA_INFO_KIND])
+        if IFLA_INFO_DATA in tb and kind in INFO_DATA:
+            info["info_data"] = _info_data(INFO_DATA[kind], tb[IFLA_INFO_DATA])
+
+    if IFLA_INFO_SLAVE_KIND in tb:
+        kind = info["info_slave_kind"] = _str(tb[IFLA_INFO_SLAVE_KIND])
+        if IFLA_INFO_SLAVE_DATA in tb and kind in INFO_SLAVE_DATA:
+            info["info_slave_data"] = _info_data(INFO_SLAVE_DATA[kind],
+                                                 tb[IFLA_INFO_SLAVE_DATA])
+
+    return info
+
+
+def _stats64(val):
+    s = dict(zip(STATS64, struct.unpack_from(f"={len(val) // 8}Q", val)))
+    rx = {
+        "bytes": s["rx_bytes"], "packets": s["rx_packets"],
+        "errors": s["rx_errors"], "dropped": s["rx_dropped"],
+        "over_errors": s["rx_over_errors"], "multicast": s["multicast"],
+    }
+    tx = {
+        "bytes": s["tx_bytes"], "packets": s["tx_packets"],
+        "errors": s["tx_errors"], "dropped": s["tx_dropped"],
+        "carrier_errors": s["tx_carrier_errors"],
+        "collisions": s["collisions"],
+    }
+    if s.get("rx_compressed"):
+        rx["compressed"] = s["rx_compressed"]
+    if s.get("tx_compressed"):
+        tx["compressed"] = s["tx_compressed"]
+    return {"rx": rx, "tx": tx}
+
+
+class Link(Mapping):
+    """A link, as in `ip -s -d -j link show`, decoded on demand"""
+
+    _ABSENT = object()
+
+    def __init__(self, data, off, end, peers):
+        _, self.type, self.index, self.flags, _ = \
+            struct.unpack_from("=BxHiII", data, off)
+        self._data, self._off, self._end = data, off + 16, end
+        self._peers = peers
+        self._tb = None
+        self._decoded = {}
+
+    @property
+    def tb(self):
+        if self._tb is None:
+            self._tb = _attrs(self._data, self._off, self._end)
+            self._data = None
+        return self._tb
+
+    def _peer(self, index):
+        """Get (ifname, flags) of another link in the same namespace"""
+        return self._peers.get(index, (f"if{index}", 0))
+
+    def _attr(self, atype, fn):
+        return fn(self.tb[atype]) if atype in self.tb else self._ABSENT
+
+    def _ifindex(self):
+        return self.index
+
+    def _link(self):
+        if IFLA_LINK not in self.tb:
+            return self._ABSENT
+        iflink = _s32(self.tb[IFLA_LINK])
+        if not iflink:
+            return None
+        if IFLA_LINK_NETNSID in self.tb:
+            return self._ABSENT
+        return self._peer(iflink)[0]
+
+    def _link_index(self):
+        if IFLA_LINK not in self.tb or IFLA_LINK_NETNSID not in self.tb:
+            return self._ABSENT
+        return _s32(self.tb[IFLA_LINK]) or self._ABSENT
+
+    def _flags(self):
+        flags = self.flags
+        names = []
+        if flags & IFF_UP and not flags & IFF_RUNNING:
+            names.append("NO-CARRIER")
+        for bit, name in IFF_NAMES:
+            if flags & bit:
+                names.append(name)
+
+        # The lower link, e.g. a veth peer, is down
+        iflink = _s32(self.tb[IFLA_LINK]) if IFLA_LINK in self.tb else 0
+        if iflink and IFLA_LINK_NETNSID not in self.tb and \
+           not self._peer(iflink)[1] & IFF_UP:
+            names.append("M-DOWN")
+        return names
+
+    def _master(self):
+        return self._attr(IFLA_MASTER, lambda v: self._peer(_u32(v))[0])
+
+    def _group(self):
+        return self._attr(IFLA_GROUP, lambda v: _rtnl_name("group", _u32(v),
+                                                           {0: "default"}))
+
+    def _link_type(self):
+        return ARPHRD.get(self.type, f"[{self.type}]")
+
+    def _address(self):
+        return self._attr(IFLA_ADDRESS, lambda v: _lladdr(v, self.type))
+
+    def _permaddr(self):
+        perm = self.tb.get(IFLA_PERM_ADDRESS)
+        if not perm or perm == self.tb.get(IFLA_ADDRESS):
+            return self._ABSENT
+        return _lladdr(perm, self.type)
+
+    def _link_pointtopoint(self):
+        return True if self.flags & IFF_POINTOPOINT else self._ABSENT
+
+    def _broadcast(self):
+        return self._attr(IFLA_BROADCAST, lambda v: _lladdr(v, self.type))
+
+    KEYS = {
+        "ifindex":         _ifindex,
+        "link":            _link,
+        "link_index":      _link_index,
+        "ifname":          lambda self: self._attr(IFLA_IFNAME, _str),
+        "flags":           _flags,
+        "mtu":             lambda self: self._attr(IFLA_MTU, _u32),
+        "qdisc":           lambda self: self._attr(IFLA_QDISC, _str),
+        "master":          _master,
+        "operstate":       lambda self: self._attr(IFLA_OPERSTATE, _enum(*OPERSTATES)),
+        "linkmode":        lambda self: self._attr(IFLA_LINKMODE, _enum(*LINKMODES)),
+        "group":           _group,
+        "txqlen":          lambda self: self._attr(IFLA_TXQLEN, _u32),
+        "link_type":       _link_type,
+        "address":         _address,
+        "permaddr":        _permaddr,
+        "link_pointtopoint": _link_pointtopoint,
+        "broadcast":       _broadcast,
+        "link_netnsid":    lambda self: self._attr(IFLA_LINK_NETNSID, _s32),
+        "promiscuity":     lambda self: self._attr(IFLA_PROMISCUITY, _u32),
+        "allmulti":        lambda self: self._attr(IFLA_ALLMULTI, _u32),
+        "min_mtu":         lambda self: self._attr(IFLA_MIN_MTU, _u32),
+        "max_mtu":         lambda self: self._attr(IFLA_MAX_MTU, _u32),
+        "linkinfo":        lambda self: self._attr(IFLA_LINKINFO, _linkinfo),
+        "num_tx_queues":   lambda self: self._attr(IFLA_NUM_TX_QUEUES, _u32),
+        "num_rx_queues":   lambda self: self._attr(IFLA_NUM_RX_QUEUES, _u32),
+        "parentbus":       lambda self: self._attr(IFLA_PARENT_DEV_BUS_NAME, _str),
+        "parentdev":       lambda self: self._attr(IFLA_PARENT_DEV_NAME, _str),
+        "ifalias":         lambda self: self._attr(IFLA_IFALIAS, _str),
+        "stats64":         lambda self: self._attr(IFLA_STATS64, _stats64),
+    }
+
+    def __getitem__(self, key):
+        if key in self._decoded:
+            return self._decoded[key]
+
+        fn = self.KEYS.get(key)
+        val = fn(self) if fn else self._ABSENT
+        if val is self._ABSENT:
+            raise KeyError(key)
+
+        self._decoded[key] = val
+        return val
+
+    def __iter__(self):
+        return (key for key in self.KEYS if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Netlink:
+    """Netlink socket, rtnetlink unless another protocol is given,
+    optionally in another network namespace"""
+
+    def __init__(self, netns=None, protocol=socket.NETLINK_ROUTE):
+        self.protocol = protocol
+        if netns:
+            with open(f"/run/netns/{netns}", "rb") as ns, \
+                 open("/proc/thread-self/ns/net", "rb") as cur:
+                _setns(ns.fileno())
+                try:
+                    self.sock = self._open()
+                finally:
+                    _setns(cur.fileno())
+        else:
+            self.sock = self._open()
+        self.seq = 0
+
+    def _open(self):
+        sock = socket.socket(socket.AF_NETLINK,
+                             socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+                             self.protocol)
+        try:
+            # Have the kernel filter dumps on e.g. ifindex (>= 4.20),
+            # we filter them again anyway for older kernels.
+            sock.setsockopt(SOL_NETLINK, NETLINK_GET_STRICT_CHK, 1)
+        except OSError:
+            pass
+        return sock
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def request(self, msgtype, body, dump=True):
+        """Send request, yield (data, start, end) of each reply message"""
+        self.seq += 1
+        flags = NLM_F_REQUEST | (NLM_F_DUMP if dump else 0)
+        self.sock.send(struct.pack("=IHHII", 16 + len(body), msgtype,
+                                   flags, self.seq, 0) + body)
+
+        while True:
+            data = self.sock.recv(BUFSIZE)
+            off = 0
+            while off + 16 <= len(data):
+                mlen, mtype, mflags, seq, _ = struct.unpack_from("=IHHII", data, off)
+                if mlen < 16 or off + mlen > len(data):
+                    raise OSError(f"Truncated netlink message ({mlen} bytes)")
+
+                if seq == self.seq:
+                    if mtype in (NLMSG_DONE, NLMSG_ERROR):
+                        err = struct.unpack_from("=i", data, off + 16)[0] \
+                            if mlen >= 20 else 0
+                        if err < 0:
+                            raise OSError(-err, os.strerror(-err))
+                        return
+
+                    yield mtype, data, off + 16, off + mlen
+                    if not mflags & NLM_F_MULTI:
+                        return
+
+                off += (mlen + 3) & ~3
+
+    def links(self, ifname=None):
+        """Get Link of ifname, or of all links when ifname is None"""
+        peers = {}
+        if ifname:
+            body = struct.pack("=BxHiII", socket.AF_UNSPEC, 0, 0, 0, 0) + \
+                _attr(IFLA_IFNAME, ifname.encode() + b"\0")
+            links = self._links(body, peers, dump=False)
+
+            # Resolve names of the master and lower link, if any
+            for link in list(links):
+                for atype in (IFLA_MASTER, IFLA_LINK):
+                    index = _s32(link.tb[atype]) if atype in link.tb else 0
+                    if index and index not in peers and \
+                       (atype == IFLA_MASTER or IFLA_LINK_NETNSID not in link.tb):
+                        body = struct.pack("=BxHiII", socket.AF_UNSPEC, 0,
+                                           index, 0, 0) + \
+                            _attr(IFLA_EXT_MASK,
+                                  struct.pack("=I", RTEXT_FILTER_SKIP_STATS))
+                        try:
+                            self._links(body, peers, dump=False)
+                        except OSError:
+                            pass
+        else:
+            body = struct.pack("=BxHiII", socket.AF_UNSPEC, 0, 0, 0, 0)
+            links = self._links(body, peers, dump=True)
+
+        return links
+
+    def _links(self, body, peers, dump):
+        links = []
+        for mtype, data, start, end in self.request(RTM_GETLINK, body, dump):
+            if mtype != RTM_NEWLINK:
+                continue
+            link = Link(data, start, end, peers)
+            peers[link.index] = (link.get("ifname"), link.flags)
+            links.append(link)
+        return links
+
+    def addrs(self, index=0):
+        """Get ifindex -> list of addr_info, as in `ip -j addr show`"""
+        body = struct.pack("=BBBBi", socket.AF_UNSPEC, 0, 0, 0, index)
+
+        addrs = {}
+        for mtype, data, start, end in self.request(RTM_GETADDR, body):
+            if mtype != RTM_NEWADDR:
+                continue
+
+            family, prefixlen, flags, scope, ifindex = \
+                struct.unpack_from("=BBBBi", data, start)
+            if index and ifindex != index:
+                continue
+            if family not in (socket.AF_INET, socket.AF_INET6):
+                continue
+
+            tb = _attrs(data, start + 8, end)
+            local = tb.get(IFA_LOCAL, tb.get(IFA_ADDRESS))
+            address = tb.get(IFA_ADDRESS, local)
+            if IFA_FLAGS in tb:
+                flags = _u32(tb[IFA_FLAGS])
+
+            inet = {
+                "family": "inet" if family == socket.AF_INET else "inet6",
+            }
+            if local:
+                inet["local"] = _inet(local)
+            if address and address != local:
+                inet["address"] = _inet(address)
+            inet["prefixlen"] = prefixlen
+            if IFA_BROADCAST in tb:
+                inet["broadcast"] = _inet(tb[IFA_BROADCAST])
+            inet["scope"] = SCOPES.get(scope, str(scope))
+            if IFA_PROTO in tb:
+                inet["protocol"] = _rtnl_name("rt_addrprotos", tb[IFA_PROTO][0], {
+                    0: "unspec", 1: "kernel_lo", 2: "kernel_ra", 3: "kernel_ll"
+                })
+            if flags & IFA_F_SECONDARY:
+                inet["temporary" if family == socket.AF_INET6 else "secondary"] = True
+            if not flags & IFA_F_PERMANENT:
+                inet["dynamic"] = True
+            for bit, name in IFA_F_NAMES:
+                if flags & bit:
+                    inet[name] = True
+            if IFA_LABEL in tb:
+                inet["label"] = _str(tb[IFA_LABEL])
+            if IFA_CACHEINFO in tb:
+                preferred, valid, _, _ = struct.unpack_from("=IIII", tb[IFA_CACHEINFO])
+                inet["valid_life_time"] = valid
+                inet["preferred_life_time"] = preferred
+
+            addrs.setdefault(ifindex, []).append(inet)
+
+        return addrs
+
+    def neighs(self, index=0, names=None):
+        """Get neighbors, as in `ip -j neigh show`"""
+        body = struct.pack("=BxxxiHBB", socket.AF_UNSPEC, 0, 0, 0, 0)
+        if index:
+            body += _attr(NDA_IFINDEX, struct.pack("=I", index))
+
+        if names is None:
+            names = {link.index: link.get("ifname") for link in self.links()}
+
+        neighs = []
+        for mtype, data, start, end in self.request(RTM_GETNEIGH, body):
+            if mtype != RTM_NEWNEIGH:
+                continue
+
+            family, ifindex, state, flags, _ = \
+                struct.unpack_from("=BxxxiHBB", data, start)
+            if index and ifindex != index:
+                continue
+            if family not in (socket.AF_INET, socket.AF_INET6):
+                continue
+            # Same default filter as ip(8)
+            if not state or state & NUD_NOARP:
+                continue
+
+            tb = _attrs(data, start + 12, end)
+            neigh = {}
+            if NDA_DST in tb:
+                neigh["dst"] = _inet(tb[NDA_DST])
+            neigh["dev"] = names.get(ifindex, f"if{ifindex}")
+            if NDA_LLADDR in tb:
+                neigh["lladdr"] = _mac(tb[NDA_LLADDR])
+            for bit, name in NTF_NAMES:
+                if flags & bit:
+                    neigh[name] = None
+            neigh["state"] = _bits(state, NUD_NAMES)
+            neighs.append(neigh)
+
+        return neighs
+
+    def routes(self, family=socket.AF_UNSPEC, table=RT_TABLE_MAIN, names=None):
+        """Yield routes in table, all if 0, as in `ip -j route show`"""
+        body = struct.pack("=BBBBBBBBI", family, 0, 0, 0, 0, 0, 0, 0, 0)
+        if table:
+            body += _attr(RTA_TABLE, struct.pack("=I", table))
+
+        if names is None:
+            names = {link.index: link.get("ifname") for link in self.links()}
+
+        try:
+            yield from self._routes(body, family, table, names)
+        except FileNotFoundError:
+            # No such table (yet), with strict checking
+            return
+
+    def _routes(self, body, family, table, names):
+        for mtype, data, start, end in self.request(RTM_GETROUTE, body):
+            if mtype != RTM_NEWROUTE:
+                continue
+
+            rtfamily, dst_len, _, _, rttable, proto, scope, rtype, flags = \
+                struct.unpack_from("=BBBBBBBBI", data, start)
+            if rtfamily not in (socket.AF_INET, socket.AF_INET6):
+                continue
+            if family and rtfamily != family:
+                continue
+            if flags & RTM_F_CLONED:
+                continue
+
+            tb = _attrs(data, start + 12, end)
+            if RTA_TABLE in tb:
+                rttable = _u32(tb[RTA_TABLE])
+            if table and rttable != table:
+                continue
+
+            yield _route(tb, rtfamily, dst_len, rttable, proto, scope,
+                         rtype, flags, names, not table)
+
+    def nexthops(self, names=None):
+        """Get nexthop objects, as in `ip -j nexthop show`"""
+        body = struct.pack("=BBBBI", socket.AF_UNSPEC, 0, 0, 0, 0)
+
+        if names is None:
+            names = {link.index: link.get("ifname") for link in self.links()}
+
+        nexthops = []
+        for mtype, data, start, end in self.request(RTM_GETNEXTHOP, body):
+            if mtype != RTM_NEWNEXTHOP:
+                continue
+
+            _, scope, proto, _, flags = struct.unpack_from("=BBBBI", data, start)
+            tb = _attrs(data, start + 8, end)
+
+            nh = {}
+            if NHA_ID in tb:
+                nh["id"] = _u32(tb[NHA_ID])
+            if NHA_GROUP in tb:
+                grp = tb[NHA_GROUP]
+                nh["group"] = []
+                for off in range(0, len(grp) - 7, 8):
+                    nhid, weight = struct.unpack_from("=IBxxx", grp, off)
+                    member = {"id": nhid}
+                    if weight:
+                        member["weight"] = weight + 1
+                    nh["group"].append(member)
+            if NHA_GATEWAY in tb:
+                nh["gateway"] = _inet(tb[NHA_GATEWAY])
+            if NHA_OIF in tb:
+                index = _u32(tb[NHA_OIF])
+                nh["dev"] = names.get(index, f"if{index}")
+            if NHA_BLACKHOLE in tb:
+                nh["blackhole"] = None
+            if scope:
+                nh["scope"] = SCOPES.get(scope, str(scope))
+            if proto:
+                nh["protocol"] = _rtnl_name("rt_protos", proto, RT_PROTOS)
+            nh["flags"] = _bits(flags, RTNH_F_NAMES)
+            nexthops.append(nh)
+
+        return nexthops
+
+
+def _via(val):
+    family = _u16(val)
+    return {
+        "family": "inet" if family == socket.AF_INET else "inet6",
+        "host": _inet(val[2:]),
+    }
+
+
+def _nexthop(out, tb, names):
+    """Add gateway and dev of route, or of one of its nexthops, to out"""
+    if RTA_GATEWAY in tb:
+        out["gateway"] = _inet(tb[RTA_GATEWAY])
+    if RTA_VIA in tb:
+        out["via"] = _via(tb[RTA_VIA])
+    if RTA_OIF in tb:
+        index = _u32(tb[RTA_OIF])
+        out["dev"] = names.get(index, f"if{index}")
+
+
+def _route(tb, family, dst_len, table, proto, scope, rtype, flags, names, all_tables):
+    route = {}
+    if rtype != RTN_UNICAST:
+        route["type"] = RTN_NAMES[rtype] if rtype < len(RTN_NAMES) else str(rtype)
+
+    if RTA_DST in tb:
+        dst = _inet(tb[RTA_DST])
+        host = 32 if family == socket.AF_INET else 128
+        route["dst"] = dst if dst_len == host else f"{dst}/{dst_len}"
+    else:
+        route["dst"] = "default" if not dst_len else \
+            f"{'0.0.0.0' if family == socket.AF_INET else '::'}/{dst_len}"
+
+    if RTA_NH_ID in tb:
+        route["nhid"] = _u32(tb[RTA_NH_ID])
+    _nexthop(route, tb, names)
+
+    if all_tables and table != RT_TABLE_MAIN:
+        route["table"] = _rtnl_name("rt_tables", table, RT_TABLES)
+    if proto != 3:
+        route["protocol"] = _rtnl_name("rt_protos", proto, RT_PROTOS)
+    if scope:
+        route["scope"] = SCOPES.get(scope, str(scope))
+    if RTA_PREFSRC in tb:
+        route["prefsrc"] = _inet(tb[RTA_PREFSRC])
+    if RTA_PRIORITY in tb:
+        route["metric"] = _u32(tb[RTA_PRIORITY])
+    route["flags"] = _bits(flags, RTNH_F_NAMES)
+    if RTA_PREF in tb:
+        route["pref"] = RT_PREFS.get(tb[RTA_PREF][0], str(tb[RTA_PREF][0]))
+
+    if RTA_MULTIPATH in tb:
+        mp, off, nexthops = tb[RTA_MULTIPATH], 0, []
+        while off + 8 <= len(mp):
+            nhlen, nhflags, hops, index = struct.unpack_from("=HBBi", mp, off)
+            if nhlen < 8:
+                break
+
+            nh = {}
+            _nexthop(nh, _attrs(mp, off + 8, off + nhlen), names)
+            nh["dev"] = names.get(index, f"if{index}")
+            nh["weight"] = hops + 1
+            nh["flags"] = _bits(nhflags, RTNH_F_NAMES)
+            nexthops.append(nh)
+            off += (nhlen + 3) & ~3
+        route["nexthops"] = nexthops
+
+    return route
+
+
+# Link keys included in each entry of `ip -j addr show`
+ADDR_LINK_KEYS = ("ifindex", "link", "link_index", "ifname", "flags",
+                  "mtu", "qdisc", "master", "operstate", "group",
+                  "txqlen", "link_type", "address", "permaddr",
+                  "link_pointtopoint", "broadcast", "link_netnsid")
+
+
+def iplinks(ifname=None, netns=None):
+    """Same as `ip -s -d -j link show [dev ifname]`"""
+    with Netlink(netns) as nl:
+        return nl.links(ifname)
+
+
+def ipaddrs(ifname=None, netns=None):
+    """Same as `ip -j addr show [dev ifname]`"""
+    with Netlink(netns) as nl:
+        links = nl.links(ifname)
+        addrs = nl.addrs(links[0].index if ifname and links else 0)
+
+    result = []
+    for link in links:
+        entry = {key: link[key] for key in ADDR_LINK_KEYS if key in link}
+        entry["addr_info"] = addrs.get(link.index, [])
+        result.append(entry)
+    return result
+
+
+def iproutes(family=socket.AF_UNSPEC, table=RT_TABLE_MAIN, netns=None):
+    """Same as `ip -j [-4|-6] route show table TABLE`, as a generator
+
+    The socket is opened, and links read, before returning, so that
+    any failure to do so can be handled by falling back to ip(8).
+    """
+    nl = Netlink(netns)
+    try:
+        names = {link.index: link.get("ifname") for link in nl.links()}
+    except OSError:
+        nl.close()
+        raise
+
+    def routes():
+        with nl:
+            yield from nl.routes(family, table, names)
+
+    return routes()
+
+
+def ipnexthops(netns=None):
+    """Same as `ip -j nexthop show`"""
+    with Netlink(netns) as nl:
+        return nl.nexthops()
+
+
+def ipneighs(ifname=None, netns=None):
+    """Same as `ip -j neigh show [dev ifname]`"""
+    with Netlink(netns) as nl:
+        if ifname:
+            links = nl.links(ifname)
+            index = links[0].index if links else 0
+            return nl.neighs(index, {index: ifname}) if index else []
+        return nl.neighs()
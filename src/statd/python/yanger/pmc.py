@@ -0,0 +1,332 @@
+"""Native PTP management client
+
+The state of each ptp4l instance used to be read by running `pmc -u -b
+0 -f CONF "GET DATASET"`, one process per dataset and instance, and
+scraping its text output.  A boundary clock with a few instances cost
+dozens of pmc runs per query.
+
+This module talks the PTP management protocol, IEEE 1588 clause 15,
+directly to the UDS socket of ptp4l, /var/run/ptp4l-<idx>.  All GETs
+of an instance are sent at once, and the responses, one per port for
+port datasets, are collected in the same session.  TLVs are decoded to
+typed values, which `text()` formats like pmc(8) does, so models can
+use either source.
+
+Only the running system can be queried like this, see `Host.NATIVE`.
+"""
+import os
+import socket
+import struct
+import time
+
+
+MANAGEMENT = 0xd
+PTP_VERSION = 2
+CONTROL_MANAGEMENT = 4
+LOG_INTERVAL_NONE = 0x7f
+
+GET = 0
+RESPONSE = 2
+
+TLV_MANAGEMENT = 0x0001
+TLV_MANAGEMENT_ERROR_STATUS = 0x0002
+
+DEFAULT_DATA_SET = 0x2000
+CURRENT_DATA_SET = 0x2001
+PARENT_DATA_SET = 0x2002
+TIME_PROPERTIES_DATA_SET = 0x2003
+PORT_DATA_SET = 0x2004
+PORT_STATS_NP = 0xc005
+
+NAMES = {
+    DEFAULT_DATA_SET:         "DEFAULT_DATA_SET",
+    CURRENT_DATA_SET:         "CURRENT_DATA_SET",
+    PARENT_DATA_SET:          "PARENT_DATA_SET",
+    TIME_PROPERTIES_DATA_SET: "TIME_PROPERTIES_DATA_SET",
+    PORT_DATA_SET:            "PORT_DATA_SET",
+    PORT_STATS_NP:            "PORT_STATS_NP",
+}
+IDS = {name: mid for mid, name in NAMES.items()}
+
+# Answered once per port, the others once per clock
+PORT_IDS = (PORT_DATA_SET, PORT_STATS_NP)
+
+# pmc prints NONE for any state past SLAVE
+PORT_STATES = (
+    "NONE", "INITIALIZING", "FAULTY", "DISABLED", "LISTENING",
+    "PRE_MASTER", "MASTER", "PASSIVE", "UNCALIBRATED", "SLAVE",
+)
+
+# Message types, the index of their counters in PORT_STATS_NP
+MESSAGES = (
+    (0x0, "Sync"),
+    (0x1, "Delay_Req"),
+    (0x2, "Pdelay_Req"),
+    (0x3, "Pdelay_Resp"),
+    (0x8, "Follow_Up"),
+    (0x9, "Delay_Resp"),
+    (0xa, "Pdelay_Resp_Follow_Up"),
+    (0xb, "Announce"),
+    (0xc, "Signaling"),
+    (0xd, "Management"),
+)
+
+# Fields pmc(8) does not print in decimal
+FORMATS = {
+    "clockAccuracy":                         "0x{:02x}",
+    "offsetScaledLogVariance":               "0x{:04x}",
+    "offsetFromMaster":                      "{:.1f}",
+    "meanPathDelay":                         "{:.1f}",
+    "observedParentOffsetScaledLogVariance": "0x{:04x}",
+    "observedParentClockPhaseChangeRate":    "0x{:08x}",
+    "gm.ClockAccuracy":                      "0x{:02x}",
+    "gm.OffsetScaledLogVariance":            "0x{:04x}",
+    "timeSource":                            "0x{:02x}",
+}
+
+HEADER = struct.Struct(">BBHBBHqI10sHBb")
+MGMT = struct.Struct(">10sBBBB")
+TLV = struct.Struct(">HHH")
+
+ALL_PORTS = b"\xff" * 10
+
+
+def clock_identity(raw):
+    """Format a clockIdentity like pmc, e.g. 005182.fffe.112202"""
+    return f"{raw[0:3].hex()}.{raw[3:5].hex()}.{raw[5:8].hex()}"
+
+
+def port_identity(raw):
+    """Format a portIdentity like pmc, e.g. 005182.fffe.112202-1"""
+    return f"{clock_identity(raw[0:8])}-{struct.unpack_from('>H', raw, 8)[0]}"
+
+
+def _default_ds(data):
+    (flags, _, ports, prio1, cclass, accuracy, variance, prio2, cid,
+     domain) = struct.unpack_from(">BBHBBBHB8sB", data)
+    return {
+        "twoStepFlag": bool(flags & 1),
+        "slaveOnly": bool(flags & 2),
+        "numberPorts": ports,
+        "priority1": prio1,
+        "clockClass": cclass,
+        "clockAccuracy": accuracy,
+        "offsetScaledLogVariance": variance,
+        "priority2": prio2,
+        "clockIdentity": clock_identity(cid),
+        "domainNumber": domain,
+    }
+
+
+def _current_ds(data):
+    steps, offset, delay = struct.unpack_from(">Hqq", data)
+    return {
+        "stepsRemoved": steps,
+        "offsetFromMaster": offset / 65536,
+        "meanPathDelay": delay / 65536,
+    }
+
+
+def _parent_ds(data):
+    (pid, stats, _, variance, rate, prio1, cclass, accuracy, gmvariance,
+     prio2, gmid) = struct.unpack_from(">10sBBHiBBBHB8s", data)
+    return {
+        "parentPortIdentity": port_identity(pid),
+        "parentStats": int(stats),
+        "observedParentOffsetScaledLogVariance": variance,
+        "observedParentClockPhaseChangeRate": rate & 0xffffffff,
+        "grandmasterPriority1": prio1,
+        "gm.ClockClass": cclass,
+        "gm.ClockAccuracy": accuracy,
+        "gm.OffsetScaledLogVariance": gmvariance,
+        "grandmasterPriority2": prio2,
+        "grandmasterIdentity": clock_identity(gmid),
+    }
+
+
+def _time_properties_ds(data):
+    offset, flags, source = struct.unpack_from(">hBB", data)
+    return {
+        "currentUtcOffset": offset,
+        "leap61": bool(flags & 0x01),
+        "leap59": bool(flags & 0x02),
+        "currentUtcOffsetValid": bool(flags & 0x04),
+        "ptpTimescale": bool(flags & 0x08),
+        "timeTraceable": bool(flags & 0x10),
+        "frequencyTraceable": bool(flags & 0x20),
+        "timeSource": source,
+    }
+
+
+def _port_ds(data):
+    (pid, state, delayreq, peerdelay, announce, timeout, sync, mechanism,
+     pdelayreq, version) = struct.unpack_from(">10sBbqbBbBbB", data)
+    return {
+        "portIdentity": port_identity(pid),
+        "portState": PORT_STATES[state] if state < len(PORT_STATES) else "NONE",
+        "logMinDelayReqInterval": delayreq,
+        "peerMeanPathDelay": peerdelay >> 16,
+        "logAnnounceInterval": announce,
+        "announceReceiptTimeout": timeout,
+        "logSyncInterval": sync,
+        "delayMechanism": mechanism,
+        "logMinPdelayReqInterval": pdelayreq,
+        "versionNumber": version & 0x0f,
+    }
+
+
+def _port_stats_np(data):
+    # Unlike everything else, linuxptp sends these little endian
+    rx = struct.unpack_from("<16Q", data, 10)
+    tx = struct.unpack_from("<16Q", data, 10 + 16 * 8)
+
+    stats = {"portIdentity": port_identity(data[0:10])}
+    stats.update((f"rx_{name}", rx[typ]) for typ, name in MESSAGES)
+    stats.update((f"tx_{name}", tx[typ]) for typ, name in MESSAGES)
+    return stats
+
+
+DECODERS = {
+    DEFAULT_DATA_SET:         (20, _default_ds),
+    CURRENT_DATA_SET:         (18, _current_ds),
+    PARENT_DATA_SET:          (32, _parent_ds),
+    TIME_PROPERTIES_DATA_SET: (4, _time_properties_ds),
+    PORT_DATA_SET:            (26, _port_ds),
+    PORT_STATS_NP:            (10 + 2 * 16 * 8, _port_stats_np),
+}
+
+
+def text(fields):
+    """Format decoded fields like the output of pmc(8)"""
+    out = {}
+    for key, val in fields.items():
+        if isinstance(val, bool):
+            val = int(val)
+        out[key] = FORMATS.get(key, "{}").format(val)
+    return out
+
+
+class Pmc:
+    """Management session with a ptp4l instance, over its UDS socket"""
+
+    def __init__(self, path, domain=0, transport_specific=0, timeout=1.0):
+        self.path = path
+        self.domain = domain
+        self.transport_specific = transport_specific
+        self.timeout = timeout
+        self.seq = 0
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            # Autobind to an abstract address, for ptp4l to reply to
+            self.sock.bind("")
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+
+        self.source = bytes(8) + struct.pack(">H", os.getpid() & 0xffff)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        return False
+
+    def _request(self, mid):
+        self.seq = (self.seq + 1) & 0xffff
+        tlv = TLV.pack(TLV_MANAGEMENT, 2, mid)
+        length = HEADER.size + MGMT.size + len(tlv)
+        header = HEADER.pack((self.transport_specific << 4) | MANAGEMENT,
+                             PTP_VERSION, length, self.domain, 0, 0, 0, 0,
+                             self.source, self.seq, CONTROL_MANAGEMENT,
+                             LOG_INTERVAL_NONE)
+        return header + MGMT.pack(ALL_PORTS, 0, 0, GET, 0) + tlv
+
+    def _response(self, msg):
+        """Get (managementId, fields) of msg, fields None on error status"""
+        if len(msg) < HEADER.size + MGMT.size + TLV.size or \
+           msg[0] & 0x0f != MANAGEMENT:
+            return None, None
+
+        _, _, _, action, _ = MGMT.unpack_from(msg, HEADER.size)
+        if action & 0x0f != RESPONSE:
+            return None, None
+
+        offset = HEADER.size + MGMT.size
+        typ, length, mid = TLV.unpack_from(msg, offset)
+        if typ == TLV_MANAGEMENT_ERROR_STATUS:
+            # managementErrorId comes first, then the managementId
+            mid = struct.unpack_from(">H", msg, offset + 6)[0]
+            return mid, None
+        if typ != TLV_MANAGEMENT or mid not in DECODERS:
+            return None, None
+
+        size, decode = DECODERS[mid]
+        data = msg[offset + TLV.size:offset + TLV.size + length - 2]
+        if len(data) < size:
+            return mid, None
+
+        return mid, decode(data)
+
+    def get(self, *mids):
+        """Get the datasets mids, as {managementId: [fields, ...]}
+
+        All requests are sent at once.  Clock datasets get one response,
+        port datasets one per port, as many as DEFAULT_DATA_SET says
+        there are, if requested, otherwise until the timeout.  Datasets
+        ptp4l failed to provide are left out.
+
+        """
+        replies = {mid: [] for mid in mids}
+        # Responses expected, not known for port datasets until
+        # DEFAULT_DATA_SET has told the number of ports
+        expect = {mid: None if mid in PORT_IDS else 1 for mid in mids}
+        count = dict.fromkeys(mids, 0)
+
+        for mid in mids:
+            self.sock.send(self._request(mid))
+
+        deadline = time.monotonic() + self.timeout
+        while any(n is None or count[mid] < n for mid, n in expect.items()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self.sock.settimeout(remaining)
+            try:
+                msg = self.sock.recv(4096)
+            except socket.timeout:
+                break
+
+            mid, fields = self._response(msg)
+            if mid not in expect:
+                continue
+
+            count[mid] += 1
+            if fields is None:
+                continue
+
+            replies[mid].append(fields)
+            if mid == DEFAULT_DATA_SET:
+                for pmid in PORT_IDS:
+                    if pmid in expect:
+                        expect[pmid] = fields["numberPorts"]
+
+        return {mid: fields for mid, fields in replies.items() if fields}
+
+
+def pmc(path, names, domain=0, transport_specific=0):
+    """Get datasets, by pmc name, from the ptp4l UDS socket at path
+
+    Returns {name: [fields, ...]}, formatted like the output of pmc(8).
+    """
+    with Pmc(path, domain, transport_specific) as session:
+        replies = session.get(*(IDS[name] for name in names))
+
+    return {NAMES[mid]: [text(fields) for fields in blocks]
+            for mid, blocks in replies.items()}
@@ -0,0 +1,113 @@
+"""Persistent yanger service
+
+Starting a new interpreter for every operational query is expensive,
+so statd keeps a yanger process around and sends it requests over a
+Unix socket instead.  A request is a single line of arguments, same
+as on the command line, e.g. "ietf-interfaces -p eth0\\n".  Arguments
+are separated by whitespace or, if the line has any tab, by tabs, so
+that they can contain spaces, e.g. an --xpath.  The reply is a header
+line, "<status> <length>\\n", followed by <length> bytes: the JSON
+document when status is 0, otherwise an error message.
+
+Replies are written to a temporary file, to know their length before
+sending them, without holding them in memory, e.g. a full table RIB.
+
+Memoized command output is dropped after each request, so every reply
+reflects the current system state, just like a freshly started yanger.
+Models may keep state across requests, see `common.PERSISTENT`, only
+when they know when it goes stale.
+"""
+import io
+import os
+import socket
+import sys
+import tempfile
+
+from . import common
+from . import host
+
+
+def flush():
+    """Drop all memoized data from the host and the model modules"""
+    host.HOST.flush()
+
+    prefix = __package__ + "."
+    for name, mod in list(sys.modules.items()):
+        if mod is None or not name.startswith(prefix):
+            continue
+
+        for obj in list(vars(mod).values()):
+            if isinstance(obj, type) or getattr(obj, "__module__", None) != name:
+                continue
+            if callable(getattr(obj, "cache_clear", None)):
+                obj.cache_clear()
+
+
+def _handle(conn, handler):
+    with conn, conn.makefile("rb") as rfile:
+        for line in rfile:
+            line = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            if "\t" in line:
+                args = [arg for arg in line.split("\t") if arg]
+            else:
+                args = line.split()
+            if not args:
+                continue
+
+            with tempfile.TemporaryFile() as raw:
+                body = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+                try:
+                    status = 0
+                    handler(args, body)
+                except (Exception, SystemExit) as err:
+                    common.LOG.error("Failed request \"%s\": %s", " ".join(args), err)
+                    status = 1
+                    body.seek(0)
+                    body.truncate()
+                    body.write(str(err))
+                finally:
+                    flush()
+
+                body.flush()
+                length = raw.tell()
+                conn.sendall(f"{status} {length}\n".encode("ascii"))
+                if length:
+                    conn.sendfile(raw, 0, length)
+                body.detach()
+
+
+def serve(path, handler):
+    """Answer requests on Unix socket path using handler(args, fp)
+
+    The handler writes its reply to text stream fp, or raises an
+    exception with the error message.
+
+    When path is "-", stdin is expected to be an already connected
+    socket, e.g. one end of a socketpair() set up by statd.  Then we
+    serve that single connection and return when the peer closes it.
+
+    """
+    common.PERSISTENT = True
+
+    if path == "-":
+        _handle(socket.socket(fileno=sys.stdin.fileno()), handler)
+        return
+
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(path)
+        sock.listen()
+        common.LOG.info("Serving requests on %s", path)
+
+        while True:
+            conn, _ = sock.accept()
+            try:
+                _handle(conn, handler)
+            except OSError as err:
+                common.LOG.warning("Client connection lost: %s", err)
@@ -0,0 +1,217 @@
+"""Multiplexed remote shell session
+
+With a command prefix like 'ssh user@host sudo', every command, file
+read and existence check is its own connection to the remote system,
+which makes capturing a system, or running `yanger live`, painfully
+slow.  A Session instead starts a single shell through the prefix and
+sends it all commands on stdin.  Each reply is framed as:
+
+    @@yanger <id> <exit status> <length>\\n<length bytes of stdout>
+
+Commands are written as soon as they are submitted, and the replies
+are read back in order when needed, so independent requests, e.g. from
+`Host.prefetch()`, are pipelined over the same connection.
+
+Many small files, e.g. everything below /sys/class/hwmon, can also be
+read in a single request with `read_files()`.
+"""
+import collections
+import subprocess
+
+from . import common
+
+
+MARK = b"@@yanger"
+
+INIT = """\
+exec 2>/dev/null
+t=$(mktemp) || t=/tmp/yanger.$$
+trap 'rm -f "$t" "$t.f"' EXIT
+"""
+
+REQUEST = """\
+{{ {cmd}
+}} </dev/null >"$t"; rc=$?
+printf '\\n{mark} %d %d %d\\n' {id} $rc $(wc -c <"$t"); cat "$t"
+"""
+
+# Output is a sequence of "<path> <exit status> <length>\n<data>"
+READ_FILES = """\
+for f in {patterns}; do
+    [ -f "$f" ] || continue
+    cat "$f" >"$t.f"; rc=$?
+    printf '%s %d %d\\n' "$f" $rc $(wc -c <"$t.f"); cat "$t.f"
+done
+"""
+
+
+class Reply:
+    """Handle to the, possibly not yet received, output of a request"""
+
+    def __init__(self, session, argv, fallback):
+        self.session = session
+        self.argv = argv
+        self.fallback = fallback
+        self.rc = None
+        self.data = None
+
+    def result(self):
+        """Get stdout of the request, raise CalledProcessError on failure"""
+        if self.rc is None:
+            try:
+                while self.rc is None:
+                    self.session.recv()
+            except OSError as err:
+                return self.session.lost(self, err)
+
+        out = self.data.decode("utf-8", errors="replace")
+        if self.rc:
+            raise subprocess.CalledProcessError(self.rc, self.argv, out)
+        return out
+
+
+class Session:
+    # Bound the number of requests in flight, so that neither pipe
+    # can fill up while we are busy writing to the other one.
+    MAX_INFLIGHT = 64
+
+    def __init__(self, prefix, fallback):
+        """Start remote shell using prefix
+
+        Should the session be lost, remaining and later requests are
+        passed to fallback(argv), e.g. `Localhost._spawn()`.
+
+        """
+        self.fallback = fallback
+        self.proc = subprocess.Popen(tuple(prefix) + ("sh",),
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL)
+        self.inflight = collections.deque()
+        self.seq = 0
+        self.broken = None
+        self.warned = False
+
+        try:
+            self.proc.stdin.write(INIT.encode("utf-8"))
+            reply = self.submit("true", ("true",))
+            while reply.rc is None:
+                self.recv()
+        except OSError as err:
+            self.close()
+            raise OSError(f"Failed starting remote shell: {err}") from err
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def submit(self, cmd, argv, fallback=None):
+        """Send shell command line cmd, return its Reply
+
+        The argv is what the request is reported as on errors, and
+        what is passed to fallback, by default the session's, if the
+        session is lost before the reply has been received.
+
+        """
+        reply = Reply(self, argv, fallback or self.fallback)
+        if self.broken:
+            return reply
+
+        self.seq += 1
+        req = REQUEST.format(cmd=cmd, mark=MARK.decode(), id=self.seq)
+        try:
+            while len(self.inflight) >= self.MAX_INFLIGHT:
+                self.recv()
+            self.proc.stdin.write(req.encode("utf-8"))
+            self.proc.stdin.flush()
+        except OSError as err:
+            self.broken = self.broken or str(err)
+            return reply
+
+        self.inflight.append((self.seq, reply))
+        return reply
+
+    def recv(self):
+        """Read the reply to the oldest request in flight"""
+        if self.broken:
+            raise OSError(self.broken)
+        if not self.inflight:
+            raise OSError("No request in flight")
+
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                self.broken = "remote shell exited"
+                raise OSError(self.broken)
+            if line.startswith(MARK):
+                break
+
+        try:
+            seq, rc, length = map(int, line[len(MARK):].split())
+        except ValueError:
+            self.broken = f"garbled reply header {line!r}"
+            raise OSError(self.broken)
+
+        data = self.proc.stdout.read(length)
+        if len(data) < length:
+            self.broken = "remote shell exited"
+            raise OSError(self.broken)
+
+        expect, reply = self.inflight.popleft()
+        if seq != expect:
+            self.broken = f"reply {seq} to request {expect}"
+            raise OSError(self.broken)
+
+        reply.data = data
+        reply.rc = rc
+
+    def lost(self, reply, err):
+        """Session lost while waiting for reply, fall back"""
+        if not self.warned:
+            common.LOG.warning("Remote session lost (%s), running commands "
+                               "one by one", err)
+            self.warned = True
+
+        self.broken = self.broken or str(err)
+        self.inflight.clear()
+        return reply.fallback(reply.argv)
+
+    def read_files(self, patterns):
+        """Read all regular files matching the shell glob patterns
+
+        Returns a Reply, pass it to `files()` to get path -> content
+        of the matching files, those that could not be read are empty.
+        Should the session be lost, no files are returned.
+
+        """
+        patterns = " ".join(p.replace(" ", "\\ ") for p in patterns)
+        return self.submit(READ_FILES.format(patterns=patterns),
+                           ("cat", patterns), fallback=lambda _: "")
+
+    @staticmethod
+    def files(reply):
+        """Get the files read by a read_files() request"""
+        try:
+            reply.result()
+        except subprocess.CalledProcessError:
+            pass
+
+        files = {}
+        data = reply.data or b""
+        while data:
+            head, _, data = data.partition(b"\n")
+            try:
+                path, rc, length = head.rsplit(b" ", 2)
+                rc, length = int(rc), int(length)
+            except ValueError:
+                break
+
+            content = data[:length].decode("utf-8", errors="replace")
+            files[path.decode("utf-8", errors="replace")] = content if rc == 0 else ""
+            data = data[length:]
+
+        return files
@@ -0,0 +1,188 @@
+"""Per-call tracing of where yanger spends its time
+
+Enabled with `--trace FILE`, or YANGER_TRACE=FILE in the environment,
+every command run, file read, JSON parse, persistent cache lookup and
+model built is recorded as a span.  When done, the spans are written
+to FILE in the Chrome trace-event format, load it in chrome://tracing
+or https://ui.perfetto.dev, and a summary of the sources that took the
+most time is printed to stderr, if it is a terminal.  Or, later:
+
+    python3 -m yanger.trace [-n TOP] FILE
+
+When tracing is not enabled, `span()` returns a shared no-op context
+manager, so the hooks cost one function call each.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+
+TRACE = None
+
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL = _Null()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "cat", "args", "start")
+
+    def __init__(self, trace, name, cat, args):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, typ, *_):
+        if typ is not None:
+            self.args["error"] = typ.__name__
+        self.trace.add(self.name, self.cat, self.start,
+                       time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        """Add args to the span, e.g. the outcome of a cache lookup"""
+        self.args.update(args)
+
+
+class Trace:
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self.origin = time.perf_counter_ns()
+
+    def add(self, name, cat, start, end, args=None):
+        # list.append() is atomic, spans may end in prefetch threads
+        self.events.append({
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start - self.origin) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args or {},
+        })
+
+    def save(self):
+        """Write trace to its file, atomically, as it may be sampled"""
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        tmp = f"{self.path}.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp, self.path)
+
+
+def summary(events, top=10):
+    """Table of the top sources, by total time spent in them
+
+    Nested spans, e.g. a command run from a model, count towards
+    both, so the totals do not add up to the wall clock time.
+
+    """
+    sources = {}
+    for ev in events:
+        key = (ev["cat"], ev["name"])
+        count, total, peak = sources.get(key, (0, 0, 0))
+        sources[key] = (count + 1, total + ev["dur"], max(peak, ev["dur"]))
+
+    rows = sorted(sources.items(), key=lambda kv: kv[1][1], reverse=True)
+    lines = [f"{'TOTAL ms':>10} {'MAX ms':>9} {'CALLS':>6}  {'CATEGORY':<8} SOURCE"]
+    for (cat, name), (count, total, peak) in rows[:top]:
+        if len(name) > 60:
+            name = name[:57] + "..."
+        lines.append(f"{total / 1000:10.2f} {peak / 1000:9.2f} {count:6d}  {cat:<8} {name}")
+
+    return "\n".join(lines) + "\n"
+
+
+def span(name, cat, **args):
+    """Context manager recording the time spent in its body"""
+    if TRACE is None:
+        return _NULL
+    return _Span(TRACE, name, cat, args)
+
+
+def traced(cat="model"):
+    """Decorator recording each call to a function as a span"""
+    def decorator(fn):
+        name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        def wrapper(*args, **kwargs):
+            if TRACE is None:
+                return fn(*args, **kwargs)
+            with _Span(TRACE, name, cat, {}):
+                return fn(*args, **kwargs)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__qualname__ = fn.__qualname__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    return decorator
+
+
+def start(path):
+    """Start recording spans, to be written to path by `stop()`"""
+    global TRACE
+    TRACE = Trace(path)
+
+
+def stop(top=None):
+    """Stop recording, save the trace and, optionally, its summary
+
+    With top, a summary of that many sources is written to stderr.
+
+    """
+    global TRACE
+    trace, TRACE = TRACE, None
+    if trace is None:
+        return
+
+    try:
+        trace.save()
+    except OSError as err:
+        from . import common
+        common.LOG.warning("Failed saving trace %s: %s", trace.path, err)
+
+    if top:
+        sys.stderr.write(summary(trace.events, top))
+
+
+def main(argv):
+    top = 10
+    if len(argv) == 3 and argv[0] == "-n" and argv[1].isdigit():
+        top, argv = int(argv[1]), argv[2:]
+    if len(argv) != 1:
+        sys.stderr.write("usage: python3 -m yanger.trace [-n TOP] FILE\n")
+        return 1
+
+    with open(argv[0], "r", encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+
+    sys.stdout.write(summary(events, top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,123 @@
+"""Scoping collection to the subtree of a request xpath
+
+statd passes on the xpath of each operational request, e.g.
+"/ietf-system:system-state/clock".  Models that can build parts of
+their tree independently list their producers in PRODUCERS, pairs of
+the path they produce, or a tuple of them, and a function, e.g.:
+
+    PRODUCERS = (
+        ("/ietf-system:system-state/clock", add_clock),
+        ("/ietf-hardware:hardware/component[name='gps*']", gps_components),
+    )
+
+and `select()` picks the ones overlapping the request.  Module
+prefixes are ignored, and the values of key predicates in producer
+paths are shell patterns, matched against the values requested.  A
+producer whose pattern matches a requested key claims that key, the
+ones that may produce any key are then skipped.
+
+Requests this simple parser does not understand, e.g. unions, select
+all producers.
+"""
+import fnmatch
+import re
+
+
+_PRED = re.compile(r"""^\s*(?:[\w.-]+:)?([\w.-]+)\s*=\s*(['"])(.*)\2\s*$""")
+
+
+def parse(xpath):
+    """Split xpath into steps of (name, {key: value})
+
+    Module prefixes are dropped, and predicates other than simple
+    key = 'value' ignored.  Returns None if xpath is not understood.
+
+    """
+    if not xpath or not xpath.startswith("/"):
+        return None
+
+    steps, step, quote, depth = [], "", None, 0
+    for c in xpath[1:] + "/":
+        if quote:
+            quote = None if c == quote else quote
+        elif c in "'\"":
+            quote = c
+        elif c == "[":
+            depth += 1
+        elif c == "]":
+            depth -= 1
+        elif depth == 0 and c == "|":
+            return None
+        elif depth == 0 and c == "/":
+            if not step:
+                return None
+            steps.append(step)
+            step = ""
+            continue
+        step += c
+
+    if quote or depth:
+        return None
+
+    parsed = []
+    for step in steps:
+        name, _, preds = step.partition("[")
+        keys = {}
+        for pred in preds.rstrip("]").split("]["):
+            if m := _PRED.match(pred):
+                keys[m.group(1)] = m.group(3)
+        parsed.append((name.split(":")[-1].strip(), keys))
+
+    return parsed
+
+
+def _paths(path):
+    return (path,) if isinstance(path, str) else path
+
+
+def root(path):
+    """Top node, with module prefix, of a producer path, e.g. for output"""
+    return _paths(path)[0].split("/")[1].split("[")[0]
+
+
+def _overlaps(request, steps):
+    for (rname, rkeys), (name, keys) in zip(request, steps):
+        if rname not in ("*", name):
+            return False
+        for key, pattern in keys.items():
+            if key in rkeys and not fnmatch.fnmatchcase(rkeys[key], pattern):
+                return False
+    return True
+
+
+def _claims(request, steps):
+    return any(key in rkeys for (_, rkeys), (_, keys) in zip(request, steps)
+               for key in keys)
+
+
+def select(producers, xpath):
+    """Get the (path, producer) pairs needed for xpath, in order
+
+    All producers are selected if xpath is None, not understood, or
+    not for the model of the producers.
+
+    """
+    request = parse(xpath) if xpath else None
+    if not request:
+        return list(producers)
+
+    steps = [(entry, [parse(p) for p in _paths(entry[0])]) for entry in producers]
+    if not any(s[0][0] == request[0][0] or request[0][0] == "*"
+               for _, paths in steps for s in paths):
+        return list(producers)
+
+    chosen = [(entry, [s for s in paths if _overlaps(request, s)])
+              for entry, paths in steps]
+    chosen = [(entry, paths) for entry, paths in chosen if paths]
+
+    claimed = [entry for entry, paths in chosen
+               if any(_claims(request, s) for s in paths)]
+    if claimed:
+        return claimed
+
+    return [entry for entry, _ in chosen]
@@ -31,13 +31,13 @@
 #include "shared.h"
 #include "journal.h"
 #include "avahi.h"
+#include "yanger.h"
 
 /* New kernel feature, not in sys/mman.h yet */
 #ifndef MFD_NOEXEC_SEAL
 #define MFD_NOEXEC_SEAL 0x0008U
 #endif
 
-#define YANGER_BINPATH YANGER_DIR"/yanger"
 #define XPATH_MAX PATH_MAX
 #define XPATH_IFACE_BASE "/ietf-interfaces:interfaces"
 #define XPATH_ROUTING_BASE "/ietf-routing:routing/control-plane-protocols/control-plane-protocol"
@@ -95,7 +95,7 @@ static int ly_add_yanger_data(const struct ly_ctx *ctx, struct lyd_node **parent
 		return SR_ERR_SYS;
 	}
 
-	err = fsystemv(yanger_args, NULL, stream, NULL);
+	err = yanger_run(yanger_args, stream);
 	if (err) {
 		ERROR("Error, running yanger");
 		fclose(stream);
@@ -213,6 +213,12 @@ static int sr_generic_cb(sr_session_ctx_t *session, uint32_t, const char *model,
 
 	DEBUG("Incoming generic query for xpath: %s", xpath);
 
+	/* Let yanger skip the parts of the model not requested */
+	if (xpath) {
+		yanger_args[2] = "-X";
+		yanger_args[3] = (char *)xpath;
+	}
+
 	con = sr_session_get_connection(session);
 	if (!con) {
 		ERROR("Error, getting sr connection");
@@ -554,6 +560,7 @@ int main(int argc, char *argv[])
 	journal_stop(&statd.journal);
 
 	unsub_to_all(&statd);
+	yanger_stop();
 	sr_session_stop(statd.sr_query_ses);
 	sr_session_stop(statd.sr_ses);
 	sr_disconnect(statd.sr_conn);
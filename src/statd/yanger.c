@@ -0,0 +1,291 @@
+/* SPDX-License-Identifier: BSD-3-Clause */
+
+/*
+ * Starting a new Python interpreter for every operational query is
+ * expensive, so we keep a yanger running in server mode (-s -) with
+ * one end of a socketpair as its stdin.  Each query is sent as a line
+ * of tab separated arguments, same as on the command line, and answered
+ * with a "<status> <length>\n" header followed by <length> bytes of JSON,
+ * compact (-C) since it is only parsed.
+ *
+ * If the server cannot be started, or dies, it is killed and the query
+ * is run the old way, by forking a yanger for it.  A new server is
+ * started by a later query, once the holdoff time has passed, so a
+ * broken yanger cannot make us spawn twice per query.
+ *
+ * The reply is only sent once it is complete, so the timeout caps the
+ * time to build it.  A query that times out is slow, not broken, and
+ * a one-shot yanger would take at least as long, so it fails instead.
+ * The server, busy building the reply, is killed and a new one started
+ * by the next query.  Set YANGER_TIMEOUT in the environment, seconds,
+ * for systems with very large tables, e.g. a full Internet RIB.
+ *
+ * For profiling in the field, set YANGER_TRACE_RATE in the environment
+ * to the fraction of queries to trace, e.g. 0.01.  Sampled queries are
+ * run with --trace, saving a Chrome trace of the last one per model in
+ * YANGER_TRACE_DIR.
+ */
+
+#include <errno.h>
+#include <signal.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/socket.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+
+#include <srx/common.h>
+#include <srx/systemv.h>
+
+#include "yanger.h"
+
+#define YANGER_TIMEOUT 30	/* Default max time, in seconds, for a reply */
+#define YANGER_HOLDOFF 10	/* Min time, in seconds, between restarts */
+#define YANGER_MAXARGS  8	/* Max number of args in a query, incl. NULL */
+#define YANGER_TRACE_DIR "/run/yanger/trace"
+
+static struct {
+	pid_t  pid;
+	int    sd;
+	time_t failed;
+} srv = {
+	.pid = -1,
+	.sd  = -1,
+};
+
+static time_t uptime(void)
+{
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec;
+}
+
+void yanger_stop(void)
+{
+	if (srv.sd != -1) {
+		close(srv.sd);
+		srv.sd = -1;
+	}
+
+	if (srv.pid > 0) {
+		/* May already have been reaped by someone else */
+		if (waitpid(srv.pid, NULL, WNOHANG) == 0) {
+			kill(srv.pid, SIGKILL);
+			waitpid(srv.pid, NULL, 0);
+		}
+		srv.pid = -1;
+	}
+}
+
+static int srv_timeout(void)
+{
+	static int timeout = -1;
+
+	if (timeout < 0) {
+		const char *env = getenv("YANGER_TIMEOUT");
+
+		timeout = env ? atoi(env) : 0;
+		if (timeout <= 0)
+			timeout = YANGER_TIMEOUT;
+	}
+
+	return timeout;
+}
+
+static void srv_fail(const char *msg)
+{
+	WARN("yanger server %s, falling back to one-shot mode", msg);
+	yanger_stop();
+	srv.failed = uptime();
+}
+
+static int srv_start(void)
+{
+	struct timeval tv = { .tv_sec = srv_timeout() };
+	char *args[] = { YANGER_BINPATH, "-s", "-", NULL };
+	int sv[2];
+	pid_t pid;
+
+	if (srv.failed && uptime() - srv.failed < YANGER_HOLDOFF)
+		return -1;
+
+	if (socketpair(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0, sv)) {
+		ERROR("Error, creating yanger socketpair: %s", strerror(errno));
+		return -1;
+	}
+
+	pid = fork();
+	if (pid == -1) {
+		ERROR("Error, starting yanger server: %s", strerror(errno));
+		close(sv[0]);
+		close(sv[1]);
+		return -1;
+	}
+	if (pid == 0) {
+		/* dup2() clears FD_CLOEXEC on the new descriptor */
+		dup2(sv[1], STDIN_FILENO);
+		_exit(execv(args[0], args));
+	}
+
+	close(sv[1]);
+	setsockopt(sv[0], SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+	setsockopt(sv[0], SOL_SOCKET, SO_SNDTIMEO, &tv, sizeof(tv));
+
+	srv.pid = pid;
+	srv.sd  = sv[0];
+	srv.failed = 0;
+	DEBUG("Started yanger server, pid %d", pid);
+
+	return 0;
+}
+
+/*
+ * Returns -1 if the server is not accepting requests, and 1 if args
+ * cannot be sent as a request, e.g. a very long xpath.
+ */
+static int srv_send(char *args[])
+{
+	char req[1024];
+	size_t len = 0;
+	ssize_t n;
+
+	/* Skip args[0], the server already knows who it is */
+	for (int i = 1; args[i]; i++) {
+		if (strpbrk(args[i], "\t\n"))
+			return 1;
+
+		n = snprintf(&req[len], sizeof(req) - len, "%s%s", i > 1 ? "\t" : "", args[i]);
+		if (n < 0 || (size_t)n >= sizeof(req) - len)
+			return 1;
+		len += n;
+	}
+	if (len + 1 >= sizeof(req))
+		return 1;
+	req[len++] = '\n';
+
+	for (size_t off = 0; off < len; off += n) {
+		n = send(srv.sd, &req[off], len - off, MSG_NOSIGNAL);
+		if (n <= 0)
+			return -1;
+	}
+
+	return 0;
+}
+
+static int srv_recv(int *status, FILE *out)
+{
+	char buf[BUFSIZ];
+	size_t len, i;
+	ssize_t n;
+
+	errno = 0;
+
+	/* Header is short, read it byte by byte to not consume the body */
+	for (i = 0; i < 32; i++) {
+		n = recv(srv.sd, &buf[i], 1, 0);
+		if (n <= 0)
+			return -1;
+		if (buf[i] == '\n')
+			break;
+	}
+	if (i == 32)
+		return -1;
+	buf[i] = 0;
+
+	if (sscanf(buf, "%d %zu", status, &len) != 2)
+		return -1;
+
+	while (len > 0) {
+		n = recv(srv.sd, buf, len < sizeof(buf) ? len : sizeof(buf), 0);
+		if (n <= 0)
+			return -1;
+
+		if (*status) {
+			ERROR("yanger: %.*s", (int)n, buf);
+		} else if (fwrite(buf, 1, n, out) != (size_t)n) {
+			/* Out of sync with the server, start over */
+			return -1;
+		}
+
+		len -= n;
+	}
+
+	return 0;
+}
+
+static int trace_sample(void)
+{
+	static double rate = -1;
+
+	if (rate < 0) {
+		const char *env = getenv("YANGER_TRACE_RATE");
+
+		rate = env ? strtod(env, NULL) : 0;
+		if (rate > 0)
+			srandom(time(NULL) ^ getpid());
+	}
+
+	return rate > 0 && random() < rate * RAND_MAX;
+}
+
+/*
+ * Run yanger with args, like fsystemv(), writing its JSON output to
+ * out.  Only called from the main loop, so no locking is needed.
+ */
+int yanger_run(char *args[], FILE *out)
+{
+	char *targs[YANGER_MAXARGS + 3];
+	char path[128];
+	int status, rc, i;
+
+	for (i = 0; i < YANGER_MAXARGS - 1 && args[i]; i++)
+		targs[i] = args[i];
+
+	/* Only read by libyang, skip the indentation */
+	targs[i++] = "-C";
+
+	if (trace_sample()) {
+		snprintf(path, sizeof(path), YANGER_TRACE_DIR "/%s.json", args[1]);
+		targs[i++] = "-t";
+		targs[i++] = path;
+
+		DEBUG("Tracing yanger %s to %s", args[1], path);
+	}
+	targs[i] = NULL;
+	args = targs;
+
+	if (srv.sd == -1 && srv_start())
+		goto fallback;
+
+	rc = srv_send(args);
+	if (rc) {
+		if (rc < 0)
+			srv_fail("not accepting requests");
+		goto fallback;
+	}
+
+	if (srv_recv(&status, out)) {
+		if (errno != EAGAIN && errno != EWOULDBLOCK) {
+			srv_fail("stopped responding");
+			goto fallback;
+		}
+
+		ERROR("yanger %s timed out after %d sec", args[1], srv_timeout());
+		yanger_stop();
+		return -1;
+	}
+
+	return status;
+
+fallback:
+	/* Drop any partial reply before retrying */
+	fflush(out);
+	rewind(out);
+	if (ftruncate(fileno(out), 0))
+		return -1;
+
+	return fsystemv(args, NULL, out, NULL);
+}
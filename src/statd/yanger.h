@@ -0,0 +1,13 @@
+/* SPDX-License-Identifier: BSD-3-Clause */
+
+#ifndef STATD_YANGER_H_
+#define STATD_YANGER_H_
+
+#include <stdio.h>
+
+#define YANGER_BINPATH YANGER_DIR"/yanger"
+
+int  yanger_run(char *args[], FILE *out);
+void yanger_stop(void);
+
+#endif
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Verify the decoders of yanger's native chronyd client
+
+On the running system, yanger reads chronyd's reports with its command
+protocol, see yanger/chrony.py, instead of running chronyc.  Replays
+run chronyc, so they never get here.  Reply packets are laid out like
+candm.h in the chrony sources, and their records must match those
+parsed from chronyc -c for the same state, to the precision of
+chrony's 32-bit floats.
+"""
+
+import math
+import os
+import socket
+import struct
+import sys
+
+from infamy.tap import Test
+
+SOURCES_CSV = """\
+^,+,192.168.1.1,1,6,377,3,0.000038081,0.000504333,0.002931096
+^,-,2001:db8::1,2,10,17,-,-0.000002138,0.000464114,0.002930853
+#,*,GPS,0,4,377,12,0.000000012,-0.000000034,0.000000500
+"""
+SOURCESTATS_CSV = "192.168.1.1,16,9,1036,-0.012,0.345,-0.000012345,0.000123456\n"
+TRACKING_CSV = ("C0A80301,192.168.3.1,2,1737726842.730774000,-0.000000123,"
+                "0.000012345,0.000023456,-12.345,0.001,0.123,0.004567,0.000891,"
+                "64.5,Normal\n")
+SERVERSTATS = [1234, 1, 56, 0, 2, 0, 0, 3, 5, 100, 3600,
+               0, 0, 90, 91, 0, 1 << 33]
+
+
+def float32(x):
+    """Encode x as chrony's Float, like UTI_FloatHostToNetwork()"""
+    neg = x < 0
+    x = abs(x)
+    if x < 1e-100:
+        exp, coef = 0, 0
+    else:
+        exp = int(math.log(x) / math.log(2)) + 1
+        coef = int(x * 2.0 ** (-exp + 25) + 0.5)
+        while coef > (1 << 24) - 1 + neg:
+            coef >>= 1
+            exp += 1
+    if neg:
+        coef = -coef & ((1 << 25) - 1)
+    return struct.pack(">I", (exp & 0x7f) << 25 | coef)
+
+
+def ipaddr(name):
+    """IPAddr of name, or a reference id, like GPS, for a refclock"""
+    for family, af in ((1, socket.AF_INET), (2, socket.AF_INET6)):
+        try:
+            addr = socket.inet_pton(af, name)
+            return struct.pack(">16sHH", addr, family, 0)
+        except OSError:
+            continue
+    refid = int.from_bytes(name.encode().ljust(4, b"\0"), "big")
+    return struct.pack(">16sHH", refid.to_bytes(4, "big"), 3, 0)
+
+
+def source_data(f):
+    """RPY_SourceData of a chronyc -c sources line"""
+    mode = {"^": 0, "=": 1, "#": 2}[f[0]]
+    state = {"*": 0, "?": 1, "x": 2, "~": 3, "+": 4, "-": 5}[f[1]]
+    since = 0xffffffff if f[6] == "-" else int(f[6])
+    return ipaddr(f[2]) + \
+        struct.pack(">hHHHHHI", int(f[4]), int(f[3]), state, mode, 0,
+                    int(f[5], 8), since) + \
+        b"".join(float32(float(v)) for v in f[7:10]) + b"\0" * 4
+
+
+def sourcestats(f):
+    """RPY_Sourcestats of a chronyc -c sourcestats line"""
+    sd, resid, skew, offset = (float(v) for v in (f[7], f[4], f[5], f[6]))
+    return struct.pack(">I", 0) + ipaddr(f[0]) + \
+        struct.pack(">III", int(f[1]), int(f[2]), int(f[3])) + \
+        b"".join(float32(v) for v in (sd, resid, skew, offset, 0.0)) + b"\0" * 4
+
+
+def tracking(f):
+    """RPY_Tracking of a chronyc -c tracking line"""
+    ref_time = float(f[3])
+    sec, nsec = int(ref_time), round(ref_time % 1 * 1e9)
+    return struct.pack(">I", int(f[0], 16)) + ipaddr(f[1]) + \
+        struct.pack(">HHIII", int(f[2]), 0, sec >> 32, sec & 0xffffffff, nsec) + \
+        b"".join(float32(float(v)) for v in f[4:13]) + b"\0" * 4
+
+
+def same(native, csv):
+    """Records are the same, to the precision of chrony's Float"""
+    assert native.keys() == csv.keys(), f"{native.keys()} != {csv.keys()}"
+    for key, val in csv.items():
+        if isinstance(val, float):
+            assert math.isclose(native[key], val, rel_tol=1e-6, abs_tol=1e-12), \
+                f"{key}: {native[key]} != {val}"
+        else:
+            assert native[key] == val, f"{key}: {native[key]!r} != {val!r}"
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger import chrony
+
+    with test.step("Decode chrony's 32-bit floats"):
+        assert chrony._float(bytes.fromhex("04800000"), 0) == 1.0
+        assert chrony._float(bytes.fromhex("05800000"), 0) == -1.0
+        assert chrony._float(bytes.fromhex("00000000"), 0) == 0.0
+        for x in (0.5, -0.25, 1e-9, -3.5e-6, 12.345, 1e6, -7e10):
+            y = chrony._float(float32(x), 0)
+            assert math.isclose(x, y, rel_tol=1e-7), f"{x} decoded as {y}"
+
+    with test.step("Decode source data like chronyc sources"):
+        for line in SOURCES_CSV.splitlines():
+            fields = line.split(",")
+            same(chrony._source_data(source_data(fields)),
+                 chrony._csv_source(fields))
+
+    with test.step("Decode source statistics like chronyc sourcestats"):
+        fields = SOURCESTATS_CSV.strip().split(",")
+        same(chrony._sourcestats(sourcestats(fields)),
+             chrony._csv_sourcestats(fields))
+
+    with test.step("Decode tracking like chronyc tracking"):
+        fields = TRACKING_CSV.strip().split(",")
+        same(chrony._tracking(tracking(fields)), chrony._csv_tracking(fields))
+
+    with test.step("Decode server statistics of all reply versions"):
+        # chronyc -c serverstats prints the counters in this order
+        expected = chrony._csv_serverstats([str(v) for v in SERVERSTATS])
+        assert list(expected.values()) == SERVERSTATS
+
+        names = chrony.SERVER_STATS_ORDER[chrony.RPY_SERVER_STATS4]
+        data = b"".join(struct.pack(">II", expected[n] >> 32, expected[n] & 0xffffffff)
+                        for n in names) + b"\0" * 8 * 4
+        assert chrony._server_stats(chrony.RPY_SERVER_STATS4, data) == expected
+
+        for reply in (chrony.RPY_SERVER_STATS, chrony.RPY_SERVER_STATS2,
+                      chrony.RPY_SERVER_STATS3):
+            names = chrony.SERVER_STATS_ORDER[reply]
+            data = struct.pack(f">{len(names)}I", *(expected[n] for n in names))
+            stats = chrony._server_stats(reply, data)
+            assert list(stats) == [n for n in chrony.SERVER_STATS if n in names]
+            assert stats == {n: expected[n] for n in names}, f"reply {reply}: {stats}"
+
+    test.succeed()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Verify the container resource usage sampler of yanger
+
+The resource usage of infix-containers is read from each container's
+cgroup and network namespace, see yanger/infix_containers.py.  Checks
+the parsers of io.stat and /proc/net/dev, the start time of podman,
+also in other timezones than UTC, and the CPU usage between samples.
+"""
+
+import os
+import sys
+
+from infamy.tap import Test
+
+IO_STAT = """\
+8:0 rbytes=1048576 wbytes=4096 rios=12 wios=1 dbytes=0 dios=0
+179:0 rbytes=2048 wbytes=0 rios=1 wios=0 dbytes=0 dios=0
+"""
+
+NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:  999999     100    0    0    0     0          0         0   999999     100    0    0    0     0       0          0
+  eth0:  204800     150    0    0    0     0          0         0    10240      80    0    0    0     0       0          0
+  eth1:    1024       2    0    0    0     0          0         0     2048       3    0    0    0     0       0          0
+"""
+
+STARTED = 1737726842.730774     # 2025-01-24T13:54:02.730774Z
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger.infix_containers import (cpu_percent, parse_io_stat,
+                                         parse_net_dev, run_state,
+                                         started_at, MIN_INTERVAL)
+
+    with test.step("Sum block I/O over all devices in io.stat"):
+        assert parse_io_stat(IO_STAT) == (1048576 + 2048, 4096)
+        assert parse_io_stat("") == (0, 0)
+        assert parse_io_stat(None) == (0, 0)
+
+    with test.step("Sum network I/O over all but lo in /proc/net/dev"):
+        assert parse_net_dev(NET_DEV) == (204800 + 1024, 10240 + 2048)
+        assert parse_net_dev(NET_DEV.splitlines(True)[0]) == (0, 0)
+        assert parse_net_dev(None) == (0, 0)
+
+    with test.step("Parse podman start times, in any timezone"):
+        for started in ("2025-01-24T13:54:02.73077427Z",
+                        "2025-01-24T14:54:02.73077427+01:00",
+                        "2025-01-24T08:24:02.730774-05:30",
+                        "2025-01-24T13:54:02.730774+00:00"):
+            secs = started_at({"State": {"StartedAt": started}})
+            assert secs is not None and abs(secs - STARTED) < 1e-6, \
+                f"{started}: {secs}, expected {STARTED}"
+
+        assert started_at({"State": {"StartedAt": "2025-01-24T13:54:02Z"}}) == int(STARTED)
+        for started in ("", "garbage", "2025-01-24 13:54:02 +0100 CET"):
+            secs = started_at({"State": {"StartedAt": started}})
+            assert secs is None, f"{started!r}: {secs}"
+        assert started_at({}) is None
+
+    with test.step("Take PID and start time of the current run"):
+        ps = {"Pid": 6667, "StartedAt": 1737726900}
+        inspect = {"State": {"Pid": 6667, "StartedAt": "2025-01-24T14:54:02.73077427+01:00"}}
+        pid, started = run_state(ps, inspect)
+        assert pid == 6667 and abs(started - STARTED) < 1e-6
+
+        # Cached inspect of the previous run, after a restart
+        inspect = {"State": {"Pid": 4242, "StartedAt": "2025-01-24T13:54:02Z"}}
+        assert run_state(ps, inspect) == (6667, 1737726900)
+        assert run_state({"Pid": 0}, inspect) == (None, None)
+
+    with test.step("CPU usage since start, then since the previous sample"):
+        now = STARTED + 10
+        # 5 s of CPU time over 10 s is half a core
+        cpu, sample = cpu_percent(5_000_000, now, STARTED, None)
+        assert round(cpu, 6) == 50.0, cpu
+        assert sample == {"started": STARTED, "time": now,
+                          "usage": 5_000_000, "cpu": cpu}
+
+        # Two full cores over the next 2 s
+        cpu, sample = cpu_percent(9_000_000, now + 2, STARTED, sample)
+        assert round(cpu, 6) == 200.0, cpu
+        assert sample["time"] == now + 2 and sample["usage"] == 9_000_000
+
+        # Too close to the previous sample, its figure is reused
+        again, kept = cpu_percent(9_100_000, now + 2 + MIN_INTERVAL / 2,
+                                  STARTED, sample)
+        assert again == cpu and kept is sample
+
+    with test.step("CPU usage of a restarted container starts over"):
+        prev = {"started": STARTED, "time": STARTED + 100,
+                "usage": 50_000_000, "cpu": 10.0}
+        cpu, sample = cpu_percent(1_000_000, STARTED + 204,
+                                  STARTED + 200, prev)
+        assert round(cpu, 6) == 25.0, cpu
+        assert sample["started"] == STARTED + 200
+
+    with test.step("No CPU usage without a start time in the past"):
+        assert cpu_percent(1_000_000, STARTED, None, None) == (None, None)
+        assert cpu_percent(1_000_000, STARTED, STARTED + 3600, None) == (None, None)
+
+    test.succeed()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Verify the incremental index of dnsmasq leases
+
+The leases file is kept indexed across requests, see LeaseIndex in
+yanger/infix_dhcp_server.py, and only re-read when its inode, size or
+mtime changes.  dnsmasq rewrites the whole file on every change, so
+only the lines that are new, or changed, may be parsed again.  A file
+is rewritten, with lines changed, renewed in place, and removed, and
+the leases must always be the same as from parsing the file anew.
+"""
+
+import os
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+LEASES = [
+    "1737726842 00:a0:85:00:01:01 192.168.1.101 alpha 01:00:a0:85:00:01:01",
+    "1737730442 00:a0:85:00:01:02 192.168.1.102 * *",
+    "0 00:a0:85:00:01:03 192.168.1.103 gamma *",
+    "not a lease",
+    "1737734042 00:a0:85:00:01:04 10.0.0.104 delta 01:00:a0:85:00:01:04",
+]
+
+
+def write(path, lines, mtime_ns):
+    """Rewrite path in place, like dnsmasq, with mtime_ns"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{line}\n" for line in lines))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def anew(lines):
+    """Leases as parsed from scratch"""
+    return [row for row in map(parse_lease, lines) if row]
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger import host
+
+    host.HOST = host.Localhost(persistent=False)
+
+    from yanger import infix_dhcp_server as dhcp
+
+    parsed = []
+    parse_lease = dhcp.parse_lease
+
+    def counted(line):
+        parsed.append(line)
+        return parse_lease(line)
+
+    dhcp.parse_lease = counted
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dnsmasq.leases")
+        index = dhcp.LeaseIndex(path)
+        mtime = 1737726842 * 10**9
+
+        with test.step("Read and index all leases"):
+            lines = list(LEASES)
+            write(path, lines, mtime)
+            assert index.select() == anew(lines)
+            assert parsed == lines
+            assert index.select(address="192.168.1.102") == anew(lines[1:2])
+            assert index.select(mac="00:a0:85:00:01:04") == anew(lines[4:])
+            assert dhcp.leases(path, "192.168.1.103") == [{
+                "expires": "never", "address": "192.168.1.103",
+                "phys-address": "00:a0:85:00:01:03", "hostname": "gamma",
+                "client-id": ""}]
+            assert dhcp.leases(path)[1]["expires"] == "2025-01-24T14:54:02+00:00"
+
+        with test.step("Do not re-read an unchanged file"):
+            rows = index.rows
+            parsed.clear()
+            index.select()
+            assert parsed == [] and index.rows is rows
+
+        with test.step("Parse only the changed lines of a rewrite"):
+            lines[0] = lines[0].replace("1737726842", "1737730442")
+            lines.append("1737737642 00:a0:85:00:01:05 192.168.1.105 echo *")
+            mtime += 10**9
+            parsed.clear()
+            write(path, lines, mtime)
+            assert index.select() == anew(lines)
+            assert parsed == [lines[0], lines[-1]], parsed
+            assert index.select(address="192.168.1.105") == anew(lines[-1:])
+
+        with test.step("Forget the removed lines of a rewrite"):
+            removed = lines.pop(1)
+            mtime += 10**9
+            parsed.clear()
+            write(path, lines, mtime)
+            assert index.select() == anew(lines)
+            assert parsed == []
+            assert index.select(address="192.168.1.102") == []
+            assert index.select(mac="00:a0:85:00:01:02") == []
+            assert removed not in index.memo
+
+        with test.step("Notice a renewal in place, of the same size"):
+            size = os.stat(path).st_size
+            lines[0] = lines[0].replace("1737730442", "1737734042")
+            mtime += 10**9
+            parsed.clear()
+            write(path, lines, mtime)
+            assert os.stat(path).st_size == size
+            assert index.select() == anew(lines)
+            assert parsed == [lines[0]], parsed
+
+        with test.step("Have no leases while the file is missing"):
+            os.unlink(path)
+            assert index.select() == []
+            assert dhcp.leases(path) == []
+
+            parsed.clear()
+            write(path, lines, mtime)
+            assert index.select() == anew(lines)
+            assert parsed == lines
+
+    test.succeed()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Verify the native ethtool netlink client against ethtool(8)
+
+On the running system, yanger reads link settings and statistics of
+all ports over the ethtool generic netlink family, see
+yanger/ethtool.py, instead of running `ethtool --json PORT` and
+`ethtool --json -S PORT --all-groups`.  A copper PHY with MAC, control
+and RMON counters, RMON histograms included, a fiber SFP, and a port
+without link, are sent as the kernel would, see ../netlink/fakertnl.py.
+The decoded settings and statistics must be the same as ethtool prints
+them, so that the ethernet model, _LINK_MODES and frame_statistics()
+included, gives the same result as when replaying ethtool.
+"""
+
+import json
+import os
+import struct
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+GENL_ID_CTRL = 16
+CTRL_CMD_NEWFAMILY = 1
+CTRL_ATTR_FAMILY_ID, CTRL_ATTR_FAMILY_NAME = 1, 2
+FAMILY = 21
+
+ETHTOOL_MSG_LINKINFO_GET = 2
+ETHTOOL_MSG_LINKMODES_GET = 4
+ETHTOOL_MSG_LINKSTATE_GET = 6
+ETHTOOL_MSG_STATS_GET = 32
+
+HEADER, HEADER_DEV_INDEX, HEADER_DEV_NAME = 1, 1, 2
+STATS_HEADER, STATS_GRP = 2, 4
+LINKINFO_PORT, LINKINFO_PHYADDR, LINKINFO_TRANSCEIVER = 2, 3, 6
+LINKMODES_AUTONEG, LINKMODES_OURS, LINKMODES_SPEED, LINKMODES_DUPLEX = 2, 3, 5, 6
+LINKSTATE_LINK = 2
+BITSET_SIZE, BITSET_BITS, BITSET_BITS_BIT = 2, 3, 1
+BIT_INDEX, BIT_NAME, BIT_VALUE = 1, 2, 3
+GRP_PAD, GRP_ID, GRP_SS_ID, GRP_STAT = 1, 2, 3, 4
+GRP_HIST_RX, GRP_HIST_TX, HIST_BKT_LOW, HIST_BKT_HI, HIST_VAL = 5, 6, 7, 8, 9
+NLA_F_NESTED = 0x8000
+
+# Bits of the link modes bitset, only the ones with "base" are modes
+LINK_MODE_BITS = {
+    "10baseT/Half": 0, "10baseT/Full": 1, "100baseT/Half": 2,
+    "100baseT/Full": 3, "1000baseT/Full": 5, "Autoneg": 6, "TP": 7,
+    "MII": 9, "FIBRE": 10, "Pause": 13, "Asym_Pause": 14,
+    "10000baseSR/Full": 45,
+}
+LINK_MODES = 102
+
+# Kernel view of each port: ifindex, port, phyad, transceiver, autoneg,
+# speed, duplex, link, supported bits, advertised bits, stats groups
+COPPER = ["10baseT/Half", "10baseT/Full", "100baseT/Half", "100baseT/Full",
+          "1000baseT/Full", "Autoneg", "TP", "MII", "Pause", "Asym_Pause"]
+PORTS = {
+    "e1": (2, 0x00, 1, 1, 1, 1000, 1, 1, COPPER,
+           ["100baseT/Full", "1000baseT/Full", "Autoneg", "TP", "MII", "Pause"],
+           "phy"),
+    "e2": (3, 0x03, 0, 0, 0, 10000, 1, 1, ["10000baseSR/Full", "FIBRE"],
+           ["10000baseSR/Full", "FIBRE"], None),
+    "e3": (4, 0x00, 2, 1, 1, 0xffffffff, 0xff, 0, COPPER, COPPER, "phy"),
+}
+
+# Counters by stats group id and counter index, RMON histograms as
+# (low, high, value), the last bucket without a high end
+MAC = {0: 120034, 1: 0, 2: 0, 3: 118920, 4: 3, 5: 1, 6: 15236782,
+       8: 0, 9: 0, 10: 0, 12: 14893311, 13: 2, 14: 5120, 15: 1812,
+       17: 40211, 18: 966}
+CTRL = {0: 12, 1: 7}
+RMON = {0: 4, 1: 2, 2: 0, 3: 1}
+HIST = [(0, 64, 40311), (65, 127, 50120), (128, 255, 8872),
+        (256, 511, 6001), (512, 1023, 4090), (1024, 1518, 9522),
+        (1519, 0, 4)]
+
+# ethtool --json PORT
+ETHTOOL = """\
+{
+  "e1": [ {
+    "ifname": "e1",
+    "supported-ports": [ "TP", "MII" ],
+    "supported-link-modes": [ "10baseT/Half", "10baseT/Full",
+      "100baseT/Half", "100baseT/Full", "1000baseT/Full" ],
+    "supported-pause-frame-use": "Symmetric Receive-only",
+    "supports-auto-negotiation": true,
+    "supported-fec-modes": [ ],
+    "advertised-link-modes": [ "100baseT/Full", "1000baseT/Full" ],
+    "advertised-pause-frame-use": "Symmetric",
+    "advertised-auto-negotiation": true,
+    "advertised-fec-modes": [ ],
+    "speed": 1000,
+    "duplex": "Full",
+    "auto-negotiation": true,
+    "port": "Twisted Pair",
+    "phyad": 1,
+    "transceiver": "external",
+    "link-detected": true
+  } ],
+  "e2": [ {
+    "ifname": "e2",
+    "supported-ports": [ "FIBRE" ],
+    "supported-link-modes": [ "10000baseSR/Full" ],
+    "supported-pause-frame-use": "No",
+    "supports-auto-negotiation": false,
+    "supported-fec-modes": [ ],
+    "advertised-link-modes": [ "10000baseSR/Full" ],
+    "advertised-pause-frame-use": "No",
+    "advertised-auto-negotiation": false,
+    "advertised-fec-modes": [ ],
+    "speed": 10000,
+    "duplex": "Full",
+    "auto-negotiation": false,
+    "port": "FIBRE",
+    "phyad": 0,
+    "transceiver": "internal",
+    "link-detected": true
+  } ],
+  "e3": [ {
+    "ifname": "e3",
+    "supported-ports": [ "TP", "MII" ],
+    "supported-link-modes": [ "10baseT/Half", "10baseT/Full",
+      "100baseT/Half", "100baseT/Full", "1000baseT/Full" ],
+    "supported-pause-frame-use": "Symmetric Receive-only",
+    "supports-auto-negotiation": true,
+    "supported-fec-modes": [ ],
+    "advertised-link-modes": [ "10baseT/Half", "10baseT/Full",
+      "100baseT/Half", "100baseT/Full", "1000baseT/Full" ],
+    "advertised-pause-frame-use": "Symmetric Receive-only",
+    "advertised-auto-negotiation": true,
+    "advertised-fec-modes": [ ],
+    "auto-negotiation": true,
+    "port": "Twisted Pair",
+    "phyad": 2,
+    "transceiver": "external",
+    "link-detected": false
+  } ]
+}
+"""
+
+# ethtool --json -S PORT --all-groups
+ETHTOOL_S = """\
+{
+  "e1": [ {
+    "ifname": "e1",
+    "eth-phy": {},
+    "eth-mac": {
+      "FramesTransmittedOK": 120034,
+      "SingleCollisionFrames": 0,
+      "MultipleCollisionFrames": 0,
+      "FramesReceivedOK": 118920,
+      "FrameCheckSequenceErrors": 3,
+      "AlignmentErrors": 1,
+      "OctetsTransmittedOK": 15236782,
+      "LateCollisions": 0,
+      "FramesAbortedDueToXSColls": 0,
+      "FramesLostDueToIntMACXmitError": 0,
+      "OctetsReceivedOK": 14893311,
+      "FramesLostDueToIntMACRcvError": 2,
+      "MulticastFramesXmittedOK": 5120,
+      "BroadcastFramesXmittedOK": 1812,
+      "MulticastFramesReceivedOK": 40211,
+      "BroadcastFramesReceivedOK": 966
+    },
+    "eth-ctrl": {
+      "MACControlFramesTransmitted": 12,
+      "MACControlFramesReceived": 7
+    },
+    "rmon": {
+      "etherStatsUndersizePkts": 4,
+      "etherStatsOversizePkts": 2,
+      "etherStatsFragments": 0,
+      "etherStatsJabbers": 1,
+      "rx-pktsNtoM": [
+        {"low": 0, "high": 64, "val": 40311},
+        {"low": 65, "high": 127, "val": 50120},
+        {"low": 128, "high": 255, "val": 8872},
+        {"low": 256, "high": 511, "val": 6001},
+        {"low": 512, "high": 1023, "val": 4090},
+        {"low": 1024, "high": 1518, "val": 9522},
+        {"low": 1519, "high": 0, "val": 4}
+      ],
+      "tx-pktsNtoM": [
+        {"low": 0, "high": 64, "val": 40311},
+        {"low": 65, "high": 127, "val": 50120},
+        {"low": 128, "high": 255, "val": 8872},
+        {"low": 256, "high": 511, "val": 6001},
+        {"low": 512, "high": 1023, "val": 4090},
+        {"low": 1024, "high": 1518, "val": 9522},
+        {"low": 1519, "high": 0, "val": 4}
+      ]
+    }
+  } ],
+  "e2": [ {
+    "ifname": "e2",
+    "eth-phy": {},
+    "eth-mac": {},
+    "eth-ctrl": {},
+    "rmon": {}
+  } ],
+  "e3": [ {
+    "ifname": "e3",
+    "eth-phy": {},
+    "eth-mac": {
+      "FramesTransmittedOK": 120034,
+      "SingleCollisionFrames": 0,
+      "MultipleCollisionFrames": 0,
+      "FramesReceivedOK": 118920,
+      "FrameCheckSequenceErrors": 3,
+      "AlignmentErrors": 1,
+      "OctetsTransmittedOK": 15236782,
+      "LateCollisions": 0,
+      "FramesAbortedDueToXSColls": 0,
+      "FramesLostDueToIntMACXmitError": 0,
+      "OctetsReceivedOK": 14893311,
+      "FramesLostDueToIntMACRcvError": 2,
+      "MulticastFramesXmittedOK": 5120,
+      "BroadcastFramesXmittedOK": 1812,
+      "MulticastFramesReceivedOK": 40211,
+      "BroadcastFramesReceivedOK": 966
+    },
+    "eth-ctrl": {
+      "MACControlFramesTransmitted": 12,
+      "MACControlFramesReceived": 7
+    },
+    "rmon": {
+      "etherStatsUndersizePkts": 4,
+      "etherStatsOversizePkts": 2,
+      "etherStatsFragments": 0,
+      "etherStatsJabbers": 1,
+      "rx-pktsNtoM": [
+        {"low": 0, "high": 64, "val": 40311},
+        {"low": 65, "high": 127, "val": 50120},
+        {"low": 128, "high": 255, "val": 8872},
+        {"low": 256, "high": 511, "val": 6001},
+        {"low": 512, "high": 1023, "val": 4090},
+        {"low": 1024, "high": 1518, "val": 9522},
+        {"low": 1519, "high": 0, "val": 4}
+      ],
+      "tx-pktsNtoM": [
+        {"low": 0, "high": 64, "val": 40311},
+        {"low": 65, "high": 127, "val": 50120},
+        {"low": 128, "high": 255, "val": 8872},
+        {"low": 256, "high": 511, "val": 6001},
+        {"low": 512, "high": 1023, "val": 4090},
+        {"low": 1024, "high": 1518, "val": 9522},
+        {"low": 1519, "high": 0, "val": 4}
+      ]
+    }
+  } ]
+}
+"""
+
+
+def u8(val):
+    return struct.pack("=B", val)
+
+
+def u32(val):
+    return struct.pack("=I", val)
+
+
+def u64(val):
+    return struct.pack("=Q", val)
+
+
+def nested(atype, *attrs):
+    # Nests from the kernel are flagged as such
+    return nest(atype | NLA_F_NESTED, *attrs)
+
+
+def genl(cmd, *attrs):
+    return msg(FAMILY, struct.pack("=BBxx", cmd, 1) + b"".join(attrs))
+
+
+def header(atype, ifname, index):
+    return nested(atype, attr(HEADER_DEV_INDEX, u32(index)),
+                  attr(HEADER_DEV_NAME, ifname.encode() + b"\0"))
+
+
+def bitset(supported, advertised):
+    """Verbose bitset, every supported bit, the advertised with a value"""
+    bits = []
+    for name in sorted(supported, key=LINK_MODE_BITS.get):
+        bit = [attr(BIT_INDEX, u32(LINK_MODE_BITS[name])),
+               attr(BIT_NAME, name.encode() + b"\0")]
+        if name in advertised:
+            bit.append(attr(BIT_VALUE, b""))
+        bits.append(nested(BITSET_BITS_BIT, *bit))
+    return nested(LINKMODES_OURS, attr(BITSET_SIZE, u32(LINK_MODES)),
+                  nested(BITSET_BITS, *bits))
+
+
+def hist(atype):
+    out = []
+    for low, high, val in HIST:
+        out.append(nested(atype, attr(HIST_BKT_LOW, u32(low)),
+                          attr(HIST_BKT_HI, u32(high)),
+                          attr(HIST_VAL, u64(val))))
+    return b"".join(out)
+
+
+def group(gid, ss_id, counters, hists=b""):
+    stats = [nested(GRP_STAT, attr(index, u64(val)))
+             for index, val in counters.items()]
+    return nested(STATS_GRP, attr(GRP_PAD, b""), attr(GRP_ID, u32(gid)),
+                  attr(GRP_SS_ID, u32(ss_id)), hists, *stats)
+
+
+def replies():
+    out = {ETHTOOL_MSG_LINKINFO_GET: [], ETHTOOL_MSG_LINKMODES_GET: [],
+           ETHTOOL_MSG_LINKSTATE_GET: [], ETHTOOL_MSG_STATS_GET: []}
+    for ifname, port in PORTS.items():
+        index, num, phyad, xcvr, autoneg, speed, duplex, link, \
+            supported, advertised, stats = port
+        out[ETHTOOL_MSG_LINKINFO_GET].append(genl(
+            3, header(HEADER, ifname, index), attr(LINKINFO_PORT, u8(num)),
+            attr(LINKINFO_PHYADDR, u8(phyad)),
+            attr(LINKINFO_TRANSCEIVER, u8(xcvr))))
+        out[ETHTOOL_MSG_LINKMODES_GET].append(genl(
+            5, header(HEADER, ifname, index),
+            attr(LINKMODES_AUTONEG, u8(autoneg)),
+            bitset(supported, advertised),
+            attr(LINKMODES_SPEED, u32(speed)),
+            attr(LINKMODES_DUPLEX, u8(duplex))))
+        out[ETHTOOL_MSG_LINKSTATE_GET].append(genl(
+            7, header(HEADER, ifname, index), attr(LINKSTATE_LINK, u8(link))))
+
+        groups = []
+        if stats:
+            groups = [group(1, 21, MAC), group(2, 22, CTRL),
+                      group(3, 23, RMON, hist(GRP_HIST_RX) + hist(GRP_HIST_TX))]
+        out[ETHTOOL_MSG_STATS_GET].append(genl(
+            33, header(STATS_HEADER, ifname, index), *groups))
+    return out
+
+
+def capture(path):
+    """Recording of ethtool(8), to replay and compare with"""
+    os.makedirs(os.path.join(path, "run"))
+    with open(os.path.join(path, "timestamp"), "w", encoding="utf-8") as f:
+        f.write("1737726842\n")
+    for name, cmds in ((ETHTOOL, "ethtool_--json_{}"),
+                       (ETHTOOL_S, "ethtool_--json_-S_{}_--all-groups")):
+        for ifname, out in json.loads(name).items():
+            path_ = os.path.join(path, "run", cmds.format(ifname))
+            with open(path_, "w", encoding="utf-8") as f:
+                json.dump(out, f)
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+    sys.path.insert(0, os.path.join(casedir, "../netlink"))
+
+    import fakertnl
+    from fakertnl import attr, msg, nest
+
+    class FakeGenl(fakertnl.FakeRtnl):
+        """The ethtool family, dumps by command instead of message type"""
+
+        def reply(self, mtype, body):
+            name = fakertnl._attrs(body[4:]).get(CTRL_ATTR_FAMILY_NAME)
+            if mtype == GENL_ID_CTRL and name == b"ethtool\0":
+                return msg(GENL_ID_CTRL, struct.pack("=BBxx", CTRL_CMD_NEWFAMILY, 2) +
+                           attr(CTRL_ATTR_FAMILY_ID, struct.pack("=H", FAMILY)) +
+                           attr(CTRL_ATTR_FAMILY_NAME, name))
+            return None
+
+        def dump(self, mtype, body):
+            return self.replies.get(body[0], []) if mtype == FAMILY else []
+
+    from yanger import host
+
+    with tempfile.TemporaryDirectory() as tmp:
+        capture(tmp)
+
+        # The running system, but with its commands replayed
+        class Native(host.Replayhost):
+            NATIVE = True
+
+        host.HOST = Native(tmp)
+
+        from yanger import ethtool, netlink
+        from yanger.ietf_interfaces import ethernet
+
+        fake = fakertnl.install(netlink, replies(), FakeGenl)
+        expected = json.loads(ETHTOOL)
+        expected_s = json.loads(ETHTOOL_S)
+
+        with test.step("Read all ports in one request of each kind"):
+            settings, stats = ethtool.ethtool()
+            assert list(settings) == list(PORTS), settings
+            assert list(stats) == list(PORTS), stats
+            assert [mtype for mtype, _, _ in fake.requests] == \
+                [GENL_ID_CTRL] + [FAMILY] * 4, fake.requests
+            assert [body[0] for _, _, body in fake.requests[1:]] == \
+                [ETHTOOL_MSG_LINKMODES_GET, ETHTOOL_MSG_LINKINFO_GET,
+                 ETHTOOL_MSG_LINKSTATE_GET, ETHTOOL_MSG_STATS_GET]
+
+        with test.step("Decode link settings like ethtool --json"):
+            for ifname, native in settings.items():
+                out = expected[ifname][0]
+                for key, val in native.items():
+                    assert out.get(key, "missing") == val, \
+                        f"{ifname} {key}: {val} != {out.get(key, 'missing')}"
+                # Everything the ethernet model reads, unknowns left out
+                for key in ("supported-link-modes", "advertised-link-modes",
+                            "speed", "duplex", "auto-negotiation", "port"):
+                    assert (key in native) == (key in out), f"{ifname} {key}"
+
+        with test.step("Decode statistics like ethtool --json -S --all-groups"):
+            for ifname, native in stats.items():
+                assert native == expected_s[ifname][0], \
+                    json.dumps(native, indent=2)
+
+        with test.step("Give the ethernet model the same input as ethtool"):
+            def model():
+                ethernet._native.cache_clear()
+                return {ifname: (ethernet.link(ifname), ethernet.statistics(ifname))
+                        for ifname in PORTS}
+
+            native = model()
+            ethernet.HOST = host.Replayhost(tmp)
+            try:
+                replayed = model()
+            finally:
+                ethernet.HOST = host.HOST
+
+            assert native == replayed, \
+                json.dumps({"native": native, "ethtool": replayed}, indent=2)
+            (eth, speed), stats = native["e1"]
+            assert eth["phy-type"].endswith("phy-type-1000BASE-T"), eth
+            assert speed == 1000000000, speed
+            assert stats["frame"]["in-frames"] == "118920", stats
+            (eth, speed), _ = native["e2"]
+            assert eth["phy-type"].endswith("phy-type-10GBASE-R"), eth
+            assert eth["pmd-type"].endswith("pmd-type-10GBASE-SR"), eth
+            (eth, speed), _ = native["e3"]
+            assert "phy-type" not in eth and speed is None, eth
+
+    test.succeed()
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Verify the FIB source of ietf-routing
+
+With the fib parameter, routes are dumped from the kernel, see
+yanger/netlink.py, and FRR is only asked about the ones it installed,
+for their protocol, distance, metric and uptime, see fib_routes() in
+yanger/ietf_routing.py.  A FIB with multipath routes, nexthop objects
+and groups, special routes, routes FRR does not own, and a VRF, is
+sent as the kernel would, see ../netlink/fakertnl.py.  The decoded
+routes must be the same as ip -j route show prints them, and merged
+with the RIB of a fake zebra into the expected ietf-routing routes,
+for the full FIB as well as for a VRF or a prefix.
+"""
+
+import io
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+RTM_NEWLINK, RTM_GETLINK = 16, 18
+RTM_NEWROUTE, RTM_GETROUTE = 24, 26
+RTM_NEWNEXTHOP, RTM_GETNEXTHOP = 104, 106
+
+IFLA_IFNAME, IFLA_MASTER, IFLA_LINKINFO = 3, 10, 18
+IFLA_INFO_KIND, IFLA_INFO_DATA, IFLA_VRF_TABLE = 1, 2, 1
+
+RTA_DST, RTA_OIF, RTA_GATEWAY, RTA_PRIORITY, RTA_PREFSRC = 1, 4, 5, 6, 7
+RTA_MULTIPATH, RTA_TABLE, RTA_VIA, RTA_PREF, RTA_NH_ID = 9, 15, 18, 20, 30
+NHA_ID, NHA_GROUP, NHA_BLACKHOLE, NHA_OIF, NHA_GATEWAY = 1, 2, 4, 5, 6
+
+RTN = {"unicast": 1, "local": 2, "blackhole": 6, "unreachable": 7}
+PROTO = {"kernel": 2, "boot": 3, "zebra": 11, "dhcp": 16, "bgp": 186,
+         "ospf": 188, "rip": 189, "static": 196}
+SCOPE = {"global": 0, "link": 253, "host": 254}
+RTNH_F_LINKDOWN = 0x10
+RTM_F_CLONED = 0x200
+
+LINKS = {"lo": 1, "e1": 2, "e2": 3, "e3": 4, "red": 5}
+RED_TABLE = 10
+
+# Kernel routes: family, dst, table, protocol, scope, type, flags, attrs,
+# with attrs in the order of _route_attrs()
+ROUTES = [
+    (4, "default", "main", "ospf", "global", "unicast", 0,
+     {"gateway": "192.168.1.1", "oif": "e1", "metric": 20}),
+    (4, "10.0.0.0/24", "main", "ospf", "global", "unicast", 0,
+     {"metric": 30, "multipath": [("192.168.1.2", "e1", 0, 0),
+                                  ("192.168.2.2", "e2", 1, RTNH_F_LINKDOWN)]}),
+    (4, "10.1.0.0/24", "main", "static", "global", "unicast", 0,
+     {"nhid": 10, "metric": 20}),
+    (4, "10.2.0.0/24", "main", "rip", "global", "unicast", 0,
+     {"nhid": 20, "metric": 20}),
+    (4, "10.3.0.0/24", "main", "static", "global", "unicast", 0,
+     {"nhid": 30, "metric": 20}),
+    (4, "10.9.0.0/24", "main", "static", "global", "unreachable", 0,
+     {"metric": 20}),
+    (4, "172.16.0.0/16", "main", "dhcp", "global", "unicast", 0,
+     {"gateway": "192.168.1.254", "oif": "e1", "metric": 100}),
+    (4, "192.0.2.0/24", "main", "bgp", "global", "unicast", 0,
+     {"via": "fe80::2", "oif": "e2", "metric": 20}),
+    (4, "192.168.1.0/24", "main", "kernel", "link", "unicast", 0,
+     {"oif": "e1", "prefsrc": "192.168.1.10"}),
+    (4, "192.168.2.0/24", "main", "kernel", "link", "unicast",
+     RTNH_F_LINKDOWN, {"oif": "e2", "prefsrc": "192.168.2.10"}),
+    # Not in main, nor unicast, and a cached route, ip leaves them out
+    (4, "192.168.1.10/32", "local", "kernel", "host", "local", 0,
+     {"oif": "e1", "prefsrc": "192.168.1.10"}),
+    (4, "192.168.1.42/32", "main", "boot", "global", "unicast",
+     RTM_F_CLONED, {"gateway": "192.168.1.1", "oif": "e1"}),
+    (4, "10.10.0.0/24", RED_TABLE, "ospf", "global", "unicast", 0,
+     {"gateway": "192.168.3.1", "oif": "e3", "metric": 20}),
+    (4, "192.168.3.0/24", RED_TABLE, "kernel", "link", "unicast", 0,
+     {"oif": "e3", "prefsrc": "192.168.3.10"}),
+    (6, "2001:db8::/64", "main", "kernel", "global", "unicast", 0,
+     {"oif": "e1", "metric": 256, "pref": 0}),
+    (6, "2001:db8:1::/64", "main", "ospf", "global", "unicast", 0,
+     {"gateway": "fe80::1", "oif": "e1", "metric": 20, "pref": 0}),
+    (6, "fe80::/64", "main", "kernel", "global", "unicast", 0,
+     {"oif": "e1", "metric": 256, "pref": 0}),
+]
+
+# Nexthop objects: id, gateway, dev, group, blackhole
+NEXTHOPS = [
+    (10, "192.168.1.3", "e1", None, False),
+    (11, "192.168.1.4", "e1", None, False),
+    (12, "192.168.2.4", "e2", None, False),
+    (20, None, None, [(11, 0), (12, 1)], False),
+    (30, None, None, None, True),
+]
+
+# ip -j -4 route show, and ip -j -6 route show, table main and red
+IP_ROUTES = """\
+{
+  "main4": [
+    {"dst": "default", "gateway": "192.168.1.1", "dev": "e1",
+     "protocol": "ospf", "metric": 20, "flags": []},
+    {"dst": "10.0.0.0/24", "protocol": "ospf", "metric": 30, "flags": [],
+     "nexthops": [
+       {"gateway": "192.168.1.2", "dev": "e1", "weight": 1, "flags": []},
+       {"gateway": "192.168.2.2", "dev": "e2", "weight": 2,
+        "flags": ["linkdown"]}]},
+    {"dst": "10.1.0.0/24", "nhid": 10, "protocol": "static", "metric": 20,
+     "flags": []},
+    {"dst": "10.2.0.0/24", "nhid": 20, "protocol": "rip", "metric": 20,
+     "flags": []},
+    {"dst": "10.3.0.0/24", "nhid": 30, "protocol": "static", "metric": 20,
+     "flags": []},
+    {"type": "unreachable", "dst": "10.9.0.0/24", "protocol": "static",
+     "metric": 20, "flags": []},
+    {"dst": "172.16.0.0/16", "gateway": "192.168.1.254", "dev": "e1",
+     "protocol": "dhcp", "metric": 100, "flags": []},
+    {"dst": "192.0.2.0/24", "via": {"family": "inet6", "host": "fe80::2"},
+     "dev": "e2", "protocol": "bgp", "metric": 20, "flags": []},
+    {"dst": "192.168.1.0/24", "dev": "e1", "protocol": "kernel",
+     "scope": "link", "prefsrc": "192.168.1.10", "flags": []},
+    {"dst": "192.168.2.0/24", "dev": "e2", "protocol": "kernel",
+     "scope": "link", "prefsrc": "192.168.2.10", "flags": ["linkdown"]}
+  ],
+  "red4": [
+    {"dst": "10.10.0.0/24", "gateway": "192.168.3.1", "dev": "e3",
+     "protocol": "ospf", "metric": 20, "flags": []},
+    {"dst": "192.168.3.0/24", "dev": "e3", "protocol": "kernel",
+     "scope": "link", "prefsrc": "192.168.3.10", "flags": []}
+  ],
+  "main6": [
+    {"dst": "2001:db8::/64", "dev": "e1", "protocol": "kernel",
+     "metric": 256, "flags": [], "pref": "medium"},
+    {"dst": "2001:db8:1::/64", "gateway": "fe80::1", "dev": "e1",
+     "protocol": "ospf", "metric": 20, "flags": [], "pref": "medium"},
+    {"dst": "fe80::/64", "dev": "e1", "protocol": "kernel", "metric": 256,
+     "flags": [], "pref": "medium"}
+  ]
+}
+"""
+
+# ip -j nexthop show
+IP_NEXTHOPS = """\
+[
+  {"id": 10, "gateway": "192.168.1.3", "dev": "e1", "scope": "link",
+   "protocol": "zebra", "flags": []},
+  {"id": 11, "gateway": "192.168.1.4", "dev": "e1", "scope": "link",
+   "protocol": "zebra", "flags": []},
+  {"id": 12, "gateway": "192.168.2.4", "dev": "e2", "scope": "link",
+   "protocol": "zebra", "flags": []},
+  {"id": 20, "group": [{"id": 11}, {"id": 12, "weight": 2}],
+   "protocol": "zebra", "flags": []},
+  {"id": 30, "blackhole": null, "protocol": "zebra", "flags": []}
+]
+"""
+
+# The RIB of zebra, by vtysh command: prefix, protocol, selected,
+# distance, metric, uptime.  Only what FRR installed is merged, not
+# the routes it has from the kernel, nor the ones it did not select.
+RIB = {
+    "show ip route json": [
+        ("0.0.0.0/0", "ospf", True, 110, 20, "01:00:00"),
+        ("10.0.0.0/24", "ospf", True, 110, 30, "00:10:00"),
+        ("10.0.0.0/24", "static", False, 200, 0, "00:10:00"),
+        ("10.1.0.0/24", "static", True, 1, 0, "1d02h03m"),
+        ("10.2.0.0/24", "rip", True, 120, 2, "00:00:30"),
+        ("10.3.0.0/24", "static", True, 1, 0, "1d02h03m"),
+        ("10.9.0.0/24", "static", True, 1, 0, "02w3d04h"),
+        ("172.16.0.0/16", "kernel", True, 0, 100, "1d02h03m"),
+        ("192.0.2.0/24", "bgp", True, 20, 0, "00:05:00"),
+        ("192.168.1.0/24", "connected", True, 0, 0, "1d02h03m"),
+        ("192.168.2.0/24", "connected", True, 0, 0, "1d02h03m"),
+    ],
+    "show ip route vrf red json": [
+        ("10.10.0.0/24", "ospf", True, 110, 20, "00:20:00"),
+        ("192.168.3.0/24", "connected", True, 0, 0, "1d02h03m"),
+    ],
+    "show ipv6 route json": [
+        ("2001:db8::/64", "connected", True, 0, 0, "1d02h03m"),
+        ("2001:db8:1::/64", "ospf6", True, 110, 20, "00:01:00"),
+        ("fe80::/64", "connected", True, 0, 0, "1d02h03m"),
+    ],
+}
+RIB["show ip route 10.0.0.0/8 longer-prefixes json"] = \
+    [r for r in RIB["show ip route json"] if r[0].startswith("10.")]
+
+# Capture taken at 2025-01-24T13:54:02+00:00
+TIMESTAMP = 1737726842
+SYSCTLS = {
+    "net.ipv4.conf": "net.ipv4.conf.e1.forwarding = 1\n"
+                     "net.ipv4.conf.e2.forwarding = 1\n"
+                     "net.ipv4.conf.e3.forwarding = 0\n",
+    "net.ipv6.conf": "net.ipv6.conf.e1.force_forwarding = 1\n",
+}
+
+
+def route(proto, dst, source, pref, hops=None, special=None, metric=None,
+          updated=None):
+    """Expected ietf-routing route"""
+    new = {f"ietf-{proto}-unicast-routing:destination-prefix": dst,
+           "source-protocol": source, "route-preference": pref}
+    if metric is not None:
+        key = "ietf-rip:metric" if "rip" in source else "ietf-ospf:metric"
+        new[key] = metric
+    new["active"] = [None]
+    if updated:
+        new["last-updated"] = f"2025-01-{updated}+00:00"
+    if special:
+        new["next-hop"] = {"special-next-hop": special}
+        return new
+
+    next_hops = []
+    for hop, installed in hops:
+        if "." in hop or ":" in hop:
+            entry = {f"ietf-{proto}-unicast-routing:address": hop}
+        else:
+            entry = {"outgoing-interface": hop}
+        if installed:
+            entry["infix-routing:installed"] = [None]
+        next_hops.append(entry)
+    new["next-hop"] = {"next-hop-list": {"next-hop": next_hops}}
+    return new
+
+
+V4 = [
+    route("ipv4", "0.0.0.0/0", "ietf-ospf:ospfv2", 110,
+          [("192.168.1.1", True)], metric=20, updated="24T12:54:02"),
+    route("ipv4", "10.0.0.0/24", "ietf-ospf:ospfv2", 110,
+          [("192.168.1.2", True), ("192.168.2.2", False)],
+          metric=30, updated="24T13:44:02"),
+    route("ipv4", "10.1.0.0/24", "static", 1,
+          [("192.168.1.3", True)], updated="23T11:51:02"),
+    route("ipv4", "10.2.0.0/24", "ietf-rip:rip", 120,
+          [("192.168.1.4", True), ("192.168.2.4", True)],
+          metric=2, updated="24T13:53:32"),
+    route("ipv4", "10.3.0.0/24", "static", 1,
+          special="blackhole", updated="23T11:51:02"),
+    route("ipv4", "10.9.0.0/24", "static", 1,
+          special="unreachable", updated="07T09:54:02"),
+    route("ipv4", "172.16.0.0/16", "infix-routing:kernel", 0,
+          [("192.168.1.254", True)]),
+    # Over IPv6, RFC 5549, the address is not an ietf-ipv4 one
+    route("ipv4", "192.0.2.0/24", "infix-routing:kernel", 20,
+          [("e2", True)], updated="24T13:49:02"),
+    route("ipv4", "192.168.1.0/24", "direct", 0, [("e1", True)]),
+    route("ipv4", "192.168.2.0/24", "direct", 0, [("e2", False)]),
+]
+RED4 = [
+    route("ipv4", "10.10.0.0/24", "ietf-ospf:ospfv2", 110,
+          [("192.168.3.1", True)], metric=20, updated="24T13:34:02"),
+    route("ipv4", "192.168.3.0/24", "direct", 0, [("e3", True)]),
+]
+V6 = [
+    route("ipv6", "2001:db8::/64", "direct", 0, [("e1", True)]),
+    route("ipv6", "2001:db8:1::/64", "ietf-ospf:ospfv3", 110,
+          [("fe80::1", True)], metric=20, updated="24T13:53:02"),
+    route("ipv6", "fe80::/64", "direct", 0, [("e1", True)]),
+]
+
+
+def u32(val):
+    return struct.pack("=I", val)
+
+
+def inet(family, addr):
+    return socket.inet_pton(family, addr)
+
+
+def link_msg(ifname, index):
+    body = struct.pack("=BxHiII", socket.AF_UNSPEC, 1, index, 0x1, 0)
+    body += attr(IFLA_IFNAME, ifname.encode() + b"\0")
+    if ifname == "red":
+        body += nest(IFLA_LINKINFO, attr(IFLA_INFO_KIND, b"vrf\0"),
+                     nest(IFLA_INFO_DATA, attr(IFLA_VRF_TABLE, u32(RED_TABLE))))
+    elif ifname == "e3":
+        body += attr(IFLA_MASTER, u32(LINKS["red"]))
+    return msg(RTM_NEWLINK, body)
+
+
+def _route_attrs(family, attrs):
+    out = b""
+    if "nhid" in attrs:
+        out += attr(RTA_NH_ID, u32(attrs["nhid"]))
+    if "gateway" in attrs:
+        out += attr(RTA_GATEWAY, inet(family, attrs["gateway"]))
+    if "via" in attrs:
+        out += attr(RTA_VIA, struct.pack("=H", socket.AF_INET6) +
+                    inet(socket.AF_INET6, attrs["via"]))
+    if "oif" in attrs:
+        out += attr(RTA_OIF, u32(LINKS[attrs["oif"]]))
+    if "prefsrc" in attrs:
+        out += attr(RTA_PREFSRC, inet(family, attrs["prefsrc"]))
+    if "metric" in attrs:
+        out += attr(RTA_PRIORITY, u32(attrs["metric"]))
+    if "pref" in attrs:
+        out += attr(RTA_PREF, bytes([attrs["pref"]]))
+    if "multipath" in attrs:
+        mp = b""
+        for gateway, dev, hops, flags in attrs["multipath"]:
+            gw = attr(RTA_GATEWAY, inet(family, gateway))
+            mp += struct.pack("=HBBi", 8 + len(gw), flags, hops, LINKS[dev]) + gw
+        out += attr(RTA_MULTIPATH, mp)
+    return out
+
+
+def route_msg(version, dst, table, proto, scope, rtype, flags, attrs):
+    family = socket.AF_INET if version == 4 else socket.AF_INET6
+    table = {"main": 254, "local": 255}.get(table, table)
+    addr, _, plen = dst.partition("/")
+    body = b""
+    if dst == "default":
+        plen = 0
+    else:
+        plen = int(plen) if plen else (32 if version == 4 else 128)
+        body = attr(RTA_DST, inet(family, addr))
+
+    head = struct.pack("=BBBBBBBBI", family, plen, 0, 0, min(table, 255),
+                       PROTO[proto], SCOPE[scope], RTN[rtype], flags)
+    return msg(RTM_NEWROUTE, head + attr(RTA_TABLE, u32(table)) + body +
+               _route_attrs(family, attrs))
+
+
+def nexthop_msg(nhid, gateway, dev, group, blackhole):
+    family = socket.AF_INET if gateway else socket.AF_UNSPEC
+    scope = SCOPE["link"] if gateway else 0
+    body = struct.pack("=BBBBI", family, scope, PROTO["zebra"], 0, 0)
+    body += attr(NHA_ID, u32(nhid))
+    if group:
+        body += attr(NHA_GROUP, b"".join(struct.pack("=IBxxx", *member)
+                                         for member in group))
+    if blackhole:
+        body += attr(NHA_BLACKHOLE, b"")
+    if gateway:
+        body += attr(NHA_GATEWAY, inet(family, gateway))
+        body += attr(NHA_OIF, u32(LINKS[dev]))
+    return msg(RTM_NEWNEXTHOP, body)
+
+
+def rib_json(entries):
+    """Output of `show ip route json`, keyed by prefix"""
+    out = {}
+    for prefix, proto, selected, distance, metric, uptime in entries:
+        entry = {"prefix": prefix, "prefixLen": int(prefix.split("/")[1]),
+                 "protocol": proto, "distance": distance, "metric": metric,
+                 "installed": True, "uptime": uptime}
+        if selected:
+            entry["selected"] = True
+        out.setdefault(prefix, []).append(entry)
+    return json.dumps(out)
+
+
+class Zebra(dict):
+    """Replies of zebra over VTY, recording the commands asked for"""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.asked = []
+
+    def __contains__(self, cmd):
+        self.asked.append(cmd)
+        return super().__contains__(cmd)
+
+
+def capture(path):
+    os.makedirs(os.path.join(path, "run"))
+    with open(os.path.join(path, "timestamp"), "w", encoding="utf-8") as f:
+        f.write(f"{TIMESTAMP}\n")
+    for key, out in SYSCTLS.items():
+        with open(os.path.join(path, "run", f"sysctl_{key}"), "w",
+                  encoding="utf-8") as f:
+            f.write(out)
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+    sys.path.insert(0, os.path.join(casedir, "../netlink"))
+
+    import fakertnl
+    from fakertnl import attr, msg, nest
+
+    from yanger import host
+
+    with tempfile.TemporaryDirectory() as tmp:
+        capture(tmp)
+
+        # The running system, but with its commands replayed
+        class Native(host.Replayhost):
+            NATIVE = True
+
+        host.HOST = Native(tmp)
+
+        from yanger import common, frr, ietf_routing, netlink
+
+        # Names as on the target, not the system running the test
+        netlink._TABLES["rt_tables"] = dict(netlink.RT_TABLES)
+        netlink._TABLES["rt_protos"] = dict(netlink.RT_PROTOS)
+
+        fake = fakertnl.install(netlink, {
+            RTM_GETLINK: [link_msg(name, index) for name, index in LINKS.items()],
+            RTM_GETROUTE: [route_msg(*r) for r in ROUTES],
+            RTM_GETNEXTHOP: [nexthop_msg(*nh) for nh in NEXTHOPS],
+        })
+        zebra = Zebra({cmd: rib_json(entries) for cmd, entries in RIB.items()})
+        frr._replies = lambda: zebra
+
+        def operational(param):
+            zebra.asked.clear()
+            fake.requests.clear()
+            fp = io.StringIO()
+            common.dump(ietf_routing.operational(param), fp)
+            ribs = json.loads(fp.getvalue())["ietf-routing:routing"]["ribs"]
+            return [rib["routes"]["route"] for rib in ribs["rib"]]
+
+        def dumped(mtype):
+            return [m for m, _, _ in fake.requests if m == mtype]
+
+        with test.step("Decode routes like ip -j route show"):
+            expected = json.loads(IP_ROUTES)
+            routes = list(netlink.iproutes(socket.AF_INET))
+            assert routes == expected["main4"], json.dumps(routes, indent=2)
+            routes = list(netlink.iproutes(socket.AF_INET, RED_TABLE))
+            assert routes == expected["red4"], json.dumps(routes, indent=2)
+            routes = list(netlink.iproutes(socket.AF_INET6))
+            assert routes == expected["main6"], json.dumps(routes, indent=2)
+
+        with test.step("Decode nexthop objects like ip -j nexthop show"):
+            nexthops = netlink.ipnexthops()
+            assert nexthops == json.loads(IP_NEXTHOPS), \
+                json.dumps(nexthops, indent=2)
+
+        with test.step("Merge the RIB of FRR into the FIB"):
+            v4, v6 = operational("fib")
+            assert v4 == V4, json.dumps(v4, indent=2)
+            assert v6 == V6, json.dumps(v6, indent=2)
+            assert zebra.asked == ["show ip route json",
+                                   "show ipv6 route json"], zebra.asked
+            assert len(dumped(RTM_GETNEXTHOP)) == 1, fake.requests
+
+        with test.step("Get the FIB of a VRF"):
+            v4, v6 = operational("fib,vrf=red")
+            assert v4 == RED4, json.dumps(v4, indent=2)
+            assert v6 == [], v6
+            assert zebra.asked == ["show ip route vrf red json"], zebra.asked
+            assert not dumped(RTM_GETNEXTHOP), fake.requests
+
+        with test.step("Get the FIB routes within a prefix"):
+            v4, v6 = operational("fib,prefix=10.0.0.0/8")
+            assert v4 == V4[1:6], json.dumps(v4, indent=2)
+            assert v6 == [], v6
+            assert zebra.asked == \
+                ["show ip route 10.0.0.0/8 longer-prefixes json"], zebra.asked
+
+        with test.step("Leave FRR out of a prefix with none of its routes"):
+            v4, v6 = operational("fib,prefix=192.168.0.0/16")
+            assert v4 == V4[8:], json.dumps(v4, indent=2)
+            assert v6 == [], v6
+            assert zebra.asked == [], zebra.asked
+
+    test.succeed()
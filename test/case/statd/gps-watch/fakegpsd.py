@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Stand-in for gpsd, speaking enough of its JSON protocol for yanger
+
+Clients get the VERSION banner, a DEVICES and WATCH reply to ?WATCH,
+and a POLL reply to ?POLL.  Watching clients are then sent a TPV and a
+SKY report for every device each `interval` seconds, like gpsd does
+with a receiver reporting once per second.  The fix of each device is
+set with `fix()`, and reports are paused with `silence()`.
+
+usage: fakegpsd.py [-p PORT] [DEVICE ...]
+
+  -p PORT  Listen on PORT, default 2947, like gpsd
+
+Serves a fixed 3D fix for each DEVICE, by default /dev/ttyACM0, e.g.
+to try out yanger on a system without a GPS receiver.
+"""
+import json
+import socket
+import sys
+import threading
+import time
+
+
+class FakeGpsd:
+    def __init__(self, port=0, interval=1.0):
+        self.interval = interval
+        self.devices = {}
+        self.silent = False
+        self.connections = 0
+        self.clients = set()
+        self.lock = threading.Lock()
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", port))
+        self.sock.listen()
+        self.address = self.sock.getsockname()
+
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._report, daemon=True).start()
+
+    def fix(self, device, lat=59.3293, lon=18.0686, alt=28.0, mode=3, used=8, seen=12):
+        """Set the fix, and satellites used out of seen, of device"""
+        with self.lock:
+            self.devices[device] = {
+                "tpv": {"class": "TPV", "device": device, "driver": "u-blox",
+                        "mode": mode, "lat": lat, "lon": lon, "altHAE": alt},
+                "sky": {"class": "SKY", "device": device,
+                        "satellites": [{"PRN": n + 1, "used": n < used}
+                                       for n in range(seen)]},
+            }
+
+    def silence(self, silent=True):
+        """Stop, or resume, sending reports, like a receiver gone quiet"""
+        self.silent = silent
+
+    def close(self):
+        """Stop serving, and drop all clients, like gpsd exiting"""
+        with self.lock:
+            for conn in [self.sock, *self.clients]:
+                try:
+                    # Wakes up the threads blocked on them, unlike close()
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                conn.close()
+            self.clients.clear()
+
+    def _send(self, conn, *msgs):
+        data = "".join(json.dumps(msg) + "\r\n" for msg in msgs)
+        try:
+            conn.sendall(data.encode())
+        except OSError:
+            with self.lock:
+                self.clients.discard(conn)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        self._send(conn, {"class": "VERSION", "release": "3.25",
+                          "proto_major": 3, "proto_minor": 15})
+        with conn.makefile("rb") as fp:
+            for line in fp:
+                with self.lock:
+                    devices = list(self.devices.items())
+                for cmd in line.decode().split(";"):
+                    cmd = cmd.strip()
+                    if cmd.startswith("?WATCH"):
+                        self._send(conn, {
+                            "class": "DEVICES",
+                            "devices": [{"class": "DEVICE", "path": path,
+                                         "driver": "u-blox",
+                                         "activated": "2026-01-01T00:00:00.000Z"}
+                                        for path, _ in devices]
+                        }, {"class": "WATCH", "enable": True, "json": True})
+                        with self.lock:
+                            self.clients.add(conn)
+                    elif cmd == "?POLL":
+                        self._send(conn, {
+                            "class": "POLL",
+                            "time": time.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                            "active": len(devices),
+                            "tpv": [dev["tpv"] for _, dev in devices],
+                            "sky": [dev["sky"] for _, dev in devices],
+                        })
+
+    def _report(self):
+        while True:
+            time.sleep(self.interval)
+            if self.silent:
+                continue
+            with self.lock:
+                clients = list(self.clients)
+                reports = [msg for dev in self.devices.values()
+                           for msg in (dev["tpv"], dev["sky"])]
+            for conn in clients:
+                self._send(conn, *reports)
+
+
+def main():
+    args = sys.argv[1:]
+    port = 2947
+    if args[:1] == ["-p"]:
+        port = int(args[1])
+        args = args[2:]
+
+    gpsd = FakeGpsd(port)
+    for device in args or ["/dev/ttyACM0"]:
+        gpsd.fix(device)
+
+    print(f"Serving on {gpsd.address[0]}:{gpsd.address[1]}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        gpsd.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Verify yanger's gpsd watcher against a stand-in gpsd
+
+A long-lived yanger keeps one connection to gpsd, and the latest TPV
+and SKY of each device, see yanger/gpsd.py.  Queries must get the
+current fix without connecting to gpsd again, must not get reports
+older than `STALE`, and the watcher must reconnect when gpsd restarts.
+A yanger started for a single query still polls gpsd, once.
+"""
+
+import os
+import sys
+import time
+
+from infamy.tap import Test
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, casedir)
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from fakegpsd import FakeGpsd
+    from yanger import gpsd
+
+    DEVICE = "/dev/ttyACM0"
+    gpsd.STALE = 1.0
+    gpsd.RETRY = 0.2
+
+    def fix(poll):
+        tpv = {t["device"]: t for t in poll.get("tpv", [])}.get(DEVICE, {})
+        return tpv.get("mode", 0), tpv.get("lat")
+
+    with test.step("Poll stand-in gpsd once"):
+        fake = FakeGpsd(interval=0.1)
+        fake.fix(DEVICE)
+        poll = gpsd.poll_once(fake.address)
+        assert poll.get("active") == 1, f"unexpected reply: {poll}"
+        assert fix(poll) == (3, 59.3293), f"unexpected fix: {poll}"
+
+    with test.step("Get the fix from the watcher"):
+        watcher = gpsd.Watcher(fake.address)
+        watcher.start()
+        poll = watcher.poll()
+        assert poll["active"] == 1, f"device not active: {poll}"
+        assert fix(poll) == (3, 59.3293), f"unexpected fix: {poll}"
+        assert len(poll["sky"][0]["satellites"]) == 12
+
+    with test.step("Answer queries without connecting to gpsd"):
+        connections = fake.connections
+        start = time.monotonic()
+        for _ in range(1000):
+            watcher.poll()
+        elapsed = time.monotonic() - start
+        assert fake.connections == connections, "watcher reconnected"
+        assert elapsed < 0.5, f"1000 queries took {elapsed:.3f}s"
+
+    with test.step("Follow changes of the fix"):
+        fake.fix(DEVICE, lat=57.7089, mode=2)
+        time.sleep(0.5)
+        assert fix(watcher.poll()) == (2, 57.7089), "fix not updated"
+
+    with test.step("Drop reports older than STALE"):
+        fake.silence()
+        time.sleep(gpsd.STALE + 0.5)
+        poll = watcher.poll()
+        assert not poll["tpv"] and not poll["sky"], f"stale reports: {poll}"
+
+    with test.step("Reconnect when gpsd restarts"):
+        address = fake.address
+        fake.close()
+        time.sleep(0.5)
+        assert watcher.poll()["active"] == 0, "device active without gpsd"
+
+        fake = FakeGpsd(port=address[1], interval=0.1)
+        fake.fix(DEVICE, lat=55.6050)
+        time.sleep(1.0)
+        assert fix(watcher.poll()) == (3, 55.6050), "no fix after restart"
+        fake.close()
+
+    test.succeed()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Verify the file primitives of Host against those of Localhost
+
+On the running system, read_bytes(), realpath(), listdir() and stat()
+are native, see Localhost in yanger/host.py.  On other hosts, and in
+captures and replays, they run od(1), realpath(1), ls(1) and stat(1)
+instead, see Host.  Both must give the same result for the same files:
+binary content, symlinks, dangling ones too, sorted directories, and
+every field of stat, in order, with the mode parsed from hex.  GNU
+realpath(1) resolves a missing last component, BusyBox, on target,
+does not, like Localhost.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+
+def tree(top):
+    """Files like the ones the models read, return paths to check"""
+    hwmon = os.path.join(top, "class", "hwmon")
+    devices = os.path.join(top, "devices")
+    os.makedirs(hwmon)
+    os.makedirs(devices)
+    for name in ("hwmon10", "hwmon2", "hwmon0", "hwmon1"):
+        os.mkdir(os.path.join(devices, name))
+        os.symlink(os.path.join("..", "..", "devices", name),
+                   os.path.join(hwmon, name))
+
+    # A device-tree cell, a phandle, and a string property
+    cell = os.path.join(devices, "phandle")
+    with open(cell, "wb") as f:
+        f.write(bytes([0x00, 0x00, 0x80, 0xff]))
+    compatible = os.path.join(devices, "compatible")
+    with open(compatible, "wb") as f:
+        f.write(b"u-blox,neo-m8\0gnss\0")
+    os.chmod(compatible, 0o640)
+    empty = os.path.join(devices, "empty")
+    open(empty, "wb").close()
+
+    link = os.path.join(top, "link")
+    os.symlink(os.path.join("class", "hwmon", "hwmon2"), link)
+    dangling = os.path.join(top, "dangling")
+    os.symlink("nowhere", dangling)
+
+    return [top, hwmon, devices, os.path.join(hwmon, "hwmon10"), cell,
+            compatible, empty, link, dangling, os.path.join(top, "missing")]
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger import host
+
+    class Commands(host.Localhost):
+        """The running system, but read with commands, like Remotehost"""
+        listdir = host.Host.listdir
+        read_bytes = host.Host.read_bytes
+        realpath = host.Host.realpath
+        stat = host.Host.stat
+
+    native = host.Localhost(persistent=False)
+    commands = Commands(persistent=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = tree(tmp)
+        missing = paths[8:]
+        strict = commands.realpath(missing[0]) is None
+
+        for name in ("stat", "read_bytes", "realpath", "listdir"):
+            with test.step(f"Same {name}() with commands as native"):
+                for path in paths:
+                    if name == "realpath" and path in missing and not strict:
+                        print(f"GNU realpath(1), skipping {path}")
+                        continue
+                    ours, theirs = getattr(commands, name)(path), \
+                        getattr(native, name)(path)
+                    if name == "stat" and ours is not None:
+                        ours = tuple(ours)
+                        theirs = tuple(theirs) if theirs is not None else None
+                    assert ours == theirs, f"{path}: {ours} != {theirs}"
+
+        with test.step("Read binary content and file modes"):
+            cell, compatible, empty = paths[4:7]
+            assert commands.read_bytes(cell) == b"\x00\x00\x80\xff"
+            assert commands.read_bytes(compatible) == b"u-blox,neo-m8\0gnss\0"
+            assert commands.read_bytes(empty) is None
+
+            st = commands.stat(compatible)
+            assert stat.S_ISREG(st.st_mode) and \
+                stat.S_IMODE(st.st_mode) == 0o640, oct(st.st_mode)
+            assert stat.S_ISDIR(commands.stat(paths[3]).st_mode)
+            assert commands.stat(paths[3]).st_ino == \
+                os.lstat(os.path.join(paths[2], "hwmon10")).st_ino
+            assert commands.listdir(paths[1]) == \
+                ["hwmon0", "hwmon1", "hwmon10", "hwmon2"]
+
+    test.succeed()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Verify the hwmon device cache of ietf-hardware
+
+hwmon devices are scanned once, see hwmon_device() in
+yanger/ietf_hardware.py, and only their sensor values are read on the
+following queries.  The map from PHY phandle to interface is kept for as
+long as the same interfaces exist.  A synthetic sysfs is replayed and
+changed between queries: new values, an SFP swapped for one with other
+sensors, a module with another name, an unplugged module, and other
+interfaces.  The sensors must always be the same as with nothing cached,
+and nothing but the values may be read when nothing else changed.
+"""
+
+import os
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+HWMON = "/sys/class/hwmon"
+NET = "/sys/class/net"
+
+
+class Sysfs:
+    """Capture directory of a synthetic sysfs, see Replayhost"""
+
+    def __init__(self, path):
+        self.path = path
+        self.put("timestamp", "1737726842\n", root="")
+
+    def put(self, path, text, root="rootfs"):
+        path = os.path.join(self.path, root + path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def run(self, cmd, text):
+        self.put(f"/{host.Replayhost.SlugOf(cmd)}", text, root="run")
+
+    def ls(self, path, names):
+        self.run(("ls", path), "".join(f"{name}\n" for name in names))
+
+    def cell(self, path, value):
+        """A device-tree cell, as read by od(1)"""
+        data = value.to_bytes(4, "big")
+        self.run(("od", "-An", "-v", "-tx1", path),
+                 "".join(f" {b:02x}" for b in data) + "\n")
+
+    def device(self, num, name, attrs, phandle=None):
+        path = f"{HWMON}/hwmon{num}"
+        self.put(f"{path}/name", f"{name}\n")
+        for attr, value in attrs.items():
+            self.put(f"{path}/{attr}", f"{value}\n")
+        self.ls(path, sorted(["name", "device", *attrs]))
+        if phandle:
+            self.cell(f"{path}/device/of_node/phandle", phandle)
+
+    def devices(self, nums):
+        self.ls(HWMON, [f"hwmon{num}" for num in nums])
+
+    def interfaces(self, handles):
+        self.ls(NET, sorted(handles))
+        for ifname, phandle in handles.items():
+            if phandle:
+                self.cell(f"{NET}/{ifname}/of_node/phy-handle", phandle)
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger import host
+
+    class Recorder(host.Replayhost):
+        """Replay, and record what is read"""
+        reads = []
+
+        def read(self, path):
+            self.reads.append(path)
+            return super().read(path)
+
+        def run(self, cmd, default=None, log=True):
+            self.reads.append(cmd[-1])
+            return super().run(cmd, default, log)
+
+    tmp = tempfile.TemporaryDirectory()
+    sysfs = Sysfs(tmp.name)
+    host.HOST = Recorder(tmp.name)
+
+    from yanger import ietf_hardware as hw
+
+    reads = host.HOST.reads
+
+    def query():
+        reads.clear()
+        return hw.hwmon_sensor_components()
+
+    def cold():
+        """Sensors as scanned with nothing cached"""
+        devices, ifnames = dict(hw._hwmon_devices), hw._phy_ifname
+        seen = list(reads)
+        hw._hwmon_devices.clear()
+        hw._phy_ifname = (None, {})
+        try:
+            return hw.hwmon_sensor_components()
+        finally:
+            hw._hwmon_devices.clear()
+            hw._hwmon_devices.update(devices)
+            hw._phy_ifname = ifnames
+            reads[:] = seen
+
+    def sensors(components):
+        return {c["name"]: c["sensor-data"]["value"]
+                for c in components if "sensor-data" in c}
+
+    def scanned(prefix):
+        """Paths read or listed below prefix, other than sensor values"""
+        return [path for path in reads if path.startswith(prefix)
+                and not path.endswith("_input") and path != HWMON]
+
+    sysfs.device(0, "cpu_thermal", {"temp1_input": 45000})
+    sysfs.device(1, "sfp_1", {"temp1_input": 31000, "temp1_label": "Temp",
+                              "in0_input": 3300, "in0_label": "VCC"})
+    sysfs.device(2, "cp0busbusf2000000mdio12a200switch2mdio01",
+                 {"temp1_input": 52000}, phandle=0x2a)
+    sysfs.devices([0, 1, 2])
+    sysfs.interfaces({"e1": 0x2a, "e2": 0x2b, "lo": None})
+
+    with test.step("Scan all devices on the first query"):
+        components = query()
+        assert components == cold()
+        assert sensors(components) == {
+            "cpu": 45000, "sfp1-Temp": 31000, "sfp1-VCC": 3300, "e1": 52000,
+        }, sensors(components)
+        assert f"{HWMON}/hwmon1/temp1_label" in reads
+        assert f"{NET}/e1/of_node/phy-handle" in reads
+        assert sorted(hw._hwmon_devices) == \
+            [f"{HWMON}/hwmon{num}" for num in (0, 1, 2)]
+
+    with test.step("Read only the sensor values on the next query"):
+        sysfs.put(f"{HWMON}/hwmon0/temp1_input", "47000\n")
+        sysfs.put(f"{HWMON}/hwmon2/temp1_input", "55000\n")
+        components = query()
+        assert components == cold()
+        assert sensors(components)["cpu"] == 47000
+        assert sensors(components)["e1"] == 55000
+        assert scanned(f"{HWMON}/") == [f"{HWMON}/hwmon{num}{attr}"
+                                        for num in (0, 1, 2)
+                                        for attr in ("/name", "")], reads
+        assert scanned(NET) == [NET], reads
+
+    with test.step("Scan a swapped SFP again, with other sensors"):
+        sysfs.device(1, "sfp_1", {"temp1_input": 29000, "temp1_label": "Temp",
+                                  "in0_input": 3310, "in0_label": "VCC",
+                                  "power1_input": 520, "power1_label": "TX_power"})
+        components = query()
+        assert components == cold()
+        assert sensors(components)["sfp1-TX_power"] == 520, sensors(components)
+        assert f"{HWMON}/hwmon1/power1_label" in reads
+        assert f"{HWMON}/hwmon0/temp1_label" not in reads
+
+    with test.step("Scan a module again when its name changes"):
+        sysfs.put(f"{HWMON}/hwmon1/name", "sfp_2\n")
+        components = query()
+        assert components == cold()
+        assert "sfp2-VCC" in sensors(components)
+        assert "sfp1-VCC" not in sensors(components)
+        assert f"{HWMON}/hwmon1/in0_label" in reads
+
+    with test.step("Forget devices that are gone"):
+        sysfs.devices([0, 2])
+        components = query()
+        assert components == cold()
+        assert not any(name.startswith("sfp") for name in sensors(components))
+        assert sorted(hw._hwmon_devices) == [f"{HWMON}/hwmon0", f"{HWMON}/hwmon2"]
+
+        # Replugged, the module comes back, with a new hwmon number
+        sysfs.device(3, "sfp_2", {"temp1_input": 30000, "temp1_label": "Temp"})
+        sysfs.devices([0, 2, 3])
+        components = query()
+        assert components == cold()
+        assert sensors(components)["sfp2-Temp"] == 30000, sensors(components)
+        assert f"{HWMON}/hwmon1" not in hw._hwmon_devices
+
+    with test.step("Map PHYs to interfaces again when they change"):
+        sysfs.interfaces({"e1": 0x2b, "e2": 0x2b, "e3": 0x2a, "lo": None})
+        components = query()
+        assert components == cold()
+        assert sensors(components)["e3"] == 55000, sensors(components)
+        assert "e1" not in sensors(components)
+        assert f"{NET}/e3/of_node/phy-handle" in reads
+
+        components = query()
+        assert scanned(NET) == [NET], reads
+
+    tmp.cleanup()
+    test.succeed()
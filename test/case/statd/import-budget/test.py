@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Verify yanger import time budget
+
+Every query not answered by the yanger server in statd pays for the
+imports of its model, so each model is imported with `python3 -X
+importtime` and the time spent, minus what the interpreter imports on
+its own, is checked against the budget in budget.json.  The budget is
+a multiple of the time the interpreter spends on its own imports, in
+the same runs, to not depend on the speed or load of the test host.
+Times are the best of a few runs, after the bytecode is compiled, like
+on target.  Modules listed as lazy are slow to import and must only be
+imported when actually used, never when a model is loaded.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+
+def importtime(code, env):
+    """Run code with -X importtime, return {module: cumulative us} of roots"""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         env=env, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.PIPE, text=True, check=True)
+
+    roots, modules = {}, set()
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        if not name.startswith("  "):
+            roots[name.strip()] = int(cumulative)
+
+    return roots, modules
+
+
+def measure(model, env, repeat):
+    """Best time, in ms, to import model, relative to the interpreter
+
+    Returns (ms, multiple of the interpreter's own imports, modules),
+    both measured in each run, so that they are equally affected by
+    whatever else the test host is busy with.
+    """
+    code = f"import yanger.__main__ as m; m._module({model!r})"
+
+    # The first run compiles the bytecode, it does not count
+    importtime(code, env)
+
+    best = base = None
+    modules = set()
+    for _ in range(repeat):
+        own, _ = importtime("pass", env)
+        us = sum(own.values())
+        base = us if base is None else min(base, us)
+
+        roots, modules = importtime(code, env)
+        us = sum(t for name, t in roots.items() if name not in own)
+        best = us if best is None else min(best, us)
+
+    return best / 1000, best / base, modules
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    pythonpath = os.path.join(casedir, "../../../../src/statd/python")
+    sys.path.insert(0, pythonpath)
+
+    from yanger.__main__ import MODELS
+
+    with open(os.path.join(casedir, "budget.json"), encoding="utf-8") as f:
+        budget = json.load(f)
+
+    env = dict(os.environ, PYTHONPATH=pythonpath)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    results = {}
+    with test.step("Measure import time of all models"), \
+         tempfile.TemporaryDirectory() as pycache:
+        env["PYTHONPYCACHEPREFIX"] = pycache
+        for model in MODELS:
+            results[model] = measure(model, env, budget.get("repeat", 3))
+            ms, times, _ = results[model]
+            limit = budget["models"].get(model, budget["default"])
+            # print() goes to the TAP stream as a comment
+            print(f"{model:<24} {ms:6.1f} ms {times:5.1f}x (budget {limit}x)")
+
+    for model, (ms, times, modules) in results.items():
+        limit = budget["models"].get(model, budget["default"])
+        with test.step(f"Import of {model} is within budget"):
+            assert times <= limit, \
+                f"{model}: {ms:.1f} ms, {times:.1f}x the interpreter, budget {limit}x"
+
+        with test.step(f"Import of {model} leaves slow modules for later"):
+            eager = sorted(mod for mod in modules for lazy in budget["lazy"]
+                           if mod == lazy or mod.startswith(lazy + "."))
+            assert not eager, f"{model}: imports {', '.join(eager)} eagerly"
+
+    test.succeed()
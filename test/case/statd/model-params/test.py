@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Verify yanger parameters when querying several models
+
+With more than one model, a -p value is given per model, as
+MODEL=PARAM, and must only reach that model.  A value without a model
+is then ambiguous and must be rejected, not handed to every model that
+takes a parameter.  Replays the capture of the containers case.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from infamy.tap import Test
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    pythonpath = os.path.join(casedir, "../../../../src/statd/python")
+    capture = os.path.join(casedir, "../containers/system")
+    sys.path.insert(0, pythonpath)
+
+    from yanger.__main__ import _params
+    from yanger.common import merge
+
+    def yanger(*args, check=True):
+        res = subprocess.run([sys.executable, "-m", "yanger", "-r", capture, *args],
+                             env=dict(os.environ, PYTHONPATH=pythonpath),
+                             capture_output=True, text=True, check=check)
+        return json.loads(res.stdout) if check else res
+
+    with test.step("Map -p values to models"):
+        both = ["ietf-interfaces", "ietf-routing"]
+        assert _params(["ietf-routing"], ["vrf=red"]) == {"ietf-routing": "vrf=red"}
+        assert _params(["ietf-interfaces"], ["e1"]) == {"ietf-interfaces": "e1"}
+        assert _params(both, ["ietf-routing=fib,prefix=10.0.0.0/8"]) == \
+            {"ietf-routing": "fib,prefix=10.0.0.0/8"}
+        assert _params(both, ["ietf-interfaces=e1", "ietf-routing=fib"]) == \
+            {"ietf-interfaces": "e1", "ietf-routing": "fib"}
+        for params in (["e1"], ["fib"], ["ietf-system=x"]):
+            try:
+                _params(both, params)
+            except ValueError:
+                continue
+            raise AssertionError(f"{params} accepted for {both}")
+
+    with test.step("Reject -p without a model when querying several"):
+        res = yanger("-p", "e1", "ietf-interfaces", "ietf-routing", check=False)
+        assert res.returncode == 1, f"exit {res.returncode}: {res.stderr}"
+        assert not res.stdout, f"unexpected output: {res.stdout[:200]}"
+
+    with test.step("Pass -p MODEL=PARAM only to that model"):
+        expected = yanger("ietf-interfaces")
+        merge(expected, yanger("-p", "fib", "ietf-routing"))
+        result = yanger("-p", "ietf-routing=fib", "ietf-interfaces", "ietf-routing")
+        assert result == expected, "merged output differs from per model output"
+
+    test.succeed()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Verify collection of MSTP port state of bridges
+
+The STP state of all ports of a bridge is read with a single mstpctl
+`showportdetail BRIDGE PORT...`, see yanger/ietf_interfaces/bridge.py.
+Should that fail, or not list every port, e.g. one mstpd does not know
+yet, each port is asked for on its own, so only that port goes without
+STP details.  Replays a synthetic capture with one bridge of each kind.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from infamy.tap import Test
+
+
+def link(ifname, master=None):
+    lnk = {"ifname": ifname, "linkinfo": {}}
+    if master:
+        lnk["master"] = master
+        lnk["linkinfo"] = {"info_slave_kind": "bridge",
+                           "info_slave_data": {"state": "forwarding"}}
+    return lnk
+
+
+def detail(num):
+    return {
+        "port-id": f"8.00{num}",
+        "role": "Designated",
+        "disputed": "no",
+        "designated-bridge": "8.000.02:00:00:00:00:01",
+        "designated-port": f"8.00{num}",
+        "oper-edge-port": "yes",
+        "external-path-cost": 20000,
+        "num-rx-bpdu": str(num * 10),
+    }
+
+
+def capture(path):
+    """Capture of br0, answering for all ports, and br1, missing one"""
+    links = [link("br0"), link("br1")]
+    links += [link(f"e{n}", "br0") for n in (1, 2, 3)]
+    links += [link(f"e{n}", "br1") for n in (4, 5, 6)]
+
+    runs = {
+        ("ip", "-s", "-d", "-j", "link", "show"): links,
+        ("mstpctl", "-f", "json", "showportdetail", "br0", "e1", "e2", "e3"):
+            [detail(1), detail(2), detail(3)],
+        # mstpd does not know e6 yet, so it is left out
+        ("mstpctl", "-f", "json", "showportdetail", "br1", "e4", "e5", "e6"):
+            [detail(4), detail(5)],
+        ("mstpctl", "-f", "json", "showportdetail", "br1", "e4"): [detail(4)],
+        ("mstpctl", "-f", "json", "showportdetail", "br1", "e5"): [detail(5)],
+    }
+
+    os.makedirs(os.path.join(path, "run"))
+    with open(os.path.join(path, "timestamp"), "w", encoding="utf-8") as f:
+        f.write("1737726842\n")
+    for cmd, out in runs.items():
+        slug = "_".join(cmd).replace("/", "+").replace(" ", "-")
+        with open(os.path.join(path, "run", slug), "w", encoding="utf-8") as f:
+            json.dump(out, f)
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger import host
+
+    with tempfile.TemporaryDirectory() as tmp:
+        capture(tmp)
+        host.HOST = host.Replayhost(tmp)
+
+        from yanger.ietf_interfaces import bridge
+        from yanger.ietf_interfaces.common import iplinks
+
+        runs = []
+        replay = host.HOST.run
+
+        def run(cmd, *args, **kwargs):
+            runs.append(tuple(cmd))
+            return replay(cmd, *args, **kwargs)
+        host.HOST.run = run
+
+        def mstpctl():
+            return [cmd[4:] for cmd in runs if cmd[0] == "mstpctl"]
+
+        with test.step("Read all ports of a bridge in one call"):
+            for n in (1, 2, 3):
+                stp = bridge.lower_stp(iplinks()[f"e{n}"])
+                assert stp["cist"]["port-id"] == {"priority": 8, "port-id": n}, stp
+                assert stp["cist"]["state"] == "forwarding"
+                assert stp["edge"] is True
+                assert stp["statistics"] == {"in-bpdus": str(n * 10)}
+            assert mstpctl() == [("br0", "e1", "e2", "e3")], mstpctl()
+
+        with test.step("Fall back to one call per port on mismatch"):
+            runs.clear()
+            for n in (4, 5):
+                stp = bridge.lower_stp(iplinks()[f"e{n}"])
+                assert stp["cist"]["port-id"] == {"priority": 8, "port-id": n}, stp
+            assert mstpctl() == [("br1", "e4", "e5", "e6"), ("br1", "e4"),
+                                 ("br1", "e5"), ("br1", "e6")], mstpctl()
+
+        with test.step("Only the port unknown to mstpd goes without"):
+            stp = bridge.lower_stp(iplinks()["e6"])
+            assert stp == {"cist": {"state": "forwarding"}}, stp
+
+    test.succeed()
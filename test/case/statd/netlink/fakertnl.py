@@ -0,0 +1,121 @@
+"""Stand-in for the kernel side of an rtnetlink socket
+
+Answers requests with canned messages, by request type, the way the
+kernel does: dumps in several reads, NLM_F_MULTI set, and ended by
+NLMSG_DONE.  A RTM_GETLINK that is not a dump gets the link asked for,
+by name or index, or ENODEV.  Canned messages are built with the
+helpers below, e.g.
+
+    link = msg(RTM_NEWLINK, ifinfomsg(...) + attr(IFLA_IFNAME, b"e1\\0"))
+
+Install it with `install(netlink, replies)`, where replies map each
+request type to its list of reply messages.
+"""
+import errno
+import struct
+
+NLM_F_MULTI = 0x002
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_GETLINK = 18
+IFLA_IFNAME = 3
+
+# Messages per read, like a dump filling the receive buffer
+BATCH = 4
+
+
+def attr(atype, payload):
+    return struct.pack("=HH", 4 + len(payload), atype) + payload + \
+        bytes(-len(payload) % 4)
+
+
+def nest(atype, *attrs):
+    return attr(atype, b"".join(attrs))
+
+
+def msg(mtype, body):
+    """Reply message of mtype, header filled in when sent"""
+    return mtype, body
+
+
+def _attrs(data):
+    tb, off = {}, 0
+    while off + 4 <= len(data):
+        alen, atype = struct.unpack_from("=HH", data, off)
+        if alen < 4:
+            break
+        tb[atype & 0x3fff] = data[off + 4:off + alen]
+        off += (alen + 3) & ~3
+    return tb
+
+
+class FakeRtnl:
+    def __init__(self, replies, requests=None):
+        self.replies = replies
+        self.requests = [] if requests is None else requests
+        self.pending = []
+
+    def _pack(self, mtype, flags, seq, body):
+        return struct.pack("=IHHII", 16 + len(body), mtype, flags, seq, 0) + body
+
+    def _link(self, body):
+        """The link asked for by a RTM_GETLINK that is not a dump"""
+        index = struct.unpack_from("=i", body, 4)[0]
+        name = _attrs(body[16:]).get(IFLA_IFNAME)
+        for mtype, link in self.replies.get(RTM_GETLINK, []):
+            if index and struct.unpack_from("=i", link, 4)[0] == index:
+                return mtype, link
+            if name and _attrs(link[16:]).get(IFLA_IFNAME) == name:
+                return mtype, link
+        return None
+
+    def reply(self, mtype, body):
+        """The reply to a request that is not a dump, None for ENODEV"""
+        if mtype == RTM_GETLINK:
+            return self._link(body)
+        return None
+
+    def dump(self, mtype, body):
+        """The replies to a dump request"""
+        return self.replies.get(mtype, [])
+
+    def send(self, data):
+        _, mtype, flags, seq, _ = struct.unpack_from("=IHHII", data)
+        body = data[16:]
+        self.requests.append((mtype, flags, body))
+
+        if not flags & NLM_F_DUMP:
+            if reply := self.reply(mtype, body):
+                self.pending.append(self._pack(reply[0], 0, seq, reply[1]))
+            else:
+                err = struct.pack("=i", -errno.ENODEV) + data[:16]
+                self.pending.append(self._pack(NLMSG_ERROR, 0, seq, err))
+            return len(data)
+
+        msgs = [self._pack(rtype, NLM_F_MULTI, seq, rbody)
+                for rtype, rbody in self.dump(mtype, body)]
+        msgs.append(self._pack(NLMSG_DONE, NLM_F_MULTI, seq, struct.pack("=i", 0)))
+        for i in range(0, len(msgs), BATCH):
+            self.pending.append(b"".join(msgs[i:i + BATCH]))
+        return len(data)
+
+    def recv(self, _bufsize):
+        return self.pending.pop(0)
+
+    def close(self):
+        pass
+
+
+def install(netlink, replies, cls=FakeRtnl):
+    """Have all Netlink sockets of the netlink module talk to a FakeRtnl
+
+    Each socket gets its own, as dumps on several of them may be read
+    interleaved, but they all log requests to the one returned.  Other
+    netlink families can be faked by a subclass, cls, that overrides
+    `reply()` and `dump()`.
+    """
+    fake = cls(replies)
+    netlink.Netlink._open = lambda self: cls(replies, fake.requests)
+    return fake
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Verify the native rtnetlink client against ip(8)
+
+On the running system, yanger dumps links, addresses and neighbors
+with rtnetlink, see yanger/netlink.py, instead of running `ip -j`.
+Replays run ip, so they never get here.  Every link and address of the
+interfaces-all capture, and a bond with two LACP members, is sent as
+the kernel would, see fakertnl.py, and the decoded objects must be the
+same as ip -s -d -j prints them, field by field.
+"""
+
+import json
+import os
+import re
+import socket
+import struct
+import sys
+
+from infamy.tap import Test
+
+import fakertnl
+from fakertnl import attr, msg, nest
+
+RTM_NEWLINK, RTM_GETLINK = 16, 18
+RTM_NEWADDR, RTM_GETADDR = 20, 22
+RTM_NEWNEIGH, RTM_GETNEIGH = 28, 30
+
+IFF = {"UP": 0x1, "BROADCAST": 0x2, "LOOPBACK": 0x8, "POINTOPOINT": 0x10,
+       "NOARP": 0x80, "PROMISC": 0x100, "ALLMULTI": 0x200, "MASTER": 0x400,
+       "SLAVE": 0x800, "MULTICAST": 0x1000, "LOWER_UP": 0x10000,
+       "DORMANT": 0x20000}
+IFF_RUNNING = 0x40
+ARPHRD = {"ether": 1, "loopback": 772, "gre": 778, "gre6": 823}
+OPERSTATES = ["UNKNOWN", "NOTPRESENT", "DOWN", "LOWERLAYERDOWN",
+              "TESTING", "DORMANT", "UP"]
+
+EXTRA = """\
+[
+  {"ifindex": 30, "ifname": "lag0",
+   "flags": ["BROADCAST", "MULTICAST", "MASTER", "UP", "LOWER_UP"],
+   "mtu": 1500, "qdisc": "noqueue", "operstate": "UP", "linkmode": "DEFAULT",
+   "group": "default", "txqlen": 1000, "link_type": "ether",
+   "address": "00:a0:85:00:03:08", "broadcast": "ff:ff:ff:ff:ff:ff",
+   "promiscuity": 0, "allmulti": 0, "min_mtu": 68, "max_mtu": 65535,
+   "linkinfo": {"info_kind": "bond", "info_data": {
+     "mode": "802.3ad", "miimon": 100, "updelay": 0, "downdelay": 0,
+     "peer_notify_delay": 0, "use_carrier": 1, "arp_interval": 0,
+     "arp_missed_max": 2, "arp_validate": null, "arp_all_targets": "any",
+     "primary_reselect": "always", "fail_over_mac": "none",
+     "xmit_hash_policy": "layer3+4", "resend_igmp": 1, "num_peer_notif": 1,
+     "all_slaves_active": 0, "min_links": 1, "lp_interval": 1,
+     "packets_per_slave": 1, "ad_lacp_active": "on", "ad_lacp_rate": "fast",
+     "ad_select": "stable",
+     "ad_info": {"aggregator": 1, "num_ports": 2, "actor_key": 9,
+                 "partner_key": 9, "partner_mac": "00:a0:85:00:04:00"},
+     "ad_actor_sys_prio": 65535, "ad_user_port_key": 0,
+     "ad_actor_system": "00:00:00:00:00:00", "tlb_dynamic_lb": 1}},
+   "num_tx_queues": 16, "num_rx_queues": 16,
+   "stats64": {"rx": {"bytes": 9120, "packets": 76, "errors": 0, "dropped": 0,
+                      "over_errors": 0, "multicast": 76},
+               "tx": {"bytes": 9240, "packets": 77, "errors": 0, "dropped": 0,
+                      "carrier_errors": 0, "collisions": 0}}},
+  {"ifindex": 31, "ifname": "e8",
+   "flags": ["BROADCAST", "MULTICAST", "SLAVE", "UP", "LOWER_UP"],
+   "mtu": 1500, "qdisc": "pfifo_fast", "master": "lag0", "operstate": "UP",
+   "linkmode": "DEFAULT", "group": "port", "txqlen": 1000,
+   "link_type": "ether", "address": "00:a0:85:00:03:08",
+   "broadcast": "ff:ff:ff:ff:ff:ff", "promiscuity": 0, "allmulti": 0,
+   "min_mtu": 68, "max_mtu": 65535,
+   "linkinfo": {"info_slave_kind": "bond", "info_slave_data": {
+     "state": "ACTIVE", "mii_status": "UP", "link_failure_count": 0,
+     "perm_hwaddr": "00:a0:85:00:03:08", "queue_id": 0, "prio": 0,
+     "ad_aggregator_id": 1, "ad_actor_oper_port_state": 61,
+     "ad_actor_oper_port_state_str": ["active", "aggregating", "in_sync",
+                                      "collecting", "distributing"],
+     "ad_partner_oper_port_state": 61,
+     "ad_partner_oper_port_state_str": ["active", "aggregating", "in_sync",
+                                        "collecting", "distributing"]}},
+   "num_tx_queues": 1, "num_rx_queues": 1,
+   "parentbus": "virtio", "parentdev": "virtio7",
+   "stats64": {"rx": {"bytes": 4560, "packets": 38, "errors": 0, "dropped": 0,
+                      "over_errors": 0, "multicast": 38},
+               "tx": {"bytes": 4620, "packets": 39, "errors": 0, "dropped": 0,
+                      "carrier_errors": 0, "collisions": 0}}},
+  {"ifindex": 32, "ifname": "e9",
+   "flags": ["NO-CARRIER", "BROADCAST", "MULTICAST", "SLAVE", "UP"],
+   "mtu": 1500, "qdisc": "pfifo_fast", "master": "lag0", "operstate": "DOWN",
+   "linkmode": "DEFAULT", "group": "port", "txqlen": 1000,
+   "link_type": "ether", "address": "00:a0:85:00:03:08",
+   "permaddr": "00:a0:85:00:03:09", "broadcast": "ff:ff:ff:ff:ff:ff",
+   "promiscuity": 0, "allmulti": 0, "min_mtu": 68, "max_mtu": 65535,
+   "linkinfo": {"info_slave_kind": "bond", "info_slave_data": {
+     "state": "BACKUP", "mii_status": "DOWN", "link_failure_count": 3,
+     "perm_hwaddr": "00:a0:85:00:03:09", "queue_id": 0, "prio": 0,
+     "ad_aggregator_id": 2, "ad_actor_oper_port_state": 71,
+     "ad_actor_oper_port_state_str": ["active", "short_timeout",
+                                      "aggregating", "defaulted"],
+     "ad_partner_oper_port_state": 1,
+     "ad_partner_oper_port_state_str": ["active"]}},
+   "num_tx_queues": 1, "num_rx_queues": 1,
+   "parentbus": "virtio", "parentdev": "virtio8",
+   "stats64": {"rx": {"bytes": 0, "packets": 0, "errors": 0, "dropped": 0,
+                      "over_errors": 0, "multicast": 0},
+               "tx": {"bytes": 0, "packets": 0, "errors": 0, "dropped": 0,
+                      "carrier_errors": 0, "collisions": 0}}},
+  {"ifindex": 33, "link_index": 2, "ifname": "veth0c",
+   "flags": ["BROADCAST", "MULTICAST", "UP", "LOWER_UP"], "mtu": 1500,
+   "qdisc": "noqueue", "operstate": "UP", "linkmode": "DEFAULT",
+   "group": "default", "txqlen": 1000, "link_type": "ether",
+   "address": "d2:5c:3a:11:22:33", "broadcast": "ff:ff:ff:ff:ff:ff",
+   "link_netnsid": 0, "promiscuity": 0, "allmulti": 0, "min_mtu": 68,
+   "max_mtu": 65535, "linkinfo": {"info_kind": "veth"},
+   "num_tx_queues": 1, "num_rx_queues": 1,
+   "stats64": {"rx": {"bytes": 0, "packets": 0, "errors": 0, "dropped": 0,
+                      "over_errors": 0, "multicast": 0},
+               "tx": {"bytes": 0, "packets": 0, "errors": 0, "dropped": 0,
+                      "carrier_errors": 0, "collisions": 0}}}
+]
+"""
+
+# ip -j neigh show, and what the kernel dumps for it, the last two
+# are left out by ip: NOARP, and a bridge FDB entry
+NEIGHS = """\
+[
+  {"dst": "192.168.20.2", "dev": "br-D", "lladdr": "00:a0:85:00:04:01",
+   "state": ["REACHABLE"]},
+  {"dst": "fe80::2a0:85ff:fe00:401", "dev": "br-D",
+   "lladdr": "00:a0:85:00:04:01", "router": null, "state": ["STALE"]},
+  {"dst": "10.0.0.42", "dev": "br-D", "state": ["FAILED"]},
+  {"dst": "2001:db8::2", "dev": "gre-v6", "lladdr": "00:a0:85:00:04:02",
+   "state": ["PERMANENT"]}
+]
+"""
+NEIGH_MSGS = [
+    # family, ifindex, state, flags, dst, lladdr
+    (socket.AF_INET, 15, 0x02, 0, "192.168.20.2", "00:a0:85:00:04:01"),
+    (socket.AF_INET6, 15, 0x04, 0x80, "fe80::2a0:85ff:fe00:401", "00:a0:85:00:04:01"),
+    (socket.AF_INET, 15, 0x20, 0, "10.0.0.42", None),
+    (socket.AF_INET6, 20, 0x80, 0, "2001:db8::2", "00:a0:85:00:04:02"),
+    (socket.AF_INET, 19, 0x40, 0, "192.168.20.2", None),
+    (socket.AF_BRIDGE, 4, 0x80, 0x02, None, "00:a0:85:00:04:03"),
+]
+
+
+def u8(val):
+    return struct.pack("=B", val)
+
+def u16(val):
+    return struct.pack("=H", val)
+
+def u32(val):
+    return struct.pack("=I", val)
+
+def s32(val):
+    return struct.pack("=i", val)
+
+def u64(val):
+    return struct.pack("=Q", val)
+
+def be16(val):
+    return struct.pack("!H", val)
+
+def string(val):
+    return val.encode() + b"\0"
+
+def inet(val):
+    family = socket.AF_INET6 if ":" in val else socket.AF_INET
+    return socket.inet_pton(family, val)
+
+def lladdr(val):
+    if re.fullmatch(r"([0-9a-f]{2}:){5}[0-9a-f]{2}", val):
+        return bytes.fromhex(val.replace(":", ""))
+    return inet(val)
+
+def brid(val):
+    # As ip prints it, e.g. 8000.0:a0:85:0:3:0
+    prio, addr = val.split(".")
+    return bytes.fromhex(prio) + bytes(int(b, 16) for b in addr.split(":"))
+
+def enum(*names):
+    return lambda val: u8(names.index(val))
+
+def ethp(val):
+    return be16({"802.1Q": 0x8100, "802.1ad": 0x88a8}[val])
+
+def hexnum(pack):
+    return lambda val: pack(int(val, 16))
+
+def names(path, builtin):
+    """iproute2 number -> name table, as installed on target"""
+    table = dict(builtin)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split("#", 1)[0].split()
+            if len(fields) >= 2:
+                table[int(fields[0], 0)] = fields[1]
+    return table
+
+
+# ip -d key -> (IFLA_*_ attribute type, encoder), of the attributes
+# yanger decodes, per link kind, from include/uapi/linux/if_link.h
+INFO_DATA = {
+    "bridge": {
+        "forward_delay": (1, u32), "hello_time": (2, u32), "max_age": (3, u32),
+        "ageing_time": (4, u32), "stp_state": (5, u32), "priority": (6, u16),
+        "vlan_filtering": (7, u8), "vlan_protocol": (8, ethp),
+        "group_fwd_mask": (9, hexnum(u16)), "root_id": (10, brid),
+        "bridge_id": (11, brid), "root_port": (12, u16),
+        "root_path_cost": (13, u32), "topology_change": (14, u8),
+        "topology_change_detected": (15, u8), "group_addr": (20, lladdr),
+        "mcast_router": (22, u8), "mcast_snooping": (23, u8),
+        "mcast_query_use_ifaddr": (24, u8), "mcast_querier": (25, u8),
+        "mcast_hash_elasticity": (26, u32), "mcast_hash_max": (27, u32),
+        "mcast_last_member_cnt": (28, u32), "mcast_startup_query_cnt": (29, u32),
+        "mcast_last_member_intvl": (30, u64), "mcast_membership_intvl": (31, u64),
+        "mcast_querier_intvl": (32, u64), "mcast_query_intvl": (33, u64),
+        "mcast_query_response_intvl": (34, u64),
+        "mcast_startup_query_intvl": (35, u64), "nf_call_iptables": (36, u8),
+        "nf_call_ip6tables": (37, u8), "nf_call_arptables": (38, u8),
+        "vlan_default_pvid": (39, u16), "vlan_stats_enabled": (41, u8),
+        "mcast_stats_enabled": (42, u8), "mcast_igmp_version": (43, u8),
+        "mcast_mld_version": (44, u8), "vlan_stats_per_port": (45, u8),
+    },
+    "bond": {
+        "mode": (1, enum("balance-rr", "active-backup", "balance-xor",
+                         "broadcast", "802.3ad", "balance-tlb", "balance-alb")),
+        "miimon": (3, u32), "updelay": (4, u32), "downdelay": (5, u32),
+        "use_carrier": (6, u8),
+        "xmit_hash_policy": (14, enum("layer2", "layer3+4", "layer2+3",
+                                      "encap2+3", "encap3+4", "vlan+srcmac")),
+        "min_links": (18, u32), "ad_lacp_rate": (21, enum("slow", "fast")),
+        "ad_info": (23, lambda v: b"".join((
+            attr(1, u16(v["aggregator"])), attr(2, u16(v["num_ports"])),
+            attr(3, u16(v["actor_key"])), attr(4, u16(v["partner_key"])),
+            attr(5, lladdr(v["partner_mac"]))))),
+        "ad_actor_sys_prio": (24, u16), "ad_lacp_active": (29, enum("off", "on")),
+    },
+    "vlan": {"id": (1, u16), "protocol": (5, ethp),
+             "flags": (2, lambda v: u32(1 if "REORDER_HDR" in v else 0) + u32(0xffffffff))},
+    "gre": {"local": (6, inet), "remote": (7, inet), "ttl": (8, u8),
+            "pmtudisc": (10, u8)},
+    "ip6gre": {"local": (6, inet), "remote": (7, inet), "ttl": (8, u8),
+               "encap_limit": (11, u8)},
+    "vxlan": {"id": (1, u32), "remote": (2, inet), "group": (2, inet),
+              "local": (4, inet), "ttl": (5, u8), "learning": (7, u8),
+              "port": (15, be16), "remote6": (16, inet), "group6": (16, inet),
+              "local6": (17, inet)},
+}
+# Decoded from IFLA_BR_MULTI_BOOLOPT, see linkinfo()
+INFO_DATA["bridge"].update(no_linklocal_learn=None, mcast_vlan_snooping=None)
+INFO_DATA["gretap"] = INFO_DATA["gre"]
+INFO_DATA["ip6gretap"] = INFO_DATA["ip6gre"]
+
+INFO_SLAVE_DATA = {
+    "bridge": {
+        "state": (1, enum("disabled", "listening", "learning", "forwarding",
+                          "blocking")),
+        "priority": (2, u16), "cost": (3, u32), "hairpin": (4, u8),
+        "guard": (5, u8), "root_block": (6, u8), "fastleave": (7, u8),
+        "learning": (8, u8), "flood": (9, u8), "proxy_arp": (10, u8),
+        "proxy_arp_wifi": (12, u8), "root_id": (13, brid),
+        "bridge_id": (14, brid), "designated_port": (15, u16),
+        "designated_cost": (16, u16), "id": (17, hexnum(u16)),
+        "no": (18, hexnum(u16)), "topology_change_ack": (19, u8),
+        "config_pending": (20, u8), "multicast_router": (25, u8),
+        "mcast_flood": (27, u8), "mcast_to_unicast": (28, u8),
+        "vlan_tunnel": (29, u8), "bcast_flood": (30, u8),
+        "neigh_suppress": (32, u8), "isolated": (33, u8), "locked": (39, u8),
+    },
+    "bond": {
+        "state": (1, enum("ACTIVE", "BACKUP")),
+        "mii_status": (2, enum("UP", "GOING_DOWN", "DOWN", "GOING_BACK")),
+        "link_failure_count": (3, u32), "perm_hwaddr": (4, lladdr),
+        "queue_id": (5, u16), "ad_aggregator_id": (6, u16),
+        # The kernel sends the actor state as u8, the partner as u16
+        "ad_actor_oper_port_state": (7, u8),
+        "ad_partner_oper_port_state": (8, u16),
+    },
+}
+
+# Attributes yanger decodes as is, ip key -> (IFLA_*, encoder)
+IFLA = {
+    "ifname": (3, string), "mtu": (4, u32), "qdisc": (6, string),
+    "txqlen": (13, u32), "operstate": (16, lambda v: u8(OPERSTATES.index(v))),
+    "linkmode": (17, enum("DEFAULT", "DORMANT", "TESTING")),
+    "ifalias": (20, string), "promiscuity": (30, u32),
+    "num_tx_queues": (31, u32), "num_rx_queues": (32, u32),
+    "link_netnsid": (37, s32), "min_mtu": (50, u32), "max_mtu": (51, u32),
+    "parentdev": (56, string), "parentbus": (57, string), "allmulti": (61, u32),
+    "address": (1, lladdr), "broadcast": (2, lladdr), "permaddr": (54, lladdr),
+}
+
+STATS64 = ("rx_packets", "tx_packets", "rx_bytes", "tx_bytes", "rx_errors",
+           "tx_errors", "rx_dropped", "tx_dropped", "multicast", "collisions",
+           "rx_length_errors", "rx_over_errors", "rx_crc_errors",
+           "rx_frame_errors", "rx_fifo_errors", "rx_missed_errors",
+           "tx_aborted_errors", "tx_carrier_errors", "tx_fifo_errors",
+           "tx_heartbeat_errors", "tx_window_errors", "rx_compressed",
+           "tx_compressed", "rx_nohandler", "rx_otherhost_dropped")
+
+
+def stats64(stats):
+    vals = dict.fromkeys(STATS64, 0)
+    for key, val in stats["rx"].items():
+        vals["multicast" if key == "multicast" else f"rx_{key}"] = val
+    for key, val in stats["tx"].items():
+        vals["collisions" if key == "collisions" else f"tx_{key}"] = val
+    return struct.pack(f"={len(STATS64)}Q", *(vals[key] for key in STATS64))
+
+
+def info_data(spec, data):
+    return b"".join(attr(spec[key][0], spec[key][1](val))
+                    for key, val in data.items() if spec.get(key))
+
+
+def linkinfo(info):
+    attrs = []
+    if kind := info.get("info_kind"):
+        attrs.append(attr(1, string(kind)))
+        if kind in INFO_DATA and "info_data" in info:
+            data = info["info_data"]
+            payload = info_data(INFO_DATA[kind], data)
+            if kind == "bridge":
+                # IFLA_BR_MULTI_BOOLOPT, struct br_boolopt_multi
+                boolopt = data["no_linklocal_learn"] | data["mcast_vlan_snooping"] << 1
+                payload += attr(46, u32(boolopt) + u32(3))
+            attrs.append(nest(2, payload))
+    if kind := info.get("info_slave_kind"):
+        attrs.append(attr(4, string(kind)))
+        attrs.append(nest(5, info_data(INFO_SLAVE_DATA[kind], info["info_slave_data"])))
+    return nest(18, *attrs)
+
+
+def link_msg(link, index, groups):
+    """RTM_NEWLINK of link, as printed by ip -s -d -j link show"""
+    flags = sum(IFF[flag] for flag in link["flags"] if flag in IFF)
+    if "NO-CARRIER" not in link["flags"]:
+        flags |= IFF_RUNNING
+
+    attrs = [attr(atype, fn(link[key])) for key, (atype, fn) in IFLA.items()
+             if key in link]
+    attrs.append(attr(27, u32(groups[link["group"]])))
+    if "link" in link:
+        attrs.append(attr(5, s32(index[link["link"]] if link["link"] else 0)))
+    if "link_index" in link:
+        attrs.append(attr(5, s32(link["link_index"])))
+    if "master" in link:
+        attrs.append(attr(10, u32(index[link["master"]])))
+    if "linkinfo" in link:
+        attrs.append(linkinfo(link["linkinfo"]))
+    if "stats64" in link:
+        attrs.append(attr(23, stats64(link["stats64"])))
+
+    body = struct.pack("=BxHiII", socket.AF_UNSPEC, ARPHRD[link["link_type"]],
+                       link["ifindex"], flags, 0)
+    return msg(RTM_NEWLINK, body + b"".join(attrs))
+
+
+def addr_msgs(entry, protos):
+    """RTM_NEWADDRs of an entry of ip -j addr show"""
+    for addr in entry["addr_info"]:
+        family = socket.AF_INET if addr["family"] == "inet" else socket.AF_INET6
+        scope = {"global": 0, "link": 253, "host": 254}[addr["scope"]]
+        flags = 0 if addr.get("dynamic") else 0x80
+
+        attrs = [attr(1, inet(addr["local"]))]
+        if family == socket.AF_INET:
+            attrs.append(attr(2, inet(addr["local"])))
+        if "label" in addr:
+            attrs.append(attr(3, string(addr["label"])))
+        attrs.append(attr(6, struct.pack("=IIII", addr["preferred_life_time"],
+                                         addr["valid_life_time"], 100, 100)))
+        attrs.append(attr(8, u32(flags)))
+        attrs.append(attr(11, u8(protos[addr["protocol"]])))
+
+        body = struct.pack("=BBBBi", family, addr["prefixlen"], flags, scope,
+                           entry["ifindex"])
+        yield msg(RTM_NEWADDR, body + b"".join(attrs))
+
+
+def neigh_msg(family, ifindex, state, flags, dst, mac):
+    attrs = []
+    if dst:
+        attrs.append(attr(1, inet(dst)))
+    if mac:
+        attrs.append(attr(2, lladdr(mac)))
+    body = struct.pack("=BxxxiHBB", family, ifindex, state, flags, 1)
+    return msg(RTM_NEWNEIGH, body + b"".join(attrs))
+
+
+def expected_info(spec, data):
+    """The part of an ip -d info_data that yanger decodes"""
+    return {key: val for key, val in data.items()
+            if key in spec or (key.endswith("_str") and key[:-4] in spec)}
+
+
+def same_link(native, link, keys):
+    """Compare a decoded link with ip's, field by field"""
+    for key in keys:
+        if key not in link:
+            assert key not in native, f"{link['ifname']}: {key} = {native[key]!r}"
+            continue
+        if key == "linkinfo":
+            info = dict(native["linkinfo"])
+            for what, specs in (("info_data", INFO_DATA),
+                                ("info_slave_data", INFO_SLAVE_DATA)):
+                kind = link["linkinfo"].get(what.replace("data", "kind"))
+                if what in link["linkinfo"] and kind in specs:
+                    exp = expected_info(specs[kind], link["linkinfo"][what])
+                    got = info.pop(what, None)
+                    assert got == exp, f"{link['ifname']} {what}: {got} != {exp}"
+            exp = {k: v for k, v in link["linkinfo"].items()
+                   if k.endswith("_kind")}
+            assert info == exp, f"{link['ifname']} linkinfo: {info} != {exp}"
+            continue
+        assert key in native, f"{link['ifname']}: no {key}"
+        assert native[key] == link[key], \
+            f"{link['ifname']} {key}: {native[key]!r} != {link[key]!r}"
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+    capture = os.path.join(casedir, "../interfaces-all/system/run")
+    iproute2 = os.path.join(casedir, "../../../../board/common/rootfs/etc/iproute2")
+
+    from yanger import netlink
+
+    with open(os.path.join(capture, "ip_-s_-d_-j_link_show"), encoding="utf-8") as f:
+        links = json.load(f) + json.loads(EXTRA)
+    with open(os.path.join(capture, "ip_-j_addr_show"), encoding="utf-8") as f:
+        addrs = json.load(f)
+
+    groups = names(os.path.join(iproute2, "group"), {0: "default"})
+    protos = names(os.path.join(iproute2, "rt_addrprotos"), {})
+    netlink._TABLES["group"] = groups
+    netlink._TABLES["rt_addrprotos"] = protos
+
+    index = {link["ifname"]: link["ifindex"] for link in links}
+    groups = {name: num for num, name in groups.items()}
+    protos = {name: num for num, name in protos.items()}
+    fake = fakertnl.install(netlink, {
+        RTM_GETLINK: [link_msg(link, index, groups) for link in links],
+        RTM_GETADDR: [m for entry in addrs for m in addr_msgs(entry, protos)],
+        RTM_GETNEIGH: [neigh_msg(*n) for n in NEIGH_MSGS],
+    })
+    keys = netlink.Link.KEYS
+
+    with test.step("Decode all links like ip -s -d -j link show"):
+        native = netlink.iplinks()
+        assert [link["ifname"] for link in native] == list(index)
+        for nlink, link in zip(native, links):
+            same_link(nlink, link, keys)
+
+    with test.step("Decode bonds and their LACP members"):
+        bonds = [(n, l) for n, l in zip(native, links)
+                 if "bond" in l.get("linkinfo", {}).values()]
+        assert len(bonds) == 3
+        for nlink, link in bonds:
+            same_link(nlink, link, ["linkinfo", "master", "permaddr"])
+
+    with test.step("Look up one link, with its master and lower link"):
+        for ifname in ("e2.30", "veth0b", "e9"):
+            fake.requests.clear()
+            native = netlink.iplinks(ifname)
+            link = next(link for link in links if link["ifname"] == ifname)
+            assert len(native) == 1, native
+            same_link(native[0], link, keys)
+            assert not any(flags & fakertnl.NLM_F_DUMP
+                           for _, flags, _ in fake.requests), fake.requests
+
+    with test.step("Decode addresses like ip -j addr show"):
+        native = netlink.ipaddrs()
+        assert native[:len(addrs)] == addrs
+        # Not in the capture, and without addresses
+        assert [entry["addr_info"] for entry in native[len(addrs):]] == [[]] * 4
+
+        entry = next(entry for entry in addrs if entry["ifname"] == "br-D")
+        assert netlink.ipaddrs("br-D") == [entry]
+
+    with test.step("Decode neighbors like ip -j neigh show"):
+        expected = json.loads(NEIGHS)
+        assert netlink.ipneighs() == expected, netlink.ipneighs()
+        assert netlink.ipneighs("gre-v6") == expected[3:]
+
+    test.succeed()
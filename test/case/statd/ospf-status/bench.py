@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Benchmark the OSPF area/interface/neighbor join of ospf-status
+
+Generates synthetic FRR output, `show ip ospf interface json`, `show ip
+ospf json` and `show ip ospf neighbor detail json`, for hub routers
+with many areas, interfaces and neighbors, and times `transform()` on
+it.  The join used to be quadratic, reference() is that implementation,
+kept to verify that the result is identical and to compare with.
+
+usage: bench.py [-r] [INTERFACES ...]
+
+  -r      Also time, and compare with, the reference implementation
+"""
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+PYTHONPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "../../../../src/statd/python")
+sys.path.insert(0, PYTHONPATH)
+
+from ospf_status.ospf_status import transform   # noqa: E402
+
+SUFFIX = {"normal": "", "nssa": " [NSSA]", "stub": " [Stub]"}
+
+
+def topology(count, seed=None):
+    """FRR output for count interfaces, in count // 10 areas, with a few
+    neighbors each, as (interfaces, ospf, neighbors)
+    """
+    rng = random.Random(count if seed is None else seed)
+    areas = [f"0.0.{i >> 8}.{i & 255}" for i in range(max(count // 10, 1))]
+    kinds = {area: rng.choice(list(SUFFIX)) for area in areas}
+
+    ospf = {"routerId": "10.0.0.1", "areas": {area: {"backbone": area == "0.0.0.0"}
+                                              for area in areas}}
+    interfaces = {}
+    neighbors = {}
+    for i in range(count):
+        ifname = f"e{i}"
+        area = rng.choice(areas + ["9.9.9.9"])     # Some in unknown areas
+        iface = {
+            "ifUp": True,
+            "ospfEnabled": rng.random() > 0.05,
+            "networkType": rng.choice(["BROADCAST", "POINTOPOINT"]),
+            "cost": 10,
+        }
+        if rng.random() > 0.02:
+            iface["area"] = area + SUFFIX[kinds.get(area, "normal")]
+        interfaces[ifname] = iface
+
+        for _ in range(rng.randrange(4)):
+            address = f"10.{i >> 8 & 255}.{i & 255}.{rng.randrange(2, 254)}"
+            nbr = {
+                "ifaceName": ifname,
+                "areaId": area + SUFFIX[kinds.get(area, "normal")],
+                "nbrState": "Full/DR",
+                "routerId": address,
+            }
+            neighbors.setdefault(address, []).append(nbr)
+
+    return {"interfaces": interfaces}, ospf, {"neighbors": neighbors}
+
+
+def reference(interfaces, ospf, neighbors):
+    """The original, O(interfaces * areas * neighbors), join"""
+    for ifname, iface in interfaces["interfaces"].items():
+        iface["name"] = ifname
+        iface["neighbors"] = []
+
+        if not iface.get("ospfEnabled", False) or not iface.get("area"):
+            continue
+
+        for area_id in ospf["areas"]:
+            if "NSSA" in iface["area"]:
+                iface_area_id = iface["area"][:-7]
+                area_type = "nssa-area"
+            elif "Stub" in iface["area"]:
+                iface_area_id = iface["area"][:-7]
+                iface["areaId"] = iface["area"][:-7]
+                area_type = "stub-area"
+            else:
+                iface_area_id = iface["area"]
+                area_type = "normal-area"
+
+            if iface_area_id != area_id:
+                continue
+
+            ospf["areas"][area_id]["area-type"] = area_type
+            iface["area"] = iface_area_id
+
+            for address, entries in neighbors["neighbors"].items():
+                for nbr in entries:
+                    if "NSSA" in nbr.get("areaId", {}) or "Stub" in nbr.get("areaId", {}):
+                        nbr["areaId"] = nbr["areaId"][:-7]
+
+                    if nbr["ifaceName"] != ifname or area_id != nbr.get("areaId"):
+                        continue
+                    nbr["neighborIp"] = address
+                    iface["neighbors"].append(nbr)
+
+            if not ospf["areas"][area_id].get("interfaces", None):
+                ospf["areas"][area_id]["interfaces"] = []
+            ospf["areas"][area_id]["interfaces"].append(iface)
+
+    return ospf
+
+
+def timed(fn, data):
+    data = copy.deepcopy(data)
+    start = time.perf_counter()
+    result = fn(*data)
+    return time.perf_counter() - start, json.dumps(result)
+
+
+def main(argv):
+    ref = "-r" in argv
+    counts = [int(arg) for arg in argv if arg != "-r"] or [100, 1000, 5000]
+
+    status = 0
+    for count in counts:
+        data = topology(count)
+        secs, out = timed(transform, data)
+        line = f"{count:>6} interfaces  {secs * 1000:9.1f} ms"
+        if ref:
+            rsecs, rout = timed(reference, data)
+            same = "identical" if out == rout else "DIFFERENT"
+            status |= out != rout
+            line += f"  reference {rsecs * 1000:9.1f} ms  {same}"
+        print(line)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Verify the OSPF join of ospf-status
+
+The areas, interfaces and neighbors reported by FRR are joined by
+`transform()`.  Its output for input.json, covering normal, NSSA and
+stub areas, disabled interfaces, and interfaces and neighbors in other
+or unknown areas, must match expected.json exactly.  For synthetic hub
+router topologies, see bench.py, it must be identical to that of the
+original, quadratic, implementation.  ospf-status itself must run all
+commands in one session with ospfd, over its VTY socket, faked here,
+and print nothing if ospfd is not running.
+"""
+
+import contextlib
+import copy
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+from infamy.tap import Test
+
+
+class FakeOspfd:
+    """VTY socket of ospfd, replies to each command from input.json"""
+
+    def __init__(self, path, replies):
+        self.replies = replies
+        self.sessions = []
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(1)
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        conn, _ = self.sock.accept()
+        cmds, buf = [], b""
+        self.sessions.append(cmds)
+        with conn:
+            while data := conn.recv(4096):
+                buf += data
+                while b"\0" in buf:
+                    cmd, buf = buf.split(b"\0", 1)
+                    cmds.append(cmd.decode())
+                    out = json.dumps(self.replies[cmds[-1]]).encode()
+                    conn.sendall(out + b"\0\0\0\0")
+
+    def close(self):
+        self.sock.close()
+        self.thread.join(5)
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, casedir)
+
+    from bench import reference, topology, transform
+
+    def load(name):
+        with open(os.path.join(casedir, name), encoding="utf-8") as f:
+            return json.load(f)
+
+    with test.step("Join FRR output like expected.json"):
+        data = load("input.json")
+        result = transform(data["interfaces"], data["ospf"], data["neighbors"])
+        assert json.dumps(result) == json.dumps(load("expected.json")), \
+            f"unexpected output: {json.dumps(result, indent=2)}"
+
+    for count in (10, 200, 1000):
+        with test.step(f"Join {count} interfaces like the reference"):
+            data = topology(count)
+            result = transform(*copy.deepcopy(data))
+            assert json.dumps(result) == json.dumps(reference(*data)), \
+                f"output for {count} interfaces differs from reference"
+
+    from ospf_status import ospf_status
+    from yanger import frr
+
+    def run():
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ospf_status.main()
+        return out.getvalue()
+
+    with tempfile.TemporaryDirectory() as vtydir:
+        frr.VTY_DIR = vtydir
+
+        with test.step("Run all commands in one session with ospfd"):
+            data = load("input.json")
+            replies = dict(zip(ospf_status.COMMANDS, (data["interfaces"],
+                                                      data["ospf"],
+                                                      data["neighbors"])))
+            ospfd = FakeOspfd(os.path.join(vtydir, "ospfd.vty"), replies)
+            try:
+                out = run()
+            finally:
+                ospfd.close()
+                os.unlink(os.path.join(vtydir, "ospfd.vty"))
+            assert ospfd.sessions == [list(ospf_status.COMMANDS)], ospfd.sessions
+            assert json.loads(out) == load("expected.json"), out
+
+        with test.step("Print nothing when ospfd is not running"):
+            assert run() == ""
+
+    test.succeed()
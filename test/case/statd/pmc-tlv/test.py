@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Verify the native PTP management client against pmc(8)
+
+On the running system, yanger reads the datasets of ptp4l over its
+management socket, see yanger/pmc.py, instead of running pmc.  Replays
+run pmc, so they never get here.  A stand-in for ptp4l answers with
+canned TLVs of a boundary clock with two ports, and the decoded
+datasets must read the same as pmc prints them for that state, as
+parsed by yanger/ieee1588_ptp.py.
+"""
+
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+
+from infamy.tap import Test
+
+CONF = "/etc/linuxptp/ptp4l-0.conf"
+
+# pmc -u -b 0 -f CONF "GET <dataset>", as printed by linuxptp 4.4
+PMC = {
+    "DEFAULT_DATA_SET": """\
+sending: GET DEFAULT_DATA_SET
+	005182.fffe.112202-0 seq 0 RESPONSE MANAGEMENT DEFAULT_DATA_SET
+		twoStepFlag             1
+		slaveOnly               0
+		numberPorts             2
+		priority1               128
+		clockClass              248
+		clockAccuracy           0xfe
+		offsetScaledLogVariance 0xffff
+		priority2               128
+		clockIdentity           005182.fffe.112202
+		domainNumber            0
+
+""",
+    "CURRENT_DATA_SET": """\
+sending: GET CURRENT_DATA_SET
+	005182.fffe.112202-0 seq 0 RESPONSE MANAGEMENT CURRENT_DATA_SET
+		stepsRemoved     1
+		offsetFromMaster -2.5
+		meanPathDelay    1234.5
+
+""",
+    "PARENT_DATA_SET": """\
+sending: GET PARENT_DATA_SET
+	005182.fffe.112202-0 seq 0 RESPONSE MANAGEMENT PARENT_DATA_SET
+		parentPortIdentity                    005182.fffe.334401-1
+		parentStats                           0
+		observedParentOffsetScaledLogVariance 0xffff
+		observedParentClockPhaseChangeRate    0x7fffffff
+		grandmasterPriority1                  128
+		gm.ClockClass                         6
+		gm.ClockAccuracy                      0x21
+		gm.OffsetScaledLogVariance            0x4e5d
+		grandmasterPriority2                  128
+		grandmasterIdentity                   005182.fffe.334401
+
+""",
+    "TIME_PROPERTIES_DATA_SET": """\
+sending: GET TIME_PROPERTIES_DATA_SET
+	005182.fffe.112202-0 seq 0 RESPONSE MANAGEMENT TIME_PROPERTIES_DATA_SET
+		currentUtcOffset      37
+		leap61                0
+		leap59                0
+		currentUtcOffsetValid 1
+		ptpTimescale          1
+		timeTraceable         1
+		frequencyTraceable    1
+		timeSource            0x20
+
+""",
+    "PORT_DATA_SET": """\
+sending: GET PORT_DATA_SET
+	005182.fffe.112202-1 seq 0 RESPONSE MANAGEMENT PORT_DATA_SET
+		portIdentity            005182.fffe.112202-1
+		portState               SLAVE
+		logMinDelayReqInterval  0
+		peerMeanPathDelay       0
+		logAnnounceInterval     1
+		announceReceiptTimeout  3
+		logSyncInterval         0
+		delayMechanism          1
+		logMinPdelayReqInterval 0
+		versionNumber           2
+	005182.fffe.112202-2 seq 0 RESPONSE MANAGEMENT PORT_DATA_SET
+		portIdentity            005182.fffe.112202-2
+		portState               MASTER
+		logMinDelayReqInterval  -3
+		peerMeanPathDelay       3000
+		logAnnounceInterval     1
+		announceReceiptTimeout  3
+		logSyncInterval         -3
+		delayMechanism          2
+		logMinPdelayReqInterval 0
+		versionNumber           2
+
+""",
+    "PORT_STATS_NP": """\
+sending: GET PORT_STATS_NP
+	005182.fffe.112202-1 seq 0 RESPONSE MANAGEMENT PORT_STATS_NP
+		portIdentity              005182.fffe.112202-1
+		rx_Sync                   1021
+		rx_Delay_Req              0
+		rx_Pdelay_Req             0
+		rx_Pdelay_Resp            0
+		rx_Follow_Up              1021
+		rx_Delay_Resp             1019
+		rx_Pdelay_Resp_Follow_Up  0
+		rx_Announce               511
+		rx_Signaling              0
+		rx_Management             0
+		tx_Sync                   0
+		tx_Delay_Req              1019
+		tx_Pdelay_Req             0
+		tx_Pdelay_Resp            0
+		tx_Follow_Up              0
+		tx_Delay_Resp             0
+		tx_Pdelay_Resp_Follow_Up  0
+		tx_Announce               0
+		tx_Signaling              0
+		tx_Management             0
+	005182.fffe.112202-2 seq 0 RESPONSE MANAGEMENT PORT_STATS_NP
+		portIdentity              005182.fffe.112202-2
+		rx_Sync                   0
+		rx_Delay_Req              0
+		rx_Pdelay_Req             8170
+		rx_Pdelay_Resp            8168
+		rx_Follow_Up              0
+		rx_Delay_Resp             0
+		rx_Pdelay_Resp_Follow_Up  8168
+		rx_Announce               0
+		rx_Signaling              0
+		rx_Management             0
+		tx_Sync                   8170
+		tx_Delay_Req              0
+		tx_Pdelay_Req             8170
+		tx_Pdelay_Resp            8170
+		tx_Follow_Up              8170
+		tx_Delay_Resp             0
+		tx_Pdelay_Resp_Follow_Up  8170
+		tx_Announce               4085
+		tx_Signaling              0
+		tx_Management             0
+
+""",
+}
+
+CLOCK = bytes.fromhex("005182fffe112202")
+GM = bytes.fromhex("005182fffe334401")
+
+
+def pid(clock, port):
+    return clock + struct.pack(">H", port)
+
+
+def port_stats(port, rx, tx):
+    """PORT_STATS_NP of port, counters by message type, little endian"""
+    return pid(CLOCK, port) + \
+        struct.pack("<16Q", *(rx + [0] * (16 - len(rx)))) + \
+        struct.pack("<16Q", *(tx + [0] * (16 - len(tx))))
+
+
+# TLV data of each dataset, per port for port datasets, of the same
+# state as PMC above
+TLVS = {
+    "DEFAULT_DATA_SET": [
+        struct.pack(">BBHBBBHB8sBB", 0x01, 0, 2, 128, 248, 0xfe, 0xffff,
+                    128, CLOCK, 0, 0)],
+    "CURRENT_DATA_SET": [struct.pack(">Hqq", 1, -163840, 80904192)],
+    "PARENT_DATA_SET": [
+        struct.pack(">10sBBHiBBBHB8s", pid(GM, 1), 0, 0, 0xffff, 0x7fffffff,
+                    128, 6, 0x21, 0x4e5d, 128, GM)],
+    "TIME_PROPERTIES_DATA_SET": [struct.pack(">hBB", 37, 0x3c, 0x20)],
+    "PORT_DATA_SET": [
+        struct.pack(">10sBbqbBbBbB", pid(CLOCK, 1), 9, 0, 0, 1, 3, 0, 1, 0, 0x12),
+        struct.pack(">10sBbqbBbBbB", pid(CLOCK, 2), 6, -3, 3000 << 16, 1, 3,
+                    -3, 2, 0, 0x12)],
+    "PORT_STATS_NP": [
+        port_stats(1, [1021, 0, 0, 0, 0, 0, 0, 0, 1021, 1019, 0, 511],
+                   [0, 1019]),
+        port_stats(2, [0, 0, 8170, 8168, 0, 0, 0, 0, 0, 0, 8168],
+                   [8170, 0, 8170, 8170, 0, 0, 0, 0, 8170, 0, 8170, 4085])],
+}
+
+
+class FakePtp4l:
+    """Stand-in for the UDS management socket of ptp4l
+
+    Answers each GET with the TLVs of that dataset, one message per
+    port for port datasets, or with an error status if it is in `fail`.
+    """
+
+    def __init__(self, path, pmc, fail=()):
+        self.pmc = pmc
+        self.fail = fail
+        self.requests = []
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self.sock.shutdown(socket.SHUT_RDWR)
+        self.sock.close()
+
+    def _reply(self, req, port, tlv):
+        _, _, _, domain, _, _, _, _, _, seq, _, _ = \
+            self.pmc.HEADER.unpack_from(req)
+        length = self.pmc.HEADER.size + self.pmc.MGMT.size + len(tlv)
+        header = self.pmc.HEADER.pack(self.pmc.MANAGEMENT, 2, length, domain,
+                                      0, 0, 0, 0, pid(CLOCK, port), seq, 4, 0x7f)
+        # Addressed to the sourcePortIdentity of the request
+        mgmt = self.pmc.MGMT.pack(req[20:30], 1, 1, self.pmc.RESPONSE, 0)
+        return header + mgmt + tlv
+
+    def _serve(self):
+        while True:
+            try:
+                req, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            if not req:
+                return
+            offset = self.pmc.HEADER.size + self.pmc.MGMT.size
+            _, _, mid = self.pmc.TLV.unpack_from(req, offset)
+            name = self.pmc.NAMES[mid]
+            self.requests.append(name)
+
+            first = 1 if mid in self.pmc.PORT_IDS else 0
+            for port, data in enumerate(TLVS[name], first):
+                if name in self.fail:
+                    # NOT_SUPPORTED, like ptp4l for an unknown managementId
+                    tlv = struct.pack(">HHHHI", self.pmc.TLV_MANAGEMENT_ERROR_STATUS,
+                                      8, 0xfffd, mid, 0)
+                else:
+                    tlv = self.pmc.TLV.pack(self.pmc.TLV_MANAGEMENT,
+                                            2 + len(data), mid) + data
+                self.sock.sendto(self._reply(req, port, tlv), addr)
+
+
+def capture(path):
+    os.makedirs(os.path.join(path, "run"))
+    with open(os.path.join(path, "timestamp"), "w", encoding="utf-8") as f:
+        f.write("1737726842\n")
+    for name, out in PMC.items():
+        cmd = ("pmc", "-u", "-b", "0", "-f", CONF, f"GET {name}")
+        slug = "_".join(cmd).replace("/", "+").replace(" ", "-")
+        with open(os.path.join(path, "run", slug), "w", encoding="utf-8") as f:
+            f.write(out)
+
+
+with Test() as test:
+    casedir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(casedir, "../../../../src/statd/python"))
+
+    from yanger import host
+
+    with tempfile.TemporaryDirectory() as tmp:
+        capture(os.path.join(tmp, "system"))
+        host.HOST = host.Replayhost(os.path.join(tmp, "system"))
+
+        from yanger import ieee1588_ptp, pmc
+
+        expected = {name: ieee1588_ptp._pmc_get(CONF, name) for name in PMC}
+
+        with test.step("Decode each dataset like pmc prints it"):
+            for name, blocks in TLVS.items():
+                size, decode = pmc.DECODERS[pmc.IDS[name]]
+                decoded = [pmc.text(decode(data)) for data in blocks]
+                assert all(len(data) >= size for data in blocks), name
+                assert decoded == expected[name], \
+                    f"{name}: {decoded} != {expected[name]}"
+
+            # Past SLAVE, e.g. GRAND_MASTER, pmc prints NONE
+            data = bytearray(TLVS["PORT_DATA_SET"][1])
+            data[10] = 10
+            assert pmc._port_ds(data)["portState"] == "NONE"
+
+        with test.step("Get all datasets of ptp4l in one session"):
+            path = os.path.join(tmp, "ptp4l-0")
+            ptp4l = FakePtp4l(path, pmc)
+            try:
+                result = pmc.pmc(path, ieee1588_ptp.DATASETS)
+            finally:
+                ptp4l.close()
+                os.unlink(path)
+            assert sorted(ptp4l.requests) == sorted(ieee1588_ptp.DATASETS), \
+                ptp4l.requests
+            assert result == expected, f"{result} != {expected}"
+
+        with test.step("Leave out datasets ptp4l does not support"):
+            ptp4l = FakePtp4l(path, pmc, fail=("PORT_STATS_NP",))
+            try:
+                result = pmc.pmc(path, ieee1588_ptp.DATASETS)
+            finally:
+                ptp4l.close()
+                os.unlink(path)
+            assert result == {name: blocks for name, blocks in expected.items()
+                              if name != "PORT_STATS_NP"}, result
+
+        with test.step("Map both sources to the same port datasets"):
+            for block in expected["PORT_DATA_SET"]:
+                port = ieee1588_ptp._build_port_ds(block)
+                assert port["delay-mechanism"] == \
+                    {"1": "e2e", "2": "p2p"}[block["delayMechanism"]], port
+
+    test.succeed()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Benchmark yanger ietf-routing with full table sized RIBs
+
+Generates captures of synthetic FRR routing tables, by default with
+100k and 1M IPv4 routes, and replays them with yanger, reporting the
+wall clock time and peak memory (RSS) for each.  The routes are read
+and written as a stream, so memory use should stay flat as the table
+grows.
+
+usage: bench.py [-C] [-k DIR] [ROUTES ...]
+
+  -C      Compact output, like from statd, instead of indented
+  -k DIR  Generate the captures in DIR, and keep them, for reuse
+"""
+import ipaddress
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PYTHONPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "../../../../src/statd/python")
+PROTOCOLS = ("kernel", "connected", "static", "ospf", "rip")
+
+
+def route(prefix, rng):
+    proto = rng.choice(PROTOCOLS)
+    uptime = rng.randrange(86400 * 60)
+    if uptime < 86400:
+        uptime = f"{uptime // 3600:02d}:{uptime // 60 % 60:02d}:{uptime % 60:02d}"
+    else:
+        uptime = f"{uptime // 86400}d{uptime // 3600 % 24:02d}h{uptime // 60 % 60:02d}m"
+
+    return {
+        "prefix": str(prefix),
+        "prefixLen": prefix.prefixlen,
+        "protocol": proto,
+        "vrfId": 0,
+        "vrfName": "default",
+        "selected": True,
+        "destSelected": True,
+        "distance": 110 if proto == "ospf" else 0,
+        "metric": rng.randrange(20),
+        "installed": True,
+        "table": 254,
+        "uptime": uptime,
+        "nexthops": [{
+            "flags": 3,
+            "fib": True,
+            "ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.1",
+            "afi": "ipv4",
+            "interfaceIndex": 2,
+            "interfaceName": f"e{rng.randrange(1, 9)}",
+            "active": True,
+            "weight": 1,
+        }],
+    }
+
+
+def generate(path, count):
+    """Capture of a system with count IPv4 routes, like vtysh output"""
+    rng = random.Random(count)
+    run = os.path.join(path, "run")
+    os.makedirs(run, exist_ok=True)
+
+    with open(os.path.join(path, "timestamp"), "w", encoding="utf-8") as f:
+        f.write(f"{int(time.time())}\n")
+    with open(os.path.join(run, "vtysh_-c_show-ipv6-route-json"), "w", encoding="utf-8") as f:
+        f.write("{}\n")
+
+    with open(os.path.join(run, "vtysh_-c_show-ip-route-json"), "w", encoding="utf-8") as f:
+        f.write("{")
+        base = int(ipaddress.IPv4Address("11.0.0.0"))
+        for i in range(count):
+            prefix = ipaddress.IPv4Network((base + (i << 8), 24))
+            f.write("," if i else "")
+            f.write(json.dumps(str(prefix)) + ":")
+            f.write(json.dumps([route(prefix, rng)], separators=(",", ":")))
+        f.write("}\n")
+
+
+def bench(path, compact):
+    """Replay capture in path, return (seconds, peak RSS in MiB)"""
+    cmd = [sys.executable, "-m", "yanger", "-r", path, "ietf-routing"]
+    if compact:
+        cmd.insert(3, "-C")
+
+    env = dict(os.environ, PYTHONPATH=PYTHONPATH)
+    start = time.monotonic()
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        proc = subprocess.Popen(cmd, env=env, stdout=devnull,
+                                stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.monotonic() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode:
+        sys.exit(f"yanger failed, exit code {proc.returncode}")
+
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main(argv):
+    compact, keep, counts = False, None, []
+    args = iter(argv)
+    for arg in args:
+        if arg == "-C":
+            compact = True
+        elif arg == "-k":
+            keep = next(args, None)
+        elif arg.isdigit():
+            counts.append(int(arg))
+        else:
+            sys.stderr.write(__doc__[__doc__.index("usage:"):])
+            return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'ROUTES':>10} {'SECONDS':>9} {'ROUTES/s':>10} {'PEAK MiB':>9}")
+        for count in counts or (100_000, 1_000_000):
+            path = os.path.join(keep or tmp, f"rib-{count}")
+            if not os.path.exists(os.path.join(path, "timestamp")):
+                generate(path, count)
+
+            elapsed, rss = bench(path, compact)
+            print(f"{count:10d} {elapsed:9.2f} {count / elapsed:10.0f} {rss:9.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -89,9 +89,12 @@ yanger_exec()
     local opts=
     while getopts "c:r:x:" opt; do
 	case ${opt} in
-	    c|r|x)
+	    c|r)
 		opts="$opts -$opt \"$OPTARG\""
 		;;
+	    x)
+		opts="$opts -S -x \"$OPTARG\""
+		;;
 	esac
     done
     shift $((OPTIND - 1))
@@ -101,8 +104,6 @@ yanger_exec()
 
 yanger_gen()
 {
-    local operfiles=
-
     if type gen_exec &>/dev/null; then
 	gen_exec
 	return
@@ -123,15 +124,15 @@ yanger_gen()
 	    -x "$wrapper" \
 	    $1 \
 	    >"$casedir/$1.json"
- 	operfiles="$operfiles $casedir/$1.json"
 	echo ">>> OK" >&2
 	shift
     done
 
+    # Merged by yanger itself, like the check does, jq's `*` replaces
+    # lists where yanger's merge concatenates them
     echo ">>> GENERATING operational.json" >&2
-    cat $operfiles | jq --slurp --sort-keys \
-       'reduce .[] as $item ({}; . * $item)' \
-       >"$casedir/operational.json"
+    yanger_exec -r "$casedir/system" "$yang_models" \
+	| jq --sort-keys . >"$casedir/operational.json"
     echo ">>> OK" >&2
 }
 
@@ -156,6 +157,23 @@ yanger_check()
 	     "yanger output of \"$1\" matches $1.json"
 	shift
     done
+
+    set $yang_models
+    if [ $# -gt 1 ]; then
+	status="ok"
+	diff=$(mktemp)
+	if ! diff -up \
+	     <(jq --sort-keys . "$casedir/operational.json") \
+	     <(yanger_exec -r "$casedir/system" "$yang_models" | jq --sort-keys .) \
+	     >"$diff"; then
+	    cat $diff | sed 's/^/# /'
+	    status="not ok"
+	fi
+
+	rm $diff
+	step "$status" \
+	     "merged yanger output of \"$yang_models\" matches operational.json"
+    fi
 }
 
 yanger_cat()